@@ -25,43 +25,59 @@ def is_qgis_version_3():
 
 import os.path
 import requests
-import time
 import calendar
 import datetime
-import math
 import re
-import ast
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from xml.etree import ElementTree
 try:
-    from urllib.parse import quote_plus
+    from urllib.parse import quote_plus, unquote_plus
 except ImportError:
-    from urllib import quote_plus
+    from urllib import quote_plus, unquote_plus
 
 from . import resources  # this import is used because it imports resources.qrc
 from .EDC_OGC_dockwidget import EDC_OGC_DockWidget
+from .capabilities import Capabilities, CAPABILITIES_CLASSES, WGS84
+from .cache import CapabilitiesCache, MemoryCapabilitiesCache
+from .tasks import run_task, cancel_task
+from .metrics import RequestMetrics
+from .download import get_tiles, download_mosaic, download_series, download_file, remove_partial_download
+from .download_manager import DownloadManager, DownloadJob
+from .tile_proxy import TileProxy
+from .prefetch import Prefetcher
+from .diagnostics import WmsErrorDiagnostics
+from .animation import AnimationLayer, get_frame_duration
+from .layer_selection import LayerSelectionDialog
+from .item_models import NameIndex, set_filterable_model, set_current_position
+from .wfs import iter_features, get_acquisitions, merge_acquisitions, get_grid_cells, AvailabilityCache
+from .request_spec import RequestSpec, format_bbox, get_wfs_url
+from .core import get_capabilities_url, get_time_parameter, lng_to_utm_zone, get_image_size, format_size, \
+    format_duration
+from .qgis_settings import get_plugin_version, get_proxy_from_qsettings, create_session
 from . import Settings
 
-from qgis.core import QgsRasterLayer, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsRectangle, QgsMessageLog, QgsApplication
+from qgis.core import QgsRasterLayer, QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsRectangle, QgsMessageLog, QgsApplication, QgsDataProvider
 
 if is_qgis_version_3():
     from qgis.utils import Qgis
     from qgis.core import QgsProject
-
-    from PyQt5.QtCore import QSettings, QTranslator, qVersion, QCoreApplication, Qt, QDate
-    from PyQt5.QtGui import QIcon, QTextCharFormat
-    from PyQt5.QtWidgets import QAction, QFileDialog
+    try:
+        from qgis.core import QgsDateTimeRange, QgsInterval, QgsUnitTypes, QgsTemporalNavigationObject
+    except ImportError:  # QGIS < 3.14 doesn't have temporal controller
+        QgsTemporalNavigationObject = None
+
+    from PyQt5.QtCore import QSettings, QTranslator, qVersion, QCoreApplication, Qt, QDate, QTime, QDateTime, QTimer
+    from PyQt5.QtGui import QTextCharFormat, QColor
+    from PyQt5.QtWidgets import QFileDialog, QTreeWidgetItem
 else:
     from qgis.utils import QGis as Qgis
     from qgis.core import QgsMapLayerRegistry as QgsProject
     from qgis.gui import QgsMessageBar
+    QgsTemporalNavigationObject = None
 
-    from PyQt4.QtCore import QSettings, QTranslator, qVersion, QCoreApplication, Qt, QDate
-    from PyQt4.QtGui import QIcon, QAction, QTextCharFormat, QFileDialog
-
-
-POP_WEB = 'EPSG:3857'
-WGS84 = 'EPSG:4326'
+    from PyQt4.QtCore import QSettings, QTranslator, qVersion, QCoreApplication, Qt, QDate, QTimer
+    from PyQt4.QtGui import QTextCharFormat, QColor, QFileDialog, QTreeWidgetItem
 
 
 class InvalidInstanceId(ValueError):
@@ -75,128 +91,30 @@ class Message:  # Don't use Enum classes as some older Python versions don't hav
     SUCCESS = ('Success', Qgis.Success if is_qgis_version_3() else QgsMessageBar.SUCCESS)
 
 
-class Capabilities:
-    """ Stores info about capabilities of EDC-OGC services
-    """
-
-    class Layer:
-        """ Stores info about EDC-OGC WMS layer
-        """
-        def __init__(self, layer_id, name, styles=None, info='', data_source=None):
-            self.id = layer_id
-            self.name = name
-            self.info = info
-            self.data_source = data_source
-            self.styles = styles
-
-
-    class CRS:
-        """ Stores info about available CRS at EDC-OGC Hub WMS
-        """
-        def __init__(self, crs_id, name):
-            self.id = crs_id
-            self.name = name
-
-    def __init__(self, base_url=''):
-        self.base_url = base_url
-        self.wavelengths = {}
-        self.dimensions = {}
-        self.layers = {}
-        self.collections=[]
-        self.collection_list = {}
-        self.crs_list = []
-
-
-
-    def map_layers(self, layer, name_space, layers_group):
-
-        info_node = layer.find('{}Abstract'.format(name_space))
-        style_list= []
-        styles = layer.findall('./{0}Style'.format(name_space))
-        for style in styles:
-            style_list.append(style.find('{}Name'.format(name_space)).text)
-
-        layers_group.append(self.Layer(layer.find('{}Name'.format(name_space)).text,
-                                            layer.find('{}Title'.format(name_space)).text,
-                                            style_list,
-                                            info_node.text if info_node is not None else ''))
-        layers_group.sort(key=lambda l: l.name)
-
-
-
-
-    def load_xml(self, xml_root):
-        """ Loads info from getCapabilities.xml
-        """
-        if xml_root.tag.startswith('{'):
-            namespace = '{}}}'.format(xml_root.tag.split('}')[0])
-        else:
-            namespace = ''
-
-        for layer in xml_root.findall('./{0}Capability/{0}Layer/{0}Layer'.format(namespace)):
-            layer_name = layer.find('{}Title'.format(namespace)).text
-            sub_layers = layer.findall('./{0}Layer'.format(namespace))
-            dimensions = layer.find('{}Dimension[@name="dim_bands"]'.format(namespace))
-            wavelengths = layer.find('{}Dimension[@name="dim_wavelengths"]'.format(namespace))
-
-            self.wavelengths[layer_name] = wavelengths.text.split(',') if wavelengths is not None else []
-            self.dimensions[layer_name] = dimensions.text.split(',') if dimensions is not None else []
-
-            self.collection_list[layer_name] =  layer.find('{}Name'.format(namespace)).text
-            self.map_layers(layer, namespace, self.collections)
-
-            sublayers= []
-            if len(sub_layers) == 0 :
-                self.map_layers(layer, namespace, sublayers)
-            else :
-                for sub_layer in sub_layers:
-                    self.map_layers(sub_layer, namespace, sublayers)
-
-            self.layers[layer_name]= sublayers
-
-        self.crs_list = []
-        for crs in xml_root.findall('./{0}Capability/{0}Layer/{0}CRS'.format(namespace)):
-            self.crs_list.append(self.CRS(crs.text, crs.text.replace(':', ': ')))
-        self._sort_crs_list()
-
-    def load_json(self, json_dict):
-        """ Loads info from getCapabilities.json
-        """
-        try:
-            json_layers = {json_layer['id']: json_layer for json_layer in json_dict['layers']}
-            for layer in self.layers:
-                json_layer = json_layers.get(layer.id)
-                if json_layer:
-                    layer.data_source = json_layer['dataset']
-        except KeyError:
-            pass
-
-    def _sort_crs_list(self):
-        """ Sorts list of CRS so that 3857 and 4326 are on the top
-        """
-        new_crs_list = []
-        for main_crs in [POP_WEB, WGS84]:
-            for index, crs in enumerate(self.crs_list):
-                if crs and crs.id == main_crs:
-                    new_crs_list.append(crs)
-                    self.crs_list[index] = None
-        for crs in self.crs_list:
-            if crs:
-                new_crs_list.append(crs)
-        self.crs_list = new_crs_list
-
-
 class EDC_OGC:
 
-    def __init__(self, iface):
+    def __init__(self, iface, tile_proxy=None):
         """Constructor.
+
+        :param tile_proxy: Local caching proxy which was started by the plugin loader at QGIS startup
+        :type tile_proxy: TileProxy or None
         """
         # Save reference to the QGIS interface
         self.iface = iface
 
         # initialize plugin directory
         self.plugin_dir = os.path.dirname(__file__)
-        self.plugin_version = self.get_plugin_version()
+        self.plugin_version = get_plugin_version()
+        # Every request of the plugin is recorded and summarized in the network panel
+        self.metrics = RequestMetrics()
+        self.metrics_timer = QTimer()
+        self.metrics_timer.setInterval(Settings.metrics_refresh_interval)
+        self.metrics_timer.timeout.connect(self.update_network_metrics)
+        if tile_proxy is not None:  # the proxy keeps its session, so that requests of the proxy are recorded too
+            self.session = tile_proxy.session
+            self.session.metrics = self.metrics
+        else:
+            self.session = create_session(self.metrics)
 
         """
         # This could be used for translating plugin into user's local language
@@ -216,10 +134,6 @@ class EDC_OGC:
         """
 
         # Declare instance attributes
-        self.actions = []
-        self.menu = self.translate(u'&Euro Data Cube')
-        self.toolbar = self.iface.addToolBar(u'Euro Data Cube')
-        self.toolbar.setObjectName(u'Euro Data Cube')
         self.pluginIsActive = False
         self.dockwidget = None
         self.instances = {'Default (pre-configured layers)': ''}
@@ -233,9 +147,16 @@ class EDC_OGC:
         self._check_local_variables()
 
         self.service_type = 'wms'
+        self.wmts_capabilities = None
+        self.wmts_task = None
 
         self.qgis_layers = []
         self.capabilities = Capabilities('')
+        self.capabilities_cache = CapabilitiesCache(
+            os.path.join(QgsApplication.qgisSettingsDirPath(), Settings.capabilities_cache_folder),
+            ttl=int(QSettings().value(Settings.capabilities_cache_ttl_location, Settings.capabilities_cache_ttl)),
+            max_entries=int(QSettings().value(Settings.capabilities_cache_size_location,
+                                              Settings.capabilities_cache_max_entries)))
         self.active_time = 'time0'
         self.time0 = ''
         self.time1 = ''
@@ -244,55 +165,59 @@ class EDC_OGC:
         self.dim_bands = ''
         self.dim_wavelengths = ''
 
+        # Copies of default request parameters which are changed by the panel, requests are built from
+        # immutable snapshots of them (see get_request_spec)
+        self.parameters = dict(Settings.parameters)
+        self.parameters_wms = dict(Settings.parameters_wms)
+        self.parameters_wcs = dict(Settings.parameters_wcs)
+
         self.download_current_window = True
         self.custom_bbox_params = {}
         for name in ['latMin', 'latMax', 'lngMin', 'lngMax']:
             self.custom_bbox_params[name] = ''
 
         self.layer_selection_event = None
-
-    @staticmethod
-    def translate(message):
-        """Get the translation for a string using Qt translation API.
-        """
-        return QCoreApplication.translate('Euro Data Cube', message)
-
-    def add_action(self, icon_path, text, callback, enabled_flag=True, add_to_menu=True, add_to_toolbar=True,
-                   status_tip=None, whats_this=None, parent=None):
-        """Add a toolbar icon to the toolbar.
-        """
-        icon = QIcon(icon_path)
-        action = QAction(icon, text, parent)
-        action.triggered.connect(callback)
-        action.setEnabled(enabled_flag)
-
-        if status_tip is not None:
-            action.setStatusTip(status_tip)
-
-        if whats_this is not None:
-            action.setWhatsThis(whats_this)
-
-        if add_to_toolbar:
-            self.toolbar.addAction(action)
-
-        if add_to_menu:
-            self.iface.addPluginToWebMenu(
-                self.menu,
-                action)
-
-        self.actions.append(action)
-
-        return action
-
-    def initGui(self):  # This method is called by QGIS
-        """Create the menu entries and toolbar icons inside the QGIS GUI."""
-
-        icon_path = ':/plugins/Euro Data Cube/favicon.ico'
-        self.add_action(
-            icon_path,
-            text=self.translate(u'Euro Data Cube'),
-            callback=self.run,
-            parent=self.iface.mainWindow())
+        # Items of collections, layers and CRS combo boxes, their models are shared by the combo boxes and their filters
+        self.collection_names = NameIndex()
+        self.layer_names = NameIndex()
+        self.crs_names = NameIndex()
+        # Requests which are sent in parallel with requests of background tasks
+        self.request_executor = ThreadPoolExecutor(max_workers=Settings.capabilities_workers)
+        self.instances_task = None
+        self.capabilities_task = None
+        # Capabilities of all listed instances are preloaded, switching between them only swaps objects in memory
+        self.memory_capabilities = MemoryCapabilitiesCache(self.capabilities_cache.ttl)
+        self.preload_task = None
+        self.download_manager = DownloadManager()
+
+        # Calendar availability is refreshed with a delay after the last change of map extent, month or collection
+        self.availability_cache = AvailabilityCache()
+        self.availability_task = None
+        self.availability_timer = QTimer()
+        self.availability_timer.setSingleShot(True)
+        self.availability_timer.setInterval(Settings.availability_delay)
+        self.availability_timer.timeout.connect(self.update_availability)
+
+        # Cached proxy configuration is refreshed only when QGIS options are changed
+        if hasattr(self.iface, 'optionsChanged'):
+            self.iface.optionsChanged.connect(self.session.invalidate_proxy_config)
+
+        # WMS errors of all layers are explained by a single handler of QGIS message log
+        self.wms_diagnostics = WmsErrorDiagnostics(self.session)
+        self.wms_diagnostics.errorReported.connect(lambda message: self.show_message(message, Message.WARNING))
+        self.wms_diagnostics.install(QgsApplication.messageLog() if is_qgis_version_3() else QgsMessageLog.instance())
+
+        # Local caching proxy of map images, it runs whenever it is enabled because saved layers depend on it
+        self.tile_proxy = None
+        self.prefetcher = None
+        self.animation = None
+        self.tile_cache_timer = QTimer()
+        self.tile_cache_timer.setInterval(Settings.tile_cache_stats_interval)
+        self.tile_cache_timer.timeout.connect(self.update_tile_cache_stats)
+        if tile_proxy is not None:
+            self.tile_proxy_started(tile_proxy)
+        elif QSettings().value(Settings.tile_cache_enabled_location, False, type=bool):
+            self.start_tile_proxy()
 
     def init_gui_settings(self):
         """Fill combo boxes:
@@ -311,6 +236,13 @@ class EDC_OGC:
         self.dockwidget.format.clear()
         self.dockwidget.format.addItems([image_format[1] for image_format in Settings.image_formats])
 
+        self.dockwidget.serviceType.clear()
+        self.dockwidget.serviceType.addItems(Settings.service_types)
+
+        self.dockwidget.tileCache.setChecked(self.tile_proxy is not None)
+        self.dockwidget.prefetchTiles.setChecked(QSettings().value(Settings.prefetch_enabled_location, True, type=bool))
+        self.update_tile_cache_stats()
+
     def _check_local_variables(self):
         """ Checks if local variables are of type string or unicode. If they are not it sets them to ''
         """
@@ -326,26 +258,13 @@ class EDC_OGC:
     def set_values(self):
         """ Updates some values for the wcs download request
         """
-        self.dockwidget.inputResX.setText(Settings.parameters_wcs['resx'])
-        self.dockwidget.inputResY.setText(Settings.parameters_wcs['resy'])
+        self.dockwidget.inputResX.setText(self.parameters_wcs['resx'])
+        self.dockwidget.inputResY.setText(self.parameters_wcs['resy'])
         self.dockwidget.latMin.setText(self.custom_bbox_params['latMin'])
         self.dockwidget.latMax.setText(self.custom_bbox_params['latMax'])
         self.dockwidget.lngMin.setText(self.custom_bbox_params['lngMin'])
         self.dockwidget.lngMax.setText(self.custom_bbox_params['lngMax'])
 
-    def get_plugin_version(self):
-        """
-        :return: Plugin version
-        :rtype: str
-        """
-        try:
-            with open(os.path.join(self.plugin_dir, 'metadata.txt')) as metadata_file:
-                for line in metadata_file:
-                    if line.startswith('version'):
-                        return line.split("=")[1].strip()
-        except IOError:
-            return '?'
-
     # --------------------------------------------------------------------------
 
     def show_message(self, message, message_type):
@@ -371,25 +290,15 @@ class EDC_OGC:
         :type instance_changed: bool
         """
 
-        self.dockwidget.createLayerLabel.setText('Create new WMS layer')
+        self.dockwidget.createLayerLabel.setText('Create new {} layer'.format(self.service_type.upper()))
 
         if self.capabilities:
             collection_index = self.dockwidget.collections.currentIndex()
-            self.dockwidget.collections.clear()
+            self.collection_names.set_items(self.capabilities.collections)
+            set_current_position(self.dockwidget.collections, 0 if instance_changed else collection_index)
 
-            self.dockwidget.collections.addItems([collection.name for collection in self.capabilities.collections])
-            if not instance_changed:
-                self.dockwidget.collections.setCurrentIndex(collection_index)
-
-            # layer_index = self.dockwidget.layers.currentIndex()
-            # self.dockwidget.layers.clear()
-            # self.dockwidget.layers.addItems([layer.name for layer in self.capabilities.layers[self.dockwidget.collections.currentText()]])
-            # if not instance_changed:
-            #     self.dockwidget.layers.setCurrentIndex(layer_index)
-
-            self.dockwidget.epsg.clear()
-
-            self.dockwidget.epsg.addItems([crs.name for crs in self.capabilities.crs_list])
+            self.crs_names.set_items(self.capabilities.crs_list)
+            set_current_position(self.dockwidget.epsg, 0)
 
     def update_current_wms_layers(self, selected_layer=None):
         """
@@ -419,113 +328,339 @@ class EDC_OGC:
 
     # --------------------------------------------------------------------------
 
+    def cancel_loading(self):
+        """ Cancels loading of instances and capabilities which is still in progress """
+        cancel_task(self.instances_task)
+        cancel_task(self.capabilities_task)
+        cancel_task(self.wmts_task)
+        cancel_task(self.preload_task)
+        self.instances_task = None
+        self.capabilities_task = None
+        self.wmts_task = None
+        self.preload_task = None
+
     def on_close_plugin(self):
         """Cleanup necessary items here when plugin dockwidget is closed"""
         # disconnects
         self.dockwidget.closingPlugin.disconnect(self.on_close_plugin)
+        self.metrics_timer.stop()
         self.pluginIsActive = False
 
     def unload(self):
-        """Removes the plugin menu item and icon from QGIS GUI."""
-
-        for action in self.actions:
-            self.iface.removePluginWebMenu(
-                self.translate(u'&Euro Data Cube'),
-                action)
-            self.iface.removeToolBarIcon(action)
-        del self.toolbar
+        """Stops background work and releases resources, menu item and icon are removed by the plugin loader."""
+        self.cancel_loading()
+        self.download_manager.cancel_all()
+        self.availability_timer.stop()
+        cancel_task(self.availability_task)
+        if self.dockwidget is not None:
+            self.iface.mapCanvas().extentsChanged.disconnect(self.schedule_availability_update)
+        if hasattr(self.iface, 'optionsChanged'):
+            self.iface.optionsChanged.disconnect(self.session.invalidate_proxy_config)
+        self.wms_diagnostics.uninstall()
+        self.stop_animation()
+        self.stop_tile_proxy()
+        self.metrics_timer.stop()
+        self.request_executor.shutdown(wait=False)
+        self.session.close()
 
     # --------------------------------------------------------------------------
 
-    def get_wms_uri(self):
-        """ Generate URI for WMS request from parameters """
-        uri = ''
-        additional_parameters = ''
+    def get_dimensions(self):
+        """ Dimension parameters of the url, they are set only if bands or wavelengths are selected instead of a layer
 
+        :rtype: tuple((str, str))
+        """
         if self.dockwidget.wave_check.isChecked():
-            additional_parameters = '&dim_wavelengths={}'.format(self.dim_wavelengths)
-
-        elif self.dockwidget.dim_check.isChecked():
-                additional_parameters = '&dim_bands={}'.format(self.dim_bands)
-
-        request_parameters = list(Settings.parameters_wms.items()) + list(Settings.parameters.items())
-        for parameter, value in request_parameters:
-
-            uri += '{}={}&'.format(parameter, value)
-
-        # Every parameter that QGIS layer doesn't use by default must be in url
-        # And url has to be encoded
-
-
-        url = '{}?Time={}{}& &priority={}&maxcc={}'.format(self.service_url, self.get_time(),additional_parameters,
-                                                           Settings.parameters['priority'], Settings.parameters['maxcc'])
-        return '{}url={}'.format(uri, quote_plus(url))
-
-
+            return (('dim_wavelengths', self.dim_wavelengths),)
+        if self.dockwidget.dim_check.isChecked():
+            return (('dim_bands', self.dim_bands),)
+        return ()
 
-    def get_wcs_url(self, bbox, crs=None):
-        """ Generate URL for WCS request from parameters
+    def get_selected_layer_name(self):
+        """ Name of the selected layer, bands or wavelengths which is shown in names of QGIS layers
+        """
+        if self.dockwidget.dim_check.isChecked():
+            return self.dim_bands
+        if self.dockwidget.wave_check.isChecked():
+            return self.dim_wavelengths
+        if self.dockwidget.layers_check.isChecked():
+            return self.dockwidget.layers.currentText()
+        return ''
+
+    def get_request_spec(self, collection_name=None, layer=None, style=None):
+        """ Captures parameters selected in the panel into an immutable specification of requests
+
+        :param collection_name: Collection which is used instead of the selected collection
+        :type collection_name: str or None
+        :param layer: Layer which is used instead of the selected layer, bands and wavelengths are not applied to it
+        :type layer: Capabilities.Layer or None
+        :param style: Style which is used instead of the selected style
+        :type style: str or None
+        :rtype: RequestSpec
+        """
+        self.update_parameters()
+        if layer is None:
+            layer_id, title, layer_name = self.parameters['layers'], self.parameters['title'], \
+                self.get_selected_layer_name()
+            dimensions = self.get_dimensions()
+        else:
+            layer_id, title, layer_name, dimensions = layer.id, layer.name, layer.name, ()
+
+        return RequestSpec(
+            service_url=self.service_url,
+            service_type=self.service_type,
+            collection=self.dockwidget.collections.currentText() if collection_name is None else collection_name,
+            layer=layer_id,
+            title=title,
+            layer_name=layer_name,
+            style=self.parameters_wms['styles'] if style is None else style,
+            time=self.parameters['time'],
+            exact_date=self.dockwidget.exactDate.isChecked(),
+            priority=self.parameters['priority'],
+            maxcc=self.parameters['maxcc'],
+            crs=self.parameters['crs'],
+            dimensions=dimensions,
+            image_format=self.parameters_wcs['format'],
+            resx=self.parameters_wcs['resx'],
+            resy=self.parameters_wcs['resy']
+        )
+
+    def get_layer_uri(self, spec):
+        """ Generate URI of a new QGIS layer for the service type of the specification
+
+        :param spec: Specification of requests
+        :type spec: RequestSpec
+        :return: URI or None if it cannot be created
+        :rtype: str or None
+        """
+        if spec.service_type == 'wmts':
+            return self.get_wmts_uri(spec)
+        return spec.get_wms_uri(self.get_layer_service_url())
+
+    def get_layer_service_url(self):
+        """ Service url of QGIS layers, it points to the local caching proxy if it is running
+        """
+        if self.tile_proxy is not None:
+            return self.tile_proxy.get_url(self.service_url)
+        return self.service_url
+
+    def start_tile_proxy(self):
+        """ Starts local caching proxy of map images
+
+        :return: True if proxy is running and False otherwise
+        :rtype: bool
+        """
+        if self.tile_proxy is not None:
+            return True
+        tile_proxy = TileProxy(self.session, os.path.join(QgsApplication.qgisSettingsDirPath(),
+                                                          Settings.tile_cache_folder))
+        try:
+            tile_proxy.start()
+        except (IOError, OSError) as exception:
+            self.show_message('Failed to start local tile cache, ports {} are not available: {}'.format(
+                tile_proxy.port_range, exception), Message.WARNING)
+            return False
+        if tile_proxy.port != tile_proxy.preferred_port:
+            self.show_message('Local tile cache runs on port {}, port {} is used by another application'.format(
+                tile_proxy.port, tile_proxy.preferred_port), Message.INFO)
+        tile_proxy.adopt_layers(QgsProject.instance().mapLayers().values())
+        self.tile_proxy_started(tile_proxy)
+        return True
+
+    def tile_proxy_started(self, tile_proxy):
+        """ Starts work which depends on a running local caching proxy
+        """
+        if self.base_url:
+            tile_proxy.allow_base_url(self.base_url)
+        self.tile_proxy = tile_proxy
+        if QSettings().value(Settings.prefetch_enabled_location, True, type=bool):
+            self.start_prefetcher()
+        if self.dockwidget is not None:
+            self.tile_cache_timer.start()
+
+    def stop_tile_proxy(self):
+        self.tile_cache_timer.stop()
+        self.stop_prefetcher()
+        if self.tile_proxy is not None:
+            self.tile_proxy.stop()
+            self.tile_proxy = None
+
+    def toggle_tile_cache(self, enabled):
+        """ Starts or stops local tile cache and remembers the choice
+        """
+        if enabled and not self.start_tile_proxy():
+            self.dockwidget.tileCache.setChecked(False)
+            return
+        if not enabled:
+            self.stop_tile_proxy()
+        QSettings().setValue(Settings.tile_cache_enabled_location, enabled)
+        self.update_tile_cache_stats()
+
+    def start_prefetcher(self):
+        """ Starts prefetching images around the current view into the local tile cache
+        """
+        if self.prefetcher is None and self.tile_proxy is not None:
+            self.prefetcher = Prefetcher(self.tile_proxy)
+            if self.animation is not None:
+                self.prefetcher.set_frames(self.animation.dates)
+            self.prefetcher.start()
+
+    def stop_prefetcher(self):
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.prefetcher = None
+
+    def toggle_prefetch(self, enabled):
+        """ Starts or stops prefetching and remembers the choice, prefetching runs only while tile cache is enabled
+        """
+        if enabled:
+            self.start_prefetcher()
+        else:
+            self.stop_prefetcher()
+        QSettings().setValue(Settings.prefetch_enabled_location, enabled)
 
-        :param bbox: Bounding box in form of "xmin,ymin,xmax,ymax"
-        :type bbox: str
-        :param crs: CRS of bounding box
-        :type crs: str or None
+    def update_tile_cache_stats(self):
+        """ Shows statistics of the local tile cache
         """
-        url = '{}?'.format(self.service_url)
-        request_parameters = list(Settings.parameters_wcs.items()) + list(Settings.parameters.items())
+        if self.dockwidget is None:
+            return
+        if self.tile_proxy is None:
+            return self.dockwidget.tileCacheStats.setText('')
+        if not self.tile_cache_timer.isActive():
+            self.tile_cache_timer.start()
+
+        stats = self.tile_proxy.stats
+        self.dockwidget.tileCacheStats.setText(
+            '{} hits, {} misses ({:.0f}% from cache, {} served), {} prefetched, {} cached in {} images'.format(
+                stats.hits + stats.revalidated + stats.stale, stats.misses, 100 * stats.hit_ratio,
+                format_size(stats.bytes_from_cache), stats.prefetched, format_size(self.tile_proxy.cache.size),
+                len(self.tile_proxy.cache)))
+
+    def get_wmts_uri(self, spec):
+        """ Generate URI for WMTS layer from a specification of requests. Such layer requests tiles of a fixed tile
+        matrix set, therefore repeated views are served from tile caches of the service and of QGIS.
+
+        :return: URI or None if WMTS capabilities don't contain the selected layer
+        :rtype: str or None
+        """
+        if not self.check_wmts_capabilities():
+            return None
 
-        for parameter, value in request_parameters:
-            if parameter in ('resx', 'resy'):
-                value = value.strip('m') + 'm'
-            if parameter == 'crs':
-                value = crs if crs else Settings.parameters['crs']
-            url += '{}={}&'.format(parameter, value)
-        return '{}bbox={}'.format(url, bbox)
+        tile_matrix_set = self.wmts_capabilities.get_tile_matrix_set(spec.layer, Settings.parameters_wmts['tileMatrixSet'])
+        if tile_matrix_set is None:
+            self.show_message('Layer {} is not available in WMTS, please use WMS instead.'.format(spec.layer),
+                              Message.INFO)
+            return None
+        return spec.get_wmts_uri(tile_matrix_set[0], tile_matrix_set[1], self.get_layer_service_url())
 
-    def get_wfs_url(self, time_range):
-        """ Generate URL for WFS request from parameters """
+    def check_wmts_capabilities(self):
+        """ Starts loading WMTS capabilities and informs user if they are not loaded yet
 
-        url = '{}?'.format(self.service_url)
-        for parameter, value in Settings.parameters_wfs.items():
-            url += '{}={}&'.format(parameter, value)
+        :return: True if WMTS capabilities are loaded
+        :rtype: bool
+        """
+        if self.wmts_capabilities is None:
+            if self.wmts_task is None:
+                self.load_wmts_capabilities()
+            self.show_message('WMTS capabilities are still loading, please try again in a moment.', Message.INFO)
+            return False
+        return True
 
-        return '{}bbox={}&time={}&srsname={}'.format(url, self.bbox_to_string(self.get_bbox()), time_range,
-                                                               Settings.parameters['crs'])
+    def get_instances_list(self, base_url, callback=None):
+        """ Starts loading list of instances in background. Instance combo box is filled once the list arrives.
 
-    @staticmethod
-    def get_capabilities_url(base_url, service, get_json=False):
-        """ Generates url for obtaining service capabilities
+        :param base_url: EDC-OGC base url
+        :type base_url: str
+        :param callback: Function called after instances were loaded, it receives True on success and False otherwise
+        :type callback: function or None
         """
-        url = '{}?service={}&request=GetCapabilities&version=1.3.0'.format(base_url, service)
-        if get_json:
-            return url + '&format=application/json'
-        return url
-
-    def get_instances_list(self, base_url):
+        cancel_task(self.instances_task)
+        self.instances_task = None
 
-        if base_url != '' :
-            url = base_url + '/instances.json'
-        else:
+        if base_url == '':
             return
 
-        response = self.download_from_url(url, raise_invalid_id=True)
+        def instances_loaded(instances, exception):
+            self.instances_task = None
+            if exception is not None:
+                self.show_exception(exception)
+            if instances is not None:
+                self.set_instances(instances)
+            if callback:
+                callback(instances is not None)
+            if instances is not None:
+                self.preload_capabilities([base_url + instance['id'] for instance in instances])
 
+        self.instances_task = run_task('Loading Euro Data Cube instances',
+                                       lambda task: self.download_instances(base_url), instances_loaded)
 
-        if not response:
-            return None
+    def download_instances(self, base_url):
+        """ Downloads list of instances. This method doesn't touch GUI and can run in a background task.
 
-        instances = json.loads(response.text)
+        :param base_url: EDC-OGC base url
+        :type base_url: str
+        :return: list of instances with their names and ids
+        :rtype: list(dict)
+        """
+        response = self.download_from_url(base_url + '/instances.json', raise_invalid_id=True, raise_exception=True)
+        return json.loads(response.text)
+
+    def set_instances(self, instances):
+        """ Fills instance combo box with a new list of instances
+        """
+        self.instances = {'Default (pre-configured layers)': ''}
         for instance in instances:
             self.instances[instance['name']] = instance['id']
 
+        self.dockwidget.instanceId.blockSignals(True)
         self.dockwidget.instanceId.clear()
         self.dockwidget.instanceId.addItems([name for name in self.instances.keys()])
-
-
         self.dockwidget.instanceId.setCurrentIndex(0)
+        self.dockwidget.instanceId.blockSignals(False)
 
-    def change_instance_ID(self, url):
+    def preload_capabilities(self, service_urls):
+        """ Loads capabilities of instances in background with bounded concurrency and keeps them in memory. Instances
+        which are already in memory are skipped.
 
+        :param service_urls: EDC-OGC service urls of instances
+        :type service_urls: list(str)
+        """
+        cancel_task(self.preload_task)
+        self.preload_task = None
+        service_urls = [service_url for service_url in service_urls
+                        if service_url not in self.memory_capabilities][:Settings.preload_max_instances]
+        if not service_urls:
+            return
+
+        def preload(task):
+            with ThreadPoolExecutor(max_workers=Settings.preload_workers) as executor:
+                futures = {executor.submit(self.get_capabilities, service_url, task=task, raise_exception=True):
+                           service_url for service_url in service_urls}
+                for future in as_completed(futures):
+                    if task.isCanceled():
+                        for pending_future in futures:
+                            pending_future.cancel()
+                        return
+                    try:
+                        capabilities = future.result()
+                    except Exception:  # an instance which failed is loaded again once it is selected
+                        continue
+                    if capabilities:
+                        self.memory_capabilities.put(futures[future], capabilities)
+
+        def preload_finished(result, exception):
+            self.preload_task = None
+
+        self.preload_task = run_task('Preloading Euro Data Cube capabilities', preload, preload_finished)
+
+    def change_instance_ID(self, url, callback=None):
+        """ Starts loading capabilities of currently selected instance in background
+
+        :param url: EDC-OGC base url, if it is not given current base url is used
+        :type url: str or int or None
+        :param callback: Function called with loaded capabilities or None if loading failed
+        :type callback: function or None
+        """
         if not url or isinstance(url, int):
             if url == '' or self.base_url == '' :
                 self.show_message("Please provide a valid URL", Message.INFO)
@@ -534,81 +669,448 @@ class EDC_OGC:
 
         if self.dockwidget.instanceId.currentIndex() >= 0:
             instance_extension = self.instances[self.dockwidget.instanceId.currentText()]
-            self.service_url = url + instance_extension
-            capabilities = self.get_capabilities(self.service_url)
+            self.load_capabilities(url + instance_extension, callback)
+
+    def load_capabilities(self, service_url, callback=None):
+        """ Loads capabilities in background and updates UI once they arrive. Loading which is still in progress
+        is canceled. Capabilities which are in memory are used immediately, stale ones are refreshed in background.
+
+        :param service_url: EDC-OGC service url
+        :type service_url: str
+        :param callback: Function called with loaded capabilities or None if loading failed
+        :type callback: function or None
+        """
+        cancel_task(self.capabilities_task)
+        self.capabilities_task = None
+
+        cached = self.memory_capabilities.get(service_url)
+        if cached is not None:
+            capabilities, is_fresh = cached
+            self.set_capabilities(service_url, capabilities)
+            if callback:
+                callback(capabilities)
+            if not is_fresh:
+                self.refresh_capabilities(service_url, capabilities)
+            return
+
+        def capabilities_loaded(capabilities, exception):
+            self.capabilities_task = None
+            if exception is not None:
+                self.show_exception(exception)
             if capabilities:
-                self.capabilities = capabilities
-                self.update_instance_props(instance_changed=True)
-                if self.service_url:
-                    self.show_message("New URL and layers set.", Message.SUCCESS)
-                self.update_selected_collection()
-            return capabilities
+                self.memory_capabilities.put(service_url, capabilities)
+                self.set_capabilities(service_url, capabilities)
+            if callback:
+                callback(capabilities)
+
+        self.capabilities_task = run_task('Loading Euro Data Cube capabilities',
+                                          lambda task: self.get_capabilities(service_url, task=task,
+                                                                             raise_exception=True),
+                                          capabilities_loaded)
+
+    def refresh_capabilities(self, service_url, stale_capabilities):
+        """ Loads stale capabilities from memory again in background. The panel is updated only if they changed,
+        on failure the stale capabilities stay in use.
+        """
+        def refresh(task):
+            capabilities = self.get_capabilities(service_url, task=task, raise_exception=True)
+            return capabilities, capabilities is not None and \
+                capabilities.to_bytes() != stale_capabilities.to_bytes()
+
+        def capabilities_refreshed(result, exception):
+            self.capabilities_task = None
+            if exception is not None or result is None or not result[0]:
+                return
+            capabilities, changed = result
+            self.memory_capabilities.put(service_url, capabilities)
+            if changed and service_url == self.service_url:
+                self.set_capabilities(service_url, capabilities)
 
+        self.capabilities_task = run_task('Refreshing Euro Data Cube capabilities', refresh, capabilities_refreshed)
+
+    def set_capabilities(self, service_url, capabilities):
+        """ Makes capabilities of an instance current and shows its collections in the panel
+        """
+        self.service_url = service_url
+        self.capabilities = capabilities
+        self.update_instance_props(instance_changed=True)
+        self.show_message("New URL and layers set.", Message.SUCCESS)
+        self.update_selected_collection()
+        self.wmts_capabilities = None
+        if self.service_type == 'wmts':
+            self.load_wmts_capabilities()
+
+    def load_wmts_capabilities(self):
+        """ Loads WMTS capabilities of the current instance in background. They are needed to choose a tile matrix set
+        of WMTS layers.
+        """
+        cancel_task(self.wmts_task)
+        self.wmts_task = None
+        if not self.service_url:
+            return
+        service_url = self.service_url
 
+        def wmts_capabilities_loaded(capabilities, exception):
+            self.wmts_task = None
+            if exception is not None:
+                return self.show_exception(exception)
+            if service_url == self.service_url:
+                self.wmts_capabilities = capabilities
 
-    def get_capabilities(self, base_url, service='wms'):
-        """ Get capabilities of desired service
+        self.wmts_task = run_task('Loading Euro Data Cube WMTS capabilities',
+                                  lambda task: self.get_capabilities(service_url, 'wmts', task=task,
+                                                                     raise_exception=True),
+                                  wmts_capabilities_loaded)
+
+    def change_service_type(self):
+        """ Changes type of newly created layers
+        """
+        self.service_type = self.dockwidget.serviceType.currentText().lower() or 'wms'
+        self.dockwidget.createLayerLabel.setText('Create new {} layer'.format(self.service_type.upper()))
+        if self.service_type == 'wmts' and self.wmts_capabilities is None and self.wmts_task is None:
+            self.load_wmts_capabilities()
+
+    def get_capabilities(self, base_url, service='wms', task=None, raise_exception=False):
+        """ Get capabilities of desired service. Capabilities are taken from the on-disk cache if they are fresh,
+        otherwise the cached entry is revalidated with a conditional request
 
         :param base_url: EDC-OGC service url
         :type base_url: str
-        :param service: Service (wms, wfs, wcs)
+        :param service: Service with capabilities model (wms, wmts)
         :type service: str
+        :param task: Background task in which capabilities are loaded, loading stops if the task is canceled
+        :type task: QgsTask or None
+        :param raise_exception: If True download errors are raised instead of shown to user
+        :type raise_exception: bool
         :return: Capabilities class or none
-        :rtype: Capabilities or None
+        :rtype: Capabilities or WmtsCapabilities or None
         """
+        entry = self.capabilities_cache.get(base_url, service)
+        if entry is not None and entry.is_fresh(self.capabilities_cache.ttl):
+            capabilities = self.load_cached_capabilities(entry)
+            if capabilities:
+                return capabilities
 
-        response = self.download_from_url(self.get_capabilities_url(base_url, service), raise_invalid_id=True)
+        # Without a cached entry both documents are certainly needed, therefore JSON is requested together with XML
+        json_future = None
+        if service == 'wms' and entry is None:
+            json_future = self.request_executor.submit(self.download_json_capabilities, base_url)
 
+        try:
+            response = self.download_from_url(get_capabilities_url(base_url, service), raise_invalid_id=True,
+                                              headers=entry.validators() if entry else None,
+                                              raise_exception=raise_exception)
+        except requests.RequestException:
+            if json_future is not None:
+                json_future.cancel()
+            if entry is None:
+                raise
+            response = None
 
         if not response:
-            return None
+            return self.load_cached_capabilities(entry) if entry else None
 
-        capabilities = Capabilities(base_url)
+        if response.status_code == 304 and entry is not None:
+            capabilities = self.load_cached_capabilities(entry)
+            if capabilities:
+                self.capabilities_cache.revalidated(entry, response.headers.get('ETag'),
+                                                    response.headers.get('Last-Modified'))
+                return capabilities
+            response = self.download_from_url(get_capabilities_url(base_url, service), raise_invalid_id=True,
+                                              raise_exception=raise_exception)
+            if not response:
+                return None
+
+        if task is not None and task.isCanceled():
+            return None
 
-        xml_root = ElementTree.fromstring(response.content)
-        capabilities.load_xml(xml_root)
+        capabilities = CAPABILITIES_CLASSES[service](base_url)
 
+        capabilities.load_xml(response.content)
 
-        json_response = self.download_from_url(self.get_capabilities_url(base_url, service, get_json=True), raise_invalid_id=True)
+        json_text = None
+        json_response = None
+        if service == 'wms':
+            json_response = json_future.result() if json_future is not None else \
+                self.download_json_capabilities(base_url)
         if json_response:
             try:
                 capabilities.load_json(json_response.json())
+                json_text = json_response.text
             except ValueError:
                 pass
 
+        self.capabilities_cache.put(base_url, service, response.content, json_text, capabilities.to_bytes(),
+                                    etag=response.headers.get('ETag'),
+                                    last_modified=response.headers.get('Last-Modified'))
         return capabilities
 
+    def download_json_capabilities(self, base_url):
+        """ Downloads JSON capabilities with data sources of layers. They are optional, therefore errors are ignored.
 
+        :return: Response or None if download failed
+        :rtype: requests.Response or None
+        """
+        return self.download_from_url(get_capabilities_url(base_url, 'wms', get_json=True), ignore_exception=True)
+
+    @staticmethod
+    def load_cached_capabilities(entry):
+        """ Restores capabilities from a cache entry. If parsed snapshot is not available raw documents are parsed.
+
+        :param entry: Cached capabilities entry
+        :type entry: CapabilitiesCache.Entry
+        :return: Capabilities class or none
+        :rtype: Capabilities or WmtsCapabilities or None
+        """
+        capabilities_class = CAPABILITIES_CLASSES.get(entry.service)
+        if capabilities_class is None:
+            return None
+
+        snapshot = entry.snapshot()
+        if snapshot is not None:
+            try:
+                return capabilities_class.from_bytes(snapshot)
+            except ValueError:
+                pass
+
+        xml = entry.xml()
+        if xml is None:
+            return None
+        capabilities = capabilities_class(entry.service_url)
+        try:
+            capabilities.load_xml(xml)
+        except ElementTree.ParseError:
+            return None
+        json_text = entry.json()
+        if json_text is not None and entry.service == 'wms':
+            try:
+                capabilities.load_json(json.loads(json_text))
+            except ValueError:
+                pass
+        return capabilities
 
     def download_wcs_data(self, url, filename):
         """
-        Download image from provided URL WCS request
+        Queue download of image from provided URL WCS request. Image is streamed in background into a temporary
+        file which is renamed to filename once the download is complete.
 
         :param url: WCS url request with specified bounding box
         :param filename: filename of image
         :return:
         """
-        with open(os.path.join(self.download_folder, filename), "wb") as download_file:
-            response = self.download_from_url(url, stream=True)
+        path = os.path.join(self.download_folder, filename)
 
-            if response:
-                total_length = response.headers.get('content-length')
+        def download(progress):
+            download_file(self.session, url, path,
+                          progress=lambda downloaded, total: progress(downloaded,
+                                                                      float(downloaded) / total if total else None))
 
-                if total_length is None:
-                    download_file.write(response.content)
-                else:
-                    for data in response.iter_content(chunk_size=4096):
-                        download_file.write(data)
-                downloaded = True
-            else:
-                downloaded = False
-        if downloaded:
-            self.show_message("Done downloading to {}".format(filename), Message.SUCCESS)
-            time.sleep(1)
-        else:
-            self.show_message("Failed to download from {} to {}".format(url, filename), Message.CRITICAL)
+        self.download_manager.add_job(DownloadJob(filename, download, cleanup=lambda: remove_partial_download(path)))
+
+    def download_wcs_tiles(self, spec, bbox, crs, width, height):
+        """ Queue download which splits bounding box into tiles, downloads them in parallel and writes them into
+        a single GeoTIFF
+
+        :param spec: Specification of requests
+        :type spec: RequestSpec
+        :param bbox: Bounding box
+        :type bbox: QgsRectangle
+        :param crs: CRS of bounding box
+        :type crs: str
+        :param width: Width of the whole image in pixels
+        :type width: int
+        :param height: Height of the whole image in pixels
+        :type height: int
+        """
+        bbox_str = self.bbox_to_string(bbox, crs)
+        filename = '{}.tif'.format(os.path.splitext(spec.get_filename(bbox_str))[0])
+        path = os.path.join(self.download_folder, filename)
+
+        bbox_tuple = (bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum())
+        tiles = get_tiles(bbox_tuple, width, height)
+        urls = [spec.get_wcs_url(format_bbox(tile.bbox, crs), crs, size=(tile.width, tile.height)) for tile in tiles]
+
+        def download(progress):
+            download_mosaic(self.fetch_file, tiles, urls, path, width, height, bbox_tuple, crs, progress=progress)
+
+        self.download_manager.add_job(DownloadJob(filename, download, cleanup=lambda: remove_partial_download(path)))
+
+    def fetch_file(self, url, filename, progress=None):
+        """ Downloads url into a file. This method doesn't touch GUI and is used by workers of download jobs.
+
+        :param url: download url
+        :type url: str
+        :param filename: path of the file
+        :type filename: str
+        :param progress: Function called with parameters (downloaded bytes, total bytes or None)
+        :type progress: function or None
+        """
+        download_file(self.session, url, filename, progress=progress)
+
+    def download_time_series(self):
+        """ Finds acquisitions in the selected time interval with WFS requests in background and then downloads one
+        image per acquisition
+        """
+        area = self.prepare_download()
+        if area is None:
+            return
+        if not self.time0 or self.dockwidget.exactDate.isChecked():
+            return self.show_message('Please select a time interval for time series download.', Message.INFO)
+
+        bbox, crs = area
+        spec = self.get_request_spec()
+        bbox_str = self.bbox_to_string(bbox, crs)
+        wfs_url = spec.get_wfs_url('/'.join(spec.time.split('/')[:2]), bbox_str, crs)
+
+        def acquisitions_found(result, exception):
+            if exception is not None:
+                return self.show_exception(exception)
+            acquisitions, truncated = result
+            if not acquisitions:
+                return self.show_message('No acquisitions found in {}.'.format(spec.time), Message.INFO)
+            if truncated:
+                self.show_truncated_search()
+            self.queue_time_series(spec, acquisitions, bbox_str, crs)
+
+        run_task('Searching Euro Data Cube acquisitions',
+                 lambda task: self.find_acquisitions(wfs_url, spec.maxcc, task), acquisitions_found)
+
+    def find_acquisitions(self, wfs_url, maxcc, task):
+        """ Finds acquisitions with WFS requests. This method doesn't touch GUI and runs in a background task.
+
+        :param wfs_url: WFS GetFeature url without paging offset
+        :type wfs_url: str
+        :param maxcc: Maximal cloud coverage in percents
+        :type maxcc: str
+        :param task: Background task, search stops if it is canceled
+        :type task: QgsTask
+        :return: Acquisitions and True if the search stopped at the page limit and some acquisitions may be missing
+        :rtype: (list(Acquisition), bool)
+        """
+        truncated = []
+        features = iter_features(lambda url: self.download_from_url(url, raise_exception=True).json(), wfs_url,
+                                 is_canceled=task.isCanceled, on_truncated=lambda: truncated.append(True))
+        return get_acquisitions(features, maxcc), bool(truncated)
+
+    def show_truncated_search(self):
+        self.show_message('Search of acquisitions stopped after {} tiles, some acquisitions may be missing. Please '
+                          'select a shorter time interval or a smaller area.'.format(
+                              Settings.wfs_max_pages * int(Settings.parameters_wfs['maxfeatures'])), Message.WARNING)
+
+    def queue_time_series(self, spec, acquisitions, bbox_str, crs):
+        """ Queues a download job which downloads one image per acquisition into a new folder together with
+        a manifest
+
+        :param spec: Specification of requests, its time is the selected time interval
+        :type spec: RequestSpec
+        :param acquisitions: Acquisitions found with WFS
+        :type acquisitions: list(Acquisition)
+        :param bbox_str: Bounding box in form of "xmin,ymin,xmax,ymax"
+        :type bbox_str: str
+        :param crs: CRS of bounding box
+        :type crs: str
+        """
+        name, extension = os.path.splitext(spec.get_filename(bbox_str))
+        folder_name = '{}_{}'.format(name, '_'.join(spec.time.split('/')[:2]))
+        folder = os.path.join(self.download_folder, folder_name)
+
+        items = [{
+            'date': acquisition.date,
+            'cloud_cover': acquisition.cloud_cover,
+            'url': spec.get_wcs_url(bbox_str, crs, time='{0}/{0}/P1D'.format(acquisition.date)),
+            'file': os.path.join(folder, '{}{}'.format(acquisition.date, extension))
+        } for acquisition in acquisitions]
+        manifest = {
+            'service_url': spec.service_url,
+            'collection': spec.collection,
+            'layer': spec.layer,
+            'time': spec.time,
+            'bbox': bbox_str,
+            'crs': crs,
+            'format': spec.image_format,
+            'maxcc': spec.maxcc
+        }
 
-    def download_from_url(self, url, stream=False, raise_invalid_id=False, ignore_exception=False):
+        def download(progress):
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            download_series(self.fetch_file, items, os.path.join(folder, 'manifest.json'), manifest,
+                            progress=progress)
+
+        def cleanup():
+            for item in items:
+                remove_partial_download(item['file'])
+
+        self.download_manager.add_job(DownloadJob(folder_name, download, cleanup=cleanup))
+        self.show_message('Downloading {} acquisitions into {}'.format(len(items), folder_name), Message.INFO)
+
+    def download_finished(self, job):
+        """ Shows message about a finished download job
+        """
+        if job.state == DownloadJob.FINISHED:
+            self.show_message("Done downloading to {}".format(job.name), Message.SUCCESS)
+        elif job.state == DownloadJob.FAILED:
+            error = self.get_error_message(job.error) if isinstance(job.error, requests.RequestException) \
+                else str(job.error)
+            self.show_message("Failed to download {}: {}".format(job.name, error), Message.CRITICAL)
+
+    def update_download_jobs(self):
+        """ Updates list of download jobs in the downloads panel
+        """
+        job_list = self.dockwidget.downloadJobs
+        jobs = self.download_manager.jobs
+        while job_list.topLevelItemCount() > len(jobs):
+            job_list.takeTopLevelItem(job_list.topLevelItemCount() - 1)
+
+        for index, job in enumerate(jobs):
+            item = job_list.topLevelItem(index)
+            if item is None:
+                item = QTreeWidgetItem(job_list)
+            running = job.state == DownloadJob.RUNNING
+            values = [job.name,
+                      job.state if job.state != DownloadJob.FAILED else '{}: {}'.format(job.state, job.error),
+                      '{:.0f}%'.format(100 * job.fraction) if job.fraction is not None else '',
+                      format_size(job.downloaded),
+                      '{}/s'.format(format_size(job.speed)) if running else '',
+                      format_duration(job.eta) if running else '']
+            for column, value in enumerate(values):
+                item.setText(column, value)
+
+    def get_selected_download_job(self):
+        """
+        :return: Download job selected in the downloads panel
+        :rtype: DownloadJob or None
+        """
+        index = self.dockwidget.downloadJobs.indexOfTopLevelItem(self.dockwidget.downloadJobs.currentItem())
+        if 0 <= index < len(self.download_manager.jobs):
+            return self.download_manager.jobs[index]
+        return None
+
+    def pause_download(self):
+        job = self.get_selected_download_job()
+        if job:
+            self.download_manager.pause(job)
+
+    def resume_download(self):
+        job = self.get_selected_download_job()
+        if job:
+            self.download_manager.resume(job)
+
+    def cancel_download(self):
+        job = self.get_selected_download_job()
+        if job:
+            self.download_manager.cancel(job)
+
+    def get_image_size(self, bbox, crs=None):
+        """ Calculates size of WCS image in pixels from bounding box and resolution
+
+        :return: width and height in pixels
+        :rtype: (int, int)
+        """
+        return get_image_size(self.get_bbox_size(bbox, crs), self.parameters_wcs['resx'], self.parameters_wcs['resy'])
+
+    def download_from_url(self, url, stream=False, raise_invalid_id=False, ignore_exception=False, headers=None,
+                          raise_exception=False):
         """ Downloads data from url and handles possible errors
 
         :param url: download url
@@ -619,62 +1121,41 @@ class EDC_OGC:
         :type raise_invalid_id: bool
         :param ignore_exception: If True no error messages will be shown in case of exceptions
         :type ignore_exception: bool
+        :param headers: Additional request headers
+        :type headers: dict or None
+        :param raise_exception: If True exceptions are raised instead of shown to user, this is required when
+                                downloading outside of the main thread
+        :type raise_exception: bool
         :return: download response or None if download failed
         :rtype: requests.response or None
         """
         try:
-            proxy_dict, auth = self.get_proxy_config()
-            response = requests.get(url, stream=stream,
-                                    headers={'User-Agent': 'sh_qgis_plugin_{}'.format(self.plugin_version)},
-                                    proxies=proxy_dict, auth=auth)
-            response.raise_for_status()
+            response = self.session.get(url, stream=stream, headers=headers)
         except requests.RequestException as exception:
             if ignore_exception:
                 return
             if raise_invalid_id and isinstance(exception, requests.HTTPError) and exception.response.status_code == 400:
-                raise InvalidInstanceId()
+                raise InvalidInstanceId(self.get_error_message(exception))
+            if raise_exception:
+                raise
 
             self.show_message(self.get_error_message(exception), Message.CRITICAL)
             response = None
 
         return response
 
-    @staticmethod
-    def get_proxy_config():
-        """ Get proxy config from QSettings and builds proxy parameters
+    def show_exception(self, exception):
+        """ Shows message about an exception which was raised in a background task
 
-        :return: dictionary of transfer protocols mapped to addresses, also authentication if set in QSettings
-        :rtype: (dict, requests.auth.HTTPProxyAuth) or (dict, None)
+        :param exception: Exception raised during download
+        :type exception: Exception
         """
-        enabled, host, port, user, password = EDC_OGC.get_proxy_from_qsettings()
-
-        proxy_dict = {}
-        if enabled and host:
-            port_str = ':{}'.format(port) if port else ''
-            for protocol in ['http', 'https', 'ftp']:
-                proxy_dict[protocol] = '{}://{}{}'.format(protocol, host, port_str)
-
-        auth = requests.auth.HTTPProxyAuth(user, password) if enabled and user and password else None
-
-        return proxy_dict, auth
-
-    @staticmethod
-    def get_proxy_from_qsettings():
-        """ Gets the proxy configuration from QSettings
-
-        :return: Proxy settings: flag specifying if proxy is enabled, host, port, user and password
-        :rtype: tuple(str)
-        """
-        settings = QSettings()
-        settings.beginGroup('proxy')
-        enabled = str(settings.value('proxyEnabled')).lower() == 'true'  # to be compatible with QGIS 2 and 3
-        # proxy_type = settings.value("proxyType")
-        host = settings.value('proxyHost')
-        port = settings.value('proxyPort')
-        user = settings.value('proxyUser')
-        password = settings.value('proxyPassword')
-        settings.endGroup()
-        return enabled, host, port, user, password
+        if isinstance(exception, requests.RequestException):
+            self.show_message(self.get_error_message(exception), Message.CRITICAL)
+        elif isinstance(exception, InvalidInstanceId):
+            self.show_message(str(exception) or 'Invalid URL or instance ID', Message.CRITICAL)
+        else:
+            self.show_message('{}: {}'.format(exception.__class__.__name__, exception), Message.CRITICAL)
 
     @staticmethod
     def get_error_message(exception):
@@ -690,7 +1171,7 @@ class EDC_OGC:
         if isinstance(exception, requests.ConnectionError):
             message += 'Cannot access service, check your internet connection.'
 
-            enabled, host, port, _, _ = EDC_OGC.get_proxy_from_qsettings()
+            enabled, host, port, _, _ = get_proxy_from_qsettings()
             if enabled:
                 message += ' QGIS is configured to use proxy: {}'.format(host)
                 if port:
@@ -726,35 +1207,13 @@ class EDC_OGC:
         if not self.service_url:
             return self.missing_url()
 
-        self.update_parameters()
-        uri = self.get_wms_uri()
-        name = self.get_qgis_layer_name()
+        spec = self.get_request_spec()
+        uri = self.get_layer_uri(spec)
+        if uri is None:
+            return None
+        name = spec.get_layer_name()
         new_layer = QgsRasterLayer(uri, name, 'wms')
 
-        interface = self.iface
-
-        def errorCatcher(msg, tag, level):
-            if tag == 'WMS' and level != 0:
-
-                result = re.search('BAD REQUEST url: (.*)]', msg)
-                if result :
-                    error_url = result.group(1)
-                    response = requests.get(error_url)
-
-                    dict_error = re.search(r'({.+})', response.text)
-
-                    if dict_error :
-
-                        error_content = dict_error.group(0)
-
-                        message =  ast.literal_eval(error_content)
-
-                        interface.messageBar().pushMessage('Warning', '{}'.format(message["error"]["message"]), Qgis.Warning)
-        if is_qgis_version_3():
-            QgsApplication.messageLog().messageReceived.connect(errorCatcher)
-        else :
-            QgsMessageLog.instance().messageReceived.connect(errorCatcher)
-
         if new_layer.isValid():
             if on_top and self.get_qgis_layers():
                 self.iface.setActiveLayer(self.get_qgis_layers()[0])
@@ -764,12 +1223,193 @@ class EDC_OGC:
             self.show_message('Failed to create layer {}.'.format(name), Message.CRITICAL)
         return new_layer
 
+    def select_qgis_layers(self):
+        """ Opens a dialog where multiple collections, layers and styles can be chosen and adds a layer for each of them
+        """
+        if not self.service_url:
+            return self.missing_url()
+        if not self.capabilities.collections:
+            return self.show_message('Layers of the selected instance are not loaded yet.', Message.INFO)
+
+        dialog = LayerSelectionDialog(self.capabilities, self.dockwidget)
+        if dialog.exec_():
+            self.add_qgis_layers(dialog.get_selection())
+
+    def add_qgis_layers(self, selection):
+        """ Adds a layer for every selected layer and style. Layers are created and validated concurrently in
+        background tasks and then added to the project all at once.
+
+        :param selection: List of (collection name, layer, style)
+        :type selection: list((str, Capabilities.Layer, str))
+        """
+        if not selection:
+            return
+        if len(selection) > Settings.batch_max_layers:
+            return self.show_message('At most {} layers can be added at once, {} were selected.'.format(
+                Settings.batch_max_layers, len(selection)), Message.INFO)
+
+        if self.service_type == 'wmts':
+            if not self.check_wmts_capabilities():
+                return
+            unavailable_ids = set(layer.id for _, layer, _ in selection if self.wmts_capabilities.get_tile_matrix_set(
+                layer.id, Settings.parameters_wmts['tileMatrixSet']) is None)
+            unavailable = [layer.name for _, layer, _ in selection if layer.id in unavailable_ids]
+            selection = [item for item in selection if item[1].id not in unavailable_ids]
+            if unavailable:
+                self.show_message('Layers not available in WMTS: {}'.format(', '.join(unavailable)), Message.INFO)
+
+        specs = [self.get_request_spec(collection_name, layer, style) for collection_name, layer, style in selection]
+        sources = [(self.get_layer_uri(spec), spec.get_layer_name()) for spec in specs]
+        new_layers = [None] * len(sources)
+        pending = [len(sources)]
+
+        def create_layer(uri, name):
+            layer = QgsRasterLayer(uri, name, 'wms')
+            layer.moveToThread(QgsApplication.instance().thread())
+            return layer
+
+        def get_callbacks(index):
+            def layer_created(layer, exception):
+                new_layers[index] = layer
+                task_finished()
+
+            def task_finished():
+                pending[0] -= 1
+                if pending[0] == 0:
+                    self.insert_qgis_layers(new_layers, [name for _, name in sources])
+            return layer_created, task_finished
+
+        for index, (uri, name) in enumerate(sources):
+            run_task('Creating layer {}'.format(name), lambda task, uri=uri, name=name: create_layer(uri, name),
+                     *get_callbacks(index))
+
+    def insert_qgis_layers(self, layers, names):
+        """ Adds all valid layers to the project in a single operation
+
+        :param layers: Created layers, None for layers whose creation failed or was canceled
+        :type layers: list(QgsRasterLayer or None)
+        :param names: Names of layers
+        :type names: list(str)
+        """
+        valid_layers = [layer for layer in layers if layer is not None and layer.isValid()]
+        if valid_layers:
+            QgsProject.instance().addMapLayers(valid_layers)
+            self.update_current_wms_layers()
+
+        failed_names = [name for layer, name in zip(layers, names) if layer is None or not layer.isValid()]
+        if failed_names:
+            self.show_message('Failed to create layers: {}'.format(', '.join(failed_names)), Message.CRITICAL)
+        else:
+            self.show_message('Added {} layers.'.format(len(valid_layers)), Message.SUCCESS)
+
+    def get_temporal_controller(self):
+        """
+        :return: Temporal controller of the map canvas or None if QGIS doesn't have it
+        :rtype: QgsTemporalNavigationObject or None
+        """
+        if QgsTemporalNavigationObject is None:
+            return None
+        return self.iface.mapCanvas().temporalController()
+
+    def add_animation_layer(self):
+        """ Finds acquisitions in the selected time interval with WFS requests in background and then adds a single
+        layer which shows them as frames of QGIS temporal controller
+        """
+        if not self.service_url:
+            return self.missing_url()
+        if self.get_temporal_controller() is None:
+            return self.show_message('Animation requires QGIS 3.14 or newer.', Message.INFO)
+        if not self.time0 or self.dockwidget.exactDate.isChecked():
+            return self.show_message('Please select a time interval for animation.', Message.INFO)
+
+        spec = self.get_request_spec()
+        wfs_url = spec.get_wfs_url('/'.join(spec.time.split('/')[:2]), self.bbox_to_string(self.get_bbox(spec.crs),
+                                                                                           spec.crs))
+
+        def acquisitions_found(result, exception):
+            if exception is not None:
+                return self.show_exception(exception)
+            acquisitions, truncated = result
+            if not acquisitions:
+                return self.show_message('No acquisitions found in {}.'.format(spec.time), Message.INFO)
+            if truncated:
+                self.show_truncated_search()
+            self.start_animation(spec, [acquisition.date for acquisition in acquisitions])
+
+        run_task('Searching Euro Data Cube acquisitions',
+                 lambda task: self.find_acquisitions(wfs_url, spec.maxcc, task), acquisitions_found)
+
+    def start_animation(self, spec, dates):
+        """ Adds a layer showing the first acquisition and lets temporal controller step through acquisitions.
+        Only one layer is animated at a time.
+
+        :param spec: Specification of requests, its time is the animated time interval
+        :type spec: RequestSpec
+        :param dates: Sorted acquisition dates in format YYYY-MM-DD
+        :type dates: list(str)
+        """
+        uri = self.get_layer_uri(spec._replace(time='{0}/{0}/P1D'.format(dates[0])))
+        if uri is None:
+            return
+        name = '{} - animation'.format(spec.get_layer_name())
+        layer = QgsRasterLayer(uri, name, 'wms')
+        if not layer.isValid():
+            return self.show_message('Failed to create layer {}.'.format(name), Message.CRITICAL)
+
+        self.stop_animation()
+        QgsProject.instance().addMapLayer(layer)
+        self.animation = AnimationLayer(layer, dates)
+        self.animation.current_date = dates[0]
+        if self.prefetcher is not None:
+            self.prefetcher.set_frames(dates)
+
+        start = QDateTime(QDate.fromString(dates[0], 'yyyy-MM-dd'), QTime(0, 0))
+        end = QDateTime(QDate.fromString(dates[-1], 'yyyy-MM-dd'), QTime(0, 0)).addDays(1)
+        controller = self.get_temporal_controller()
+        controller.setNavigationMode(QgsTemporalNavigationObject.Animated)
+        controller.setTemporalExtents(QgsDateTimeRange(start, end))
+        controller.setFrameDuration(QgsInterval(get_frame_duration(dates), QgsUnitTypes.TemporalDays))
+        controller.updateTemporalRange.connect(self.show_animation_frame)
+
+        self.update_current_wms_layers(selected_layer=layer)
+        self.show_message('Animation of {} acquisitions can be played with the Temporal Controller.'.format(
+            len(dates)), Message.INFO)
+
+    def stop_animation(self):
+        if self.animation is None:
+            return
+        self.get_temporal_controller().updateTemporalRange.disconnect(self.show_animation_frame)
+        self.animation = None
+        if self.prefetcher is not None:
+            self.prefetcher.set_frames([])
+
+    def show_animation_frame(self, temporal_range):
+        """ Shows the acquisition of a new frame of temporal controller by changing time parameter of the animated
+        layer's source
+
+        :param temporal_range: Time range of the frame
+        :type temporal_range: QgsDateTimeRange
+        """
+        if not temporal_range.end().isValid():  # temporal navigation is turned off
+            return
+        date = self.animation.get_frame_date(temporal_range.end().addSecs(-1).date().toString('yyyy-MM-dd'))
+        if date == self.animation.current_date:
+            return
+
+        layer = self.animation.layer
+        try:
+            uri = self.replace_layer_parameters(layer.source(), {'time': '{0}/{0}/P1D'.format(date)})
+        except RuntimeError:  # layer was removed from the project
+            return self.stop_animation()
+        if self.set_layer_source(layer, uri, layer.name()):
+            self.animation.current_date = date
+
     def get_bbox(self, crs=None):
         """
         Get window bbox
         """
         bbox = self.iface.mapCanvas().extent()
-        target_crs = QgsCoordinateReferenceSystem(crs if crs else Settings.parameters['crs'])
+        target_crs = QgsCoordinateReferenceSystem(crs if crs else self.parameters['crs'])
         if is_qgis_version_3():
             current_crs = QgsCoordinateReferenceSystem(self.iface.mapCanvas().mapSettings().destinationCrs().authid())
         else:
@@ -783,20 +1423,11 @@ class EDC_OGC:
 
         return bbox
 
-    @staticmethod
-    def bbox_to_string(bbox, crs=None):
+    def bbox_to_string(self, bbox, crs=None):
         """ Transforms BBox object into string
         """
-        target_crs = QgsCoordinateReferenceSystem(crs if crs else Settings.parameters['crs'])
-
-        if target_crs.authid() == WGS84:
-            precision = 6
-            bbox_list = [bbox.yMinimum(), bbox.xMinimum(), bbox.yMaximum(), bbox.xMaximum()]
-        else:
-            precision = 2
-            bbox_list = [bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum()]
-
-        return ','.join(map(lambda coord: str(round(coord, precision)), bbox_list))
+        target_crs = QgsCoordinateReferenceSystem(crs if crs else self.parameters['crs'])
+        return format_bbox((bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum()), target_crs.authid())
 
     def get_custom_bbox(self):
         """ Creates BBox from values set by user
@@ -824,10 +1455,15 @@ class EDC_OGC:
     def get_bbox_size(self, bbox, crs=None):
         """ Returns approximate width and height of bounding box in meters
         """
-        bbox_crs = QgsCoordinateReferenceSystem(crs if crs else Settings.parameters['crs'])
-        utm_crs = QgsCoordinateReferenceSystem(self.lng_to_utm_zone(
-            (bbox.xMinimum() + bbox.xMaximum()) / 2,
-            (bbox.yMinimum() + bbox.yMaximum()) / 2))
+        bbox_crs = QgsCoordinateReferenceSystem(crs if crs else self.parameters['crs'])
+        center = bbox.center()
+        if bbox_crs.authid() != WGS84:
+            wgs84_crs = QgsCoordinateReferenceSystem(WGS84)
+            if is_qgis_version_3():
+                center = QgsCoordinateTransform(bbox_crs, wgs84_crs, QgsProject.instance()).transform(center)
+            else:
+                center = QgsCoordinateTransform(bbox_crs, wgs84_crs).transform(center)
+        utm_crs = QgsCoordinateReferenceSystem(lng_to_utm_zone(center.x(), center.y()))
         if is_qgis_version_3():
             xform = QgsCoordinateTransform(bbox_crs, utm_crs, QgsProject.instance())
         else:
@@ -838,15 +1474,83 @@ class EDC_OGC:
         return width, height
 
     @staticmethod
-    def lng_to_utm_zone(longitude, latitude):
-        """ Calculates UTM zone from latitude and longitude"""
-        zone = int(math.floor((longitude + 180) / 6) + 1)
-        hemisphere = 6 if latitude > 0 else 7
-        return 'EPSG:32{0}{1:02d}'.format(hemisphere, zone)
+    def can_set_layer_source():
+        """ Data source of an existing layer can be changed only since QGIS 3.6
+        """
+        return is_qgis_version_3() and hasattr(QgsRasterLayer, 'setDataSource') and \
+            hasattr(QgsDataProvider, 'ProviderOptions')
+
+    @staticmethod
+    def set_layer_source(layer, uri, name):
+        """ Changes data source of an existing layer. Layer keeps its renderer, position in the layer tree and
+        images in QGIS tile cache, only the data provider is recreated. If the new source is invalid the previous one
+        is restored.
+
+        :return: True if the layer was updated and False otherwise
+        :rtype: bool
+        """
+        old_uri, old_name = layer.source(), layer.name()
+        renderer = layer.renderer().clone() if layer.renderer() is not None else None
+        options = QgsDataProvider.ProviderOptions()
+        options.transformContext = QgsProject.instance().transformContext()
+
+        layer.setDataSource(uri, name, 'wms', options)
+        if not layer.isValid():
+            layer.setDataSource(old_uri, old_name, 'wms', options)
+            if renderer is not None:
+                layer.setRenderer(renderer)
+            return False
+
+        if renderer is not None:
+            layer.setRenderer(renderer)
+        layer.triggerRepaint()
+        return True
+
+    @staticmethod
+    def is_edc_layer(layer):
+        """ Checks if QGIS layer was created by this plugin, i.e. it is a WMS layer with EDC parameters in its url
+        """
+        if not isinstance(layer, QgsRasterLayer) or layer.providerType() != 'wms':
+            return False
+        url = unquote_plus(layer.source().rpartition('url=')[2])
+        return re.search(r'[?&]maxcc=', url, re.IGNORECASE) is not None
+
+    @staticmethod
+    def replace_layer_parameters(uri, values):
+        """ Replaces values of parameters in the service url which is part of a layer URI
+
+        :param uri: URI of a layer created by this plugin
+        :type uri: str
+        :param values: Dictionary of parameter names and their new values, names are case insensitive
+        :type values: dict(str, str)
+        :rtype: str
+        """
+        prefix, separator, url = uri.rpartition('url=')
+        if not separator:
+            return uri
+        url = unquote_plus(url)
+        for name, value in values.items():
+            url = re.sub(r'([?&]{}=)[^&]*'.format(re.escape(name)), lambda match: match.group(1) + value, url,
+                         flags=re.IGNORECASE)
+        return '{}url={}'.format(prefix, quote_plus(url))
+
+    @staticmethod
+    def get_updated_layer_name(name, spec):
+        """ Replaces time, priority and cloud coverage in a layer name created by RequestSpec.get_layer_name
+        """
+        match = re.match(r'^(.*) \(([^()]*)\)$', name)
+        if match is None:
+            return name
+        plugin_params = match.group(2).split(', ')
+        if len(plugin_params) < 5:
+            return name
+        plugin_params[0] = spec.get_time_name()
+        plugin_params[3:5] = [spec.priority, '{}%'.format(spec.maxcc)]
+        return '{} ({})'.format(match.group(1), ', '.join(plugin_params))
 
     def update_qgis_layer(self):
-        """ Updating layer in pyqgis somehow doesn't work therefore this method creates a new layer and deletes the
-            old one
+        """ Changes data source of the layer selected in the panel to the current parameters. On QGIS versions which
+        can't change a data source a new layer is created and the old one is deleted.
         """
         if not self.service_url:
             return self.missing_url()
@@ -856,18 +1560,56 @@ class EDC_OGC:
             return
 
         for layer in self.get_qgis_layers():
-            # QgsMessageLog.logMessage(str(layer.name()) + ' ' + str(self.qgis_layers[selected_index].name()))
             if layer == self.qgis_layers[selected_index]:
-                self.iface.setActiveLayer(layer)
-                new_layer = self.add_qgis_layer()
-                if new_layer.isValid():
-                    QgsProject.instance().removeMapLayer(layer)
-                    self.update_current_wms_layers(selected_layer=new_layer)
+                if not self.can_set_layer_source():
+                    self.iface.setActiveLayer(layer)
+                    new_layer = self.add_qgis_layer()
+                    if new_layer is not None and new_layer.isValid():
+                        QgsProject.instance().removeMapLayer(layer)
+                        self.update_current_wms_layers(selected_layer=new_layer)
+                    return
+
+                spec = self.get_request_spec()
+                uri = self.get_layer_uri(spec)
+                if uri is None:
+                    return
+                name = spec.get_layer_name()
+                if self.set_layer_source(layer, uri, name):
+                    self.update_current_wms_layers(selected_layer=layer)
+                else:
+                    self.show_message('Failed to update layer {}.'.format(name), Message.CRITICAL)
                 return
         self.show_message('Chosen layer {} does not exist anymore.'
                           ''.format(self.dockwidget.qgisLayerList.currentText()), Message.INFO)
         self.update_current_wms_layers()
 
+    def update_selected_qgis_layers(self):
+        """ Applies the current time, priority and cloud coverage to all EDC layers selected in the QGIS Layers panel.
+        Each layer keeps its service, layer, style and the rest of parameters.
+        """
+        if not self.can_set_layer_source():
+            return self.show_message('Updating multiple layers requires QGIS 3.6 or newer.', Message.INFO)
+
+        layers = [layer for layer in self.iface.layerTreeView().selectedLayers() if self.is_edc_layer(layer)]
+        if not layers:
+            return self.show_message('Please select Euro Data Cube layers in the Layers panel.', Message.INFO)
+
+        spec = self.get_request_spec()
+        values = {
+            'time': spec.time,
+            'priority': spec.priority,
+            'maxcc': spec.maxcc
+        }
+        failed_layers = [layer.name() for layer in layers
+                         if not self.set_layer_source(layer, self.replace_layer_parameters(layer.source(), values),
+                                                      self.get_updated_layer_name(layer.name(), spec))]
+        self.update_current_wms_layers()
+
+        if failed_layers:
+            self.show_message('Failed to update layers: {}'.format(', '.join(failed_layers)), Message.CRITICAL)
+        else:
+            self.show_message('Updated {} layers.'.format(len(layers)), Message.SUCCESS)
+
     def update_parameters(self):
         """
         Update parameters from GUI
@@ -877,9 +1619,9 @@ class EDC_OGC:
             self.update_selected_crs()
             self.update_selected_style()
 
-        Settings.parameters['time'] = self.get_time()
-        Settings.parameters['priority'] = Settings.priorities[self.dockwidget.priority.currentIndex()][0]
-        Settings.parameters['maxcc'] = str(self.dockwidget.maxcc.value())
+        self.parameters['time'] = self.get_time()
+        self.parameters['priority'] = Settings.priorities[self.dockwidget.priority.currentIndex()][0]
+        self.parameters['maxcc'] = str(self.dockwidget.maxcc.value())
 
     def update_selected_crs(self):
         """ Updates crs with selected EDC-OGC CRS
@@ -887,7 +1629,7 @@ class EDC_OGC:
         crs_index = self.dockwidget.epsg.currentIndex()
         wms_crs = self.capabilities.crs_list
         if 0 <= crs_index < len(wms_crs):
-            Settings.parameters['crs'] = wms_crs[crs_index].id
+            self.parameters['crs'] = wms_crs[crs_index].id
 
 
     def set_dimensions(self):
@@ -928,7 +1670,7 @@ class EDC_OGC:
         #     print(dir(box.widget()))
         if self.dockwidget.collections.currentText() != "":
 
-            self.dockwidget.layers.clear()
+            self.layer_names.set_items([])
 
             self.clear_wavelengths_boxes()
             self.clear_dim_boxes()
@@ -940,19 +1682,30 @@ class EDC_OGC:
             self.check_layer_box()
             self.check_dim_box()
             self.check_wave_box()
+            self.schedule_availability_update()
 
-    def update_styles(self, layers, index):
+    def update_styles(self, layer):
         self.dockwidget.styles.clear()
-        self.dockwidget.styles.addItems([style for style in layers[index].styles])
+        self.dockwidget.styles.addItems(layer.styles)
 
-    def update_selected_style(self):
+    def get_selected_layer(self):
+        """ Layer selected in the layers combo box, layers are looked up by position because titles of layers in
+        a collection don't have to be unique
 
-        wms_layers = self.capabilities.layers[self.dockwidget.collections.currentText()]
+        :rtype: Capabilities.Layer or None
+        """
+        wms_layers = self.capabilities.layers.get(self.dockwidget.collections.currentText(), [])
         layer_index = self.dockwidget.layers.currentIndex()
-        styles = wms_layers[layer_index].styles
+        return wms_layers[layer_index] if 0 <= layer_index < len(wms_layers) else None
+
+    def update_selected_style(self):
 
-        if  0 <= self.dockwidget.styles.currentIndex() < len(styles) :
-            Settings.parameters_wms['styles'] = self.dockwidget.styles.currentText()
+        wms_layer = self.get_selected_layer()
+        if wms_layer is None:  # capabilities are not loaded yet
+            return
+
+        if 0 <= self.dockwidget.styles.currentIndex() < len(wms_layer.styles):
+            self.parameters_wms['styles'] = self.dockwidget.styles.currentText()
 
 
 
@@ -960,17 +1713,13 @@ class EDC_OGC:
     def update_selected_layer(self):
         """ Updates properties of selected OGC layer
         """
-        layers_index = self.dockwidget.layers.currentIndex()
-        if self.dockwidget.collections.currentText() != "":
-
-            wms_layers = self.capabilities.layers[self.dockwidget.collections.currentText()]
-
-            if 0 <= layers_index < len(wms_layers):
-                self.update_styles(wms_layers, layers_index)
-                self.update_parameters()
-                Settings.parameters['layers'] = wms_layers[layers_index].id
-                Settings.parameters_wcs['coverage'] = wms_layers[layers_index].id
-                Settings.parameters['title'] = wms_layers[layers_index].name
+        wms_layer = self.get_selected_layer()
+        if wms_layer is not None:
+            self.update_styles(wms_layer)
+            self.update_parameters()
+            self.parameters['layers'] = wms_layer.id
+            self.parameters_wcs['coverage'] = wms_layer.id
+            self.parameters['title'] = wms_layer.name
 
 
     def update_maxcc_label(self):
@@ -986,12 +1735,12 @@ class EDC_OGC:
         :return:
         """
         if self.dockwidget.exactDate.isChecked():
-            return '{}/{}/P1D'.format(self.time0, self.time0)
+            return get_time_parameter(self.time0)
         if self.time0 == '':
             return self.time1
         if self.time1 == '':
-            return '{}/{}/P1D'.format(self.time0, datetime.datetime.now().strftime("%Y-%m-%d"))
-        return '{}/{}/P1D'.format(self.time0, self.time1)
+            return get_time_parameter(self.time0, datetime.datetime.now().strftime("%Y-%m-%d"))
+        return get_time_parameter(self.time0, self.time1)
 
     def add_time(self):
         """
@@ -1023,6 +1772,94 @@ class EDC_OGC:
         style.setBackground(Qt.white)
         self.dockwidget.calendar.setDateTextFormat(QDate(), style)
 
+    def schedule_availability_update(self):
+        """ Calendar availability is refreshed only after changes stop for a while, so that panning the map does
+        not send a request for every intermediate extent
+        """
+        if self.pluginIsActive:
+            self.availability_timer.start()
+
+    def update_availability(self):
+        """ Highlights calendar dates with acquisitions in the current map extent. Only Sentinel-2 tiles (WFS layer
+        S2.TILE) are searched, so the dates are the same for every collection. Acquisitions are cached per instance,
+        month and grid cell, only cells which are not cached yet are queried with WFS in background.
+        """
+        cancel_task(self.availability_task)
+        self.availability_task = None
+        collection = self.dockwidget.collections.currentText()
+        if not self.service_url or not collection:
+            return self.clear_calendar_cells()
+
+        try:
+            extent = self.get_bbox(WGS84)
+        except Exception:  # extent cannot be transformed to WGS84
+            return self.clear_calendar_cells()
+        cells = get_grid_cells((extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()))
+        if len(cells) > Settings.availability_max_cells:  # view is too large for dates to be meaningful
+            return self.clear_calendar_cells()
+
+        month_range = '/'.join(self.get_calendar_month_interval().split('/')[:2])
+        key_prefix = self.service_url, month_range
+        found, missing = [], []
+        for index, cell_bbox in cells:
+            acquisitions = self.availability_cache.get(key_prefix + (index,))
+            if acquisitions is None:
+                wfs_url = get_wfs_url(self.service_url, month_range, format_bbox(cell_bbox, WGS84), WGS84)
+                missing.append((key_prefix + (index,), wfs_url))
+            else:
+                found.append(acquisitions)
+        if not missing:
+            return self.paint_availability(merge_acquisitions(found))
+
+        def find_availability(task):
+            for key, url in missing:
+                acquisitions = get_acquisitions(iter_features(
+                    lambda page_url: self.download_from_url(page_url, raise_exception=True).json(), url,
+                    is_canceled=task.isCanceled, on_truncated=lambda: QgsMessageLog.logMessage(
+                        'Search of available dates stopped at the page limit, some dates may be missing',
+                        'Euro Data Cube')))
+                if task.isCanceled():  # acquisitions of an interrupted query are incomplete and must not be cached
+                    return None
+                self.availability_cache.put(key, acquisitions)
+                found.append(acquisitions)
+            return merge_acquisitions(found)
+
+        def availability_found(acquisitions, exception):
+            self.availability_task = None
+            if exception is not None:
+                # Availability is only a hint, failures are logged instead of interrupting user with a message
+                return QgsMessageLog.logMessage('Failed to obtain available dates: {}'.format(
+                    self.get_error_message(exception)), 'Euro Data Cube')
+            self.paint_availability(acquisitions)
+
+        self.availability_task = run_task('Searching available Euro Data Cube dates', find_availability,
+                                          availability_found)
+
+    def paint_availability(self, acquisitions):
+        """ Paints calendar cells of acquisition dates, the less cloudy the acquisition the stronger the color.
+        Acquisitions with cloud coverage over the selected maximum are painted gray.
+
+        :param acquisitions: Acquisitions found in the current map extent
+        :type acquisitions: list(Acquisition)
+        """
+        self.clear_calendar_cells()
+        maxcc = float(self.dockwidget.maxcc.value())
+        for acquisition in acquisitions:
+            style = QTextCharFormat()
+            if acquisition.cloud_cover is None:
+                style.setBackground(QColor.fromHsv(120, 80, 235))
+                style.setToolTip('Cloud coverage unknown')
+            else:
+                if acquisition.cloud_cover <= maxcc:
+                    style.setBackground(QColor.fromHsv(120, int(40 + 1.6 * (100 - acquisition.cloud_cover)), 235))
+                else:
+                    style.setBackground(QColor(220, 220, 220))
+                style.setToolTip('Cloud coverage {:.1f}%'.format(acquisition.cloud_cover))
+            self.dockwidget.calendar.setDateTextFormat(QDate.fromString(acquisition.date, 'yyyy-MM-dd'), style)
+
+        if self.prefetcher is not None:
+            self.prefetcher.set_dates([acquisition.date for acquisition in acquisitions
+                                       if acquisition.cloud_cover is None or acquisition.cloud_cover <= maxcc])
 
     def move_calendar(self, active):
         """
@@ -1035,6 +1872,62 @@ class EDC_OGC:
             self.dockwidget.calendarSpacer.show()
         self.active_time = active
 
+    def toggle_network_metrics(self, *_):
+        """ Network panel is refreshed periodically only while it is visible
+        """
+        if self.dockwidget.tabWidget.currentWidget() is self.dockwidget.networkTab:
+            self.update_network_metrics()
+            self.metrics_timer.start()
+        else:
+            self.metrics_timer.stop()
+
+    def update_network_metrics(self):
+        """ Shows summary of recorded requests for each type of request in the network panel
+        """
+        def format_seconds(seconds):
+            return '{:.0f} ms'.format(1000 * seconds) if seconds is not None else ''
+
+        summary = self.metrics.summary()
+        metrics_list = self.dockwidget.networkMetrics
+        while metrics_list.topLevelItemCount() > len(summary):
+            metrics_list.takeTopLevelItem(metrics_list.topLevelItemCount() - 1)
+
+        for index, (url_class, stats) in enumerate(summary.items()):
+            item = metrics_list.topLevelItem(index)
+            if item is None:
+                item = QTreeWidgetItem(metrics_list)
+            values = [url_class.upper() if url_class in ('wms', 'wmts', 'wcs', 'wfs') else url_class.capitalize(),
+                      str(stats['requests']), str(stats['failed']), str(stats['retries']), format_size(stats['bytes'])]
+            values.extend(format_seconds(stats[name]) for name in ['latency_p50', 'latency_p95', 'latency_p99',
+                                                                    'ttfb_p50', 'ttfb_p95', 'ttfb_p99'])
+            for column, value in enumerate(values):
+                item.setText(column, value)
+        self.dockwidget.networkMetricsInfo.setText('{} latest requests'.format(len(self.metrics)))
+
+    def export_network_metrics(self, file_format):
+        """ Saves recorded requests into a CSV or JSON file chosen by user
+        """
+        filename = QFileDialog.getSaveFileName(self.dockwidget, 'Export network metrics', self.download_folder,
+                                               '{0} files (*.{1})'.format(file_format.upper(), file_format))
+        if isinstance(filename, tuple):  # PyQt5 returns also the selected filter
+            filename = filename[0]
+        if not filename:
+            return
+        if not filename.lower().endswith('.' + file_format):
+            filename = '{}.{}'.format(filename, file_format)
+        try:
+            if file_format == 'csv':
+                self.metrics.export_csv(filename)
+            else:
+                self.metrics.export_json(filename)
+        except (IOError, OSError) as exception:
+            return self.show_message('Failed to export network metrics: {}'.format(exception), Message.CRITICAL)
+        self.show_message('Network metrics exported to {}'.format(filename), Message.SUCCESS)
+
+    def clear_network_metrics(self):
+        self.metrics.clear()
+        self.update_network_metrics()
+
     def select_destination(self):
         """
         Opens dialog to select destination folder
@@ -1044,110 +1937,70 @@ class EDC_OGC:
         self.dockwidget.destination.setText(folder)
         self.change_download_folder()
 
-    def download_caption(self):
-        """
-        Prepare download request and then download images
-        :return:
+    def prepare_download(self):
+        """ Checks download settings and obtains bounding box of the download area
+
+        :return: Bounding box and its CRS or None if download can't start
+        :rtype: (QgsRectangle, str) or None
         """
         if not self.service_url:
-            return self.missing_url()
+            self.missing_url()
+            return None
 
-        if Settings.parameters_wcs['resx'] == '' or Settings.parameters_wcs['resy'] == '':
-            return self.show_message('Spatial resolution parameters are not set.', Message.CRITICAL)
+        if self.parameters_wcs['resx'] == '' or self.parameters_wcs['resy'] == '':
+            self.show_message('Spatial resolution parameters are not set.', Message.CRITICAL)
+            return None
         if not self.download_current_window:
             for value in self.custom_bbox_params.values():
                 if value == '':
-                    return self.show_message('Custom bounding box parameters are missing.', Message.CRITICAL)
+                    self.show_message('Custom bounding box parameters are missing.', Message.CRITICAL)
+                    return None
 
         self.update_parameters()
 
         if not self.download_folder:
             self.select_destination()
             if not self.download_folder:
-                return self.show_message("Download canceled. No destination set.", Message.CRITICAL)
+                self.show_message("Download canceled. No destination set.", Message.CRITICAL)
+                return None
 
         try:
             bbox = self.get_bbox() if self.download_current_window else self.get_custom_bbox()
         except Exception:
-            return self.show_message("Unable to transform to selected CRS, please zoom in or change CRS",
-                                     Message.CRITICAL)
-
-        bbox_str = self.bbox_to_string(bbox, None if self.download_current_window else WGS84)
-        url = self.get_wcs_url(bbox_str, None if self.download_current_window else WGS84)
-        filename = self.get_filename(bbox_str)
-
-        self.download_wcs_data(url, filename)
-
-    def get_filename(self, bbox):
-        """ Prepare filename which contains some metadata
-        DataSource_LayerName_time0_time1_xmin_y_min_xmax_ymax.FORMAT
-
-        :param bbox:
-        :return:
-        """
-        info_list = [self.dockwidget.collections.currentText(), Settings.parameters['layers']]
-        info_list.append(Settings.parameters['maxcc'])
-        info_list.append(Settings.parameters['priority'])
-        info_list.extend(bbox.split(','))
-
-        name = '.'.join(map(str, ['_'.join(map(str, info_list)),
-                                  Settings.parameters_wcs['format'].split(';')[0].split('/')[1]]))
-        return name.replace(' ', '').replace(':', '_').replace('/', '_')
-
-
+            self.show_message("Unable to transform to selected CRS, please zoom in or change CRS", Message.CRITICAL)
+            return None
 
-    def get_time_name(self):
-        """ Returns time interval in a form that will be displayed in qgis layer name
+        return bbox, self.parameters['crs'] if self.download_current_window else WGS84
 
-        :return: string describing time interval
-        :rtype: str
+    def download_caption(self):
         """
-        time_interval = Settings.parameters['time'].split('/')[:2]
-        if self.dockwidget.exactDate.isChecked():
-            time_interval = time_interval[:1]
-        if len(time_interval) == 1:
-            if not time_interval[0]:
-                time_interval[0] = '-/-'  # 'all times'
-        else:
-            if not time_interval[0]:
-                time_interval[0] = '-'  # 'start'
-            if not time_interval[1]:
-                time_interval[1] = '-'  # 'end'
-        return '/'.join(time_interval)
-
-
-    def get_qgis_layer_name(self):
-        """ Returns name of new qgis layer
-
-        :return: qgis layer name
-        :rtype: str
+        Prepare download request and then download images
+        :return:
         """
-        plugin_params = [self.get_time_name()]
-        collection_name = self.dockwidget.collections.currentText()
-
-        plugin_params.extend([Settings.parameters_wms['styles'], Settings.parameters['crs'],
-                              Settings.parameters['priority'], '{}%'.format(Settings.parameters['maxcc'])])
-
-        # in case of dimension or wavelengths are requested, we need only the collection name
-        if self.dockwidget.dim_check.isChecked():
-           layer_name = self.dim_bands
-
+        area = self.prepare_download()
+        if area is None:
+            return
+        bbox, crs = area
 
-        elif self.dockwidget.wave_check.isChecked():
-            layer_name = self.dim_wavelengths
+        spec = self.get_request_spec()
 
-        elif self.dockwidget.layers_check.isChecked():
-           layer_name = self.dockwidget.layers.currentText()
+        if self.dockwidget.tiledDownload.isChecked():
+            width, height = self.get_image_size(bbox, crs)
+            if max(width, height) > Settings.wcs_tile_size:
+                return self.download_wcs_tiles(spec, bbox, crs, width, height)
 
-        return '{} - {} ({})'.format(collection_name, layer_name, ', '.join(plugin_params))
+        bbox_str = self.bbox_to_string(bbox, crs)
+        url = spec.get_wcs_url(bbox_str, crs)
+        filename = spec.get_filename(bbox_str)
 
+        self.download_wcs_data(url, filename)
 
     def update_download_format(self):
         """
         Update image format
         :return:
         """
-        Settings.parameters_wcs['format'] = Settings.image_formats[self.dockwidget.format.currentIndex()][0]
+        self.parameters_wcs['format'] = Settings.image_formats[self.dockwidget.format.currentIndex()][0]
 
     def change_exact_date(self):
         """
@@ -1163,7 +2016,7 @@ class EDC_OGC:
         else:
             if self.time0 and self.time1 and self.time0 > self.time1:
                 self.time1 = ''
-                Settings.parameters['time'] = self.get_time()
+                self.parameters['time'] = self.get_time()
                 self.dockwidget.time1.setText(self.time1)
 
             self.dockwidget.time1.show()
@@ -1186,21 +2039,26 @@ class EDC_OGC:
             return
         if new_base_url[-1] != '/' :
             new_base_url +=  '/'
-        self.get_instances_list(new_base_url)
 
-        capabilities = self.change_instance_ID(new_base_url)
+        def base_url_loaded(capabilities):
+            # Capabilities were already set and shown by load_capabilities
+            if capabilities:
+                self.base_url = new_base_url
+                QSettings().setValue(Settings.service_url_location, new_base_url)
+                if self.tile_proxy is not None:
+                    self.tile_proxy.allow_base_url(new_base_url)
+            else:
+                self.dockwidget.baseUrl.setText(self.base_url)
 
-        if capabilities:
-            self.base_url = new_base_url
-            self.capabilities = capabilities
-            self.update_instance_props(instance_changed=True)
-            if self.base_url:
-                self.show_message("New URL and layers set.", Message.SUCCESS)
-            QSettings().setValue(Settings.service_url_location, new_base_url)
-            self.update_selected_collection()
+        def instances_loaded(success):
+            if success:
+                self.change_instance_ID(new_base_url, base_url_loaded)
+            else:
+                base_url_loaded(None)
 
-        else:
-            self.dockwidget.baseUrl.setText(self.base_url)
+        self.cancel_loading()
+        self.memory_capabilities.clear()  # capabilities of instances of the previous base url are not needed anymore
+        self.get_instances_list(new_base_url, instances_loaded)
 
     def change_download_folder(self):
         """ Sets new download folder"""
@@ -1222,6 +2080,7 @@ class EDC_OGC:
         :return:
         """
         self.update_parameters()
+        self.schedule_availability_update()
 
     def get_calendar_month_interval(self):
         year = self.dockwidget.calendar.yearShown()
@@ -1258,7 +2117,7 @@ class EDC_OGC:
         else:
             self.time0 = new_time0
             self.time1 = new_time1
-            Settings.parameters['time'] = self.get_time()
+            self.parameters['time'] = self.get_time()
 
         self.dockwidget.time0.setText(self.time0)
         self.dockwidget.time1.setText(self.time1)
@@ -1294,7 +2153,7 @@ class EDC_OGC:
 
         for name, value in new_values.items():
             if name in ['resx', 'resy']:
-                Settings.parameters_wcs[name] = value
+                self.parameters_wcs[name] = value
             else:
                 self.custom_bbox_params[name] = value
 
@@ -1319,12 +2178,13 @@ class EDC_OGC:
     def check_layer_box(self):
 
         if not self.dockwidget.layers_check.isChecked():
-            self.dockwidget.layers.clear()
+            self.layer_names.set_items([])
             self.dockwidget.styles.clear()
         else:
             self.dockwidget.dim_check.setChecked(False)
             self.dockwidget.wave_check.setChecked(False)
-            self.dockwidget.layers.addItems([layer.name for layer in self.capabilities.layers[self.dockwidget.collections.currentText()]])
+            self.layer_names.set_items(self.capabilities.layers[self.dockwidget.collections.currentText()])
+            set_current_position(self.dockwidget.layers, 0)
             self.update_selected_layer()
             self.check_dim_box()
             self.check_wave_box()
@@ -1338,7 +2198,7 @@ class EDC_OGC:
             self.dockwidget.layers_check.setChecked(False)
             self.fill_wave_boxes()
             self.check_dim_box()
-            Settings.parameters['layers'] = self.capabilities.collection_list[self.dockwidget.collections.currentText()]
+            self.parameters['layers'] = self.capabilities.collection_list[self.dockwidget.collections.currentText()]
 
 
     def check_dim_box(self):
@@ -1350,7 +2210,7 @@ class EDC_OGC:
             self.dockwidget.layers_check.setChecked(False)
             self.fill_dim_boxes()
             self.check_wave_box()
-            Settings.parameters['layers'] = self.capabilities.collection_list[self.dockwidget.collections.currentText()]
+            self.parameters['layers'] = self.capabilities.collection_list[self.dockwidget.collections.currentText()]
 
     def run(self):
         """Run method that loads and starts the plugin and binds all UI actions"""
@@ -1361,8 +2221,9 @@ class EDC_OGC:
             if self.dockwidget is None:
                 # Initial function calls
                 self.dockwidget = EDC_OGC_DockWidget()
-                self.get_instances_list(self.base_url)
-                self.capabilities = self.change_instance_ID(self.base_url)
+                set_filterable_model(self.dockwidget.collections, self.collection_names)
+                set_filterable_model(self.dockwidget.layers, self.layer_names)
+                set_filterable_model(self.dockwidget.epsg, self.crs_names)
                 self.init_gui_settings()
                 self.update_month()
                 self.toggle_extent('current')
@@ -1371,7 +2232,13 @@ class EDC_OGC:
 
                 # Bind actions to buttons
                 self.dockwidget.buttonAddWms.clicked.connect(self.add_qgis_layer)
+                self.dockwidget.buttonAnimate.clicked.connect(self.add_animation_layer)
+                self.dockwidget.buttonSelectLayers.clicked.connect(self.select_qgis_layers)
+                self.dockwidget.serviceType.currentIndexChanged.connect(self.change_service_type)
+                self.dockwidget.tileCache.toggled.connect(self.toggle_tile_cache)
+                self.dockwidget.prefetchTiles.toggled.connect(self.toggle_prefetch)
                 self.dockwidget.buttonUpdateWms.clicked.connect(self.update_qgis_layer)
+                self.dockwidget.buttonUpdateSelected.clicked.connect(self.update_selected_qgis_layers)
 
                 # This overrides a press event, better solution would be to detect changes of QGIS layers
                 self.layer_selection_event = self.dockwidget.qgisLayerList.mousePressEvent
@@ -1407,6 +2274,8 @@ class EDC_OGC:
                 self.dockwidget.calendar.currentPageChanged.connect(self.update_month)
                 self.dockwidget.maxcc.valueChanged.connect(self.update_maxcc_label)
                 self.dockwidget.maxcc.sliderReleased.connect(self.update_parameters)
+                self.dockwidget.maxcc.sliderReleased.connect(self.schedule_availability_update)
+                self.iface.mapCanvas().extentsChanged.connect(self.schedule_availability_update)
 
 
                 self.dockwidget.destination.editingFinished.connect(self.change_download_folder)
@@ -1425,9 +2294,28 @@ class EDC_OGC:
 
 
                 self.dockwidget.buttonDownload.clicked.connect(self.download_caption)
+                self.dockwidget.buttonDownloadTimeSeries.clicked.connect(self.download_time_series)
+
+                # Download queue panel
+                self.download_manager.jobsChanged.connect(self.update_download_jobs)
+                self.download_manager.jobFinished.connect(self.download_finished)
+                self.dockwidget.pauseDownload.clicked.connect(self.pause_download)
+                self.dockwidget.resumeDownload.clicked.connect(self.resume_download)
+                self.dockwidget.cancelDownload.clicked.connect(self.cancel_download)
+                self.dockwidget.clearDownloads.clicked.connect(self.download_manager.clear_finished)
                 self.dockwidget.refreshExtent.clicked.connect(self.take_window_bbox)
                 self.dockwidget.selectDestination.clicked.connect(self.select_destination)
-
+                self.dockwidget.tabWidget.currentChanged.connect(self.toggle_network_metrics)
+                self.dockwidget.exportMetricsCsv.clicked.connect(lambda: self.export_network_metrics('csv'))
+                self.dockwidget.exportMetricsJson.clicked.connect(lambda: self.export_network_metrics('json'))
+                self.dockwidget.clearMetrics.clicked.connect(self.clear_network_metrics)
+
+                # Instances and capabilities are loaded in background and combo boxes are filled once they arrive
+                if self.base_url:
+                    self.get_instances_list(self.base_url,
+                                            lambda success: success and self.change_instance_ID(self.base_url))
+                else:
+                    self.change_instance_ID(self.base_url)
 
 
             self.dockwidget.closingPlugin.connect(self.on_close_plugin)
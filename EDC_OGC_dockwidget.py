@@ -18,20 +18,66 @@
 #     email                : info@sentinel-hub.com 
 #-------------------------------------------------------------------------------
 
+import io
 import os.path
+import hashlib
 from sys import version_info
 
 if version_info[0] >= 3:
+    import importlib.util
     from PyQt5.QtWidgets import QDockWidget
-    from PyQt5.uic import loadUiType
+    from PyQt5.uic import loadUiType, compileUi
     from PyQt5.QtCore import pyqtSignal
 else:
     from PyQt4.QtGui import QDockWidget
     from PyQt4.uic import loadUiType
     from PyQt4.QtCore import pyqtSignal
 
-FORM_CLASS, _ = loadUiType(os.path.join(os.path.dirname(__file__),
-                                        'EDC_OGC_dockwidget_base.ui'))
+from qgis.core import QgsApplication
+
+from . import Settings
+
+UI_FILE = os.path.join(os.path.dirname(__file__), 'EDC_OGC_dockwidget_base.ui')
+UI_MODULE_PREFIX = 'EDC_OGC_dockwidget_base_'
+
+
+def get_form_class(cache_dir):
+    """ Generating a form class from the .ui file is slow, therefore the .ui file is compiled into a Python module
+    once per its content and afterwards the module is only imported (from its bytecode). If the module can't be
+    compiled or imported the form class is generated directly from the .ui file.
+
+    :param cache_dir: Folder where compiled modules are stored
+    :type cache_dir: str
+    :return: Form class
+    """
+    if version_info[0] < 3:
+        return loadUiType(UI_FILE)[0]
+
+    try:
+        with open(UI_FILE, 'rb') as ui_file:
+            module_name = UI_MODULE_PREFIX + hashlib.sha1(ui_file.read()).hexdigest()[:16]
+        module_path = os.path.join(cache_dir, '{}.py'.format(module_name))
+
+        if not os.path.exists(module_path):
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            for filename in os.listdir(cache_dir):  # modules compiled from older versions of the .ui file
+                if filename.startswith(UI_MODULE_PREFIX):
+                    os.remove(os.path.join(cache_dir, filename))
+            tmp_path = '{}.tmp'.format(module_path)
+            with io.open(tmp_path, 'w', encoding='utf-8') as module_file:
+                compileUi(UI_FILE, module_file)
+            os.replace(tmp_path, module_path)
+
+        spec = importlib.util.spec_from_file_location(module_name, module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return next(getattr(module, name) for name in dir(module) if name.startswith('Ui_'))
+    except Exception:
+        return loadUiType(UI_FILE)[0]
+
+
+FORM_CLASS = get_form_class(os.path.join(QgsApplication.qgisSettingsDirPath(), Settings.ui_cache_folder))
 
 
 class EDC_OGC_DockWidget(QDockWidget, FORM_CLASS):
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains a lightweight entry point of the plugin. At QGIS startup it only registers the toolbar action
+and, if the local tile cache is enabled, starts the caching proxy which layers of saved projects depend on. The plugin
+itself with all its dependencies and the dock widget is loaded when the action is used for the first time.
+"""
+
+import os.path
+import time
+import importlib
+from collections import OrderedDict
+from sys import version_info
+
+if version_info[0] >= 3:
+    from PyQt5.QtCore import QCoreApplication, QSettings
+    from PyQt5.QtGui import QIcon
+    from PyQt5.QtWidgets import QAction
+else:
+    from PyQt4.QtCore import QCoreApplication, QSettings
+    from PyQt4.QtGui import QIcon, QAction
+
+from qgis.core import QgsApplication, QgsMessageLog
+
+if version_info[0] >= 3:
+    from qgis.core import QgsProject
+else:
+    from qgis.core import QgsMapLayerRegistry as QgsProject
+
+from . import Settings
+
+
+class StartupReport:
+    """ Collects durations of steps of loading the plugin
+    """
+    def __init__(self):
+        self.durations = OrderedDict()
+
+    def measure(self, name, function, *args):
+        """ Calls function with given arguments and stores how long it took
+
+        :return: Result of the function
+        """
+        start = time.time()
+        try:
+            return function(*args)
+        finally:
+            self.durations[name] = time.time() - start
+
+    def __str__(self):
+        steps = ', '.join('{} {:.1f} ms'.format(name, 1000 * duration) for name, duration in self.durations.items())
+        return 'Loading times: {} (total {:.1f} ms)'.format(steps, 1000 * sum(self.durations.values()))
+
+
+class EDC_OGC_Loader:
+    """ Registers the plugin action in QGIS and loads EDC_OGC plugin once the action is triggered
+    """
+
+    def __init__(self, iface):
+        self.iface = iface
+        self.plugin_dir = os.path.dirname(__file__)
+        self.plugin = None
+        self.tile_proxy = None  # proxy started before the plugin is loaded, the plugin takes it over
+        self.actions = []
+        self.menu = self.translate(u'&Euro Data Cube')
+        self.toolbar = None
+        self.report = StartupReport()
+
+    @staticmethod
+    def translate(message):
+        """Get the translation for a string using Qt translation API.
+        """
+        return QCoreApplication.translate('Euro Data Cube', message)
+
+    def add_action(self, icon_path, text, callback, enabled_flag=True, add_to_menu=True, add_to_toolbar=True,
+                   status_tip=None, whats_this=None, parent=None):
+        """Add a toolbar icon to the toolbar.
+        """
+        icon = QIcon(icon_path)
+        action = QAction(icon, text, parent)
+        action.triggered.connect(callback)
+        action.setEnabled(enabled_flag)
+
+        if status_tip is not None:
+            action.setStatusTip(status_tip)
+
+        if whats_this is not None:
+            action.setWhatsThis(whats_this)
+
+        if add_to_toolbar:
+            self.toolbar.addAction(action)
+
+        if add_to_menu:
+            self.iface.addPluginToWebMenu(
+                self.menu,
+                action)
+
+        self.actions.append(action)
+
+        return action
+
+    def initGui(self):  # This method is called by QGIS
+        """Create the menu entries and toolbar icons inside the QGIS GUI."""
+        start = time.time()
+        self.toolbar = self.iface.addToolBar(u'Euro Data Cube')
+        self.toolbar.setObjectName(u'Euro Data Cube')
+
+        # Icon is read from the file so that compiled resources don't have to be imported at startup
+        self.add_action(
+            os.path.join(self.plugin_dir, 'favicon.ico'),
+            text=self.translate(u'Euro Data Cube'),
+            callback=self.run,
+            parent=self.iface.mainWindow())
+        self.report.durations['toolbar action'] = time.time() - start
+
+        # Layers saved with local tile cache load images through a proxy, so only the proxy is started at startup
+        if QSettings().value(Settings.tile_cache_enabled_location, False, type=bool):
+            self.report.measure('tile proxy', self.start_tile_proxy)
+        QgsProject.instance().layersAdded.connect(self.layers_added)
+
+    def start_tile_proxy(self):
+        """ Starts local caching proxy without loading the rest of the plugin
+        """
+        package = __name__.rpartition('.')[0]
+        qgis_settings = importlib.import_module('.qgis_settings', package)
+        tile_proxy_module = importlib.import_module('.tile_proxy', package)
+        tile_proxy = tile_proxy_module.TileProxy(qgis_settings.create_session(),
+                                                 os.path.join(QgsApplication.qgisSettingsDirPath(),
+                                                              Settings.tile_cache_folder))
+        try:
+            tile_proxy.start()
+        except (IOError, OSError) as exception:
+            QgsMessageLog.logMessage('Failed to start local tile cache, ports {} are not available: {}. Layers which '
+                                     'use the tile cache will not show images.'.format(tile_proxy.port_range, exception),
+                                     'Euro Data Cube')
+            return
+        if tile_proxy.port != tile_proxy.preferred_port:
+            QgsMessageLog.logMessage('Local tile cache runs on port {}, port {} is used by another application'.format(
+                tile_proxy.port, tile_proxy.preferred_port), 'Euro Data Cube')
+        tile_proxy.adopt_layers(QgsProject.instance().mapLayers().values())
+        self.tile_proxy = tile_proxy
+
+    def layers_added(self, layers):
+        """ Allows service urls of added layers which load images through the local tile cache, e.g. layers of a loaded
+        project, so that layers under other base urls than the last one keep working
+        """
+        tile_proxy = self.plugin.tile_proxy if self.plugin is not None else self.tile_proxy
+        if tile_proxy is not None:
+            tile_proxy.adopt_layers(layers)
+
+    def load_plugin(self):
+        """ Imports the plugin and its heavy dependencies, each of them is measured separately
+        """
+        package = __name__.rpartition('.')[0]
+        self.report.measure('requests import', importlib.import_module, 'requests')
+        self.report.measure('resources import', importlib.import_module, '.resources', package)
+        self.report.measure('dock widget form', importlib.import_module, '.EDC_OGC_dockwidget', package)
+        module = self.report.measure('plugin import', importlib.import_module, '.EDC_OGC', package)
+        self.plugin = self.report.measure('plugin initialization', module.EDC_OGC, self.iface, self.tile_proxy)
+        self.tile_proxy = None
+
+    def run(self):
+        """ Opens the plugin, the first call loads it and logs how long each part of loading took
+        """
+        if self.plugin is None:
+            self.load_plugin()
+        if self.report is None:
+            return self.plugin.run()
+
+        self.report.measure('dock widget setup', self.plugin.run)
+        QgsMessageLog.logMessage(str(self.report), 'Euro Data Cube')
+        self.report = None
+
+    def unload(self):
+        """Removes the plugin menu item and icon from QGIS GUI."""
+        QgsProject.instance().layersAdded.disconnect(self.layers_added)
+        if self.plugin is not None:
+            self.plugin.unload()
+        elif self.tile_proxy is not None:
+            self.tile_proxy.stop()
+            self.tile_proxy.session.close()
+            self.tile_proxy = None
+
+        for action in self.actions:
+            self.iface.removePluginWebMenu(
+                self.translate(u'&Euro Data Cube'),
+                action)
+            self.iface.removeToolBarIcon(action)
+        del self.toolbar
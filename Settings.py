@@ -6,9 +6,67 @@ This script contains parameters and settings for Euro Data Cube services
 # Locations where QGIS will save values
 service_url_location = "EuroDataCube/service_base_url"
 download_folder_location = "EuroDataCube/download_folder"
+capabilities_cache_ttl_location = "EuroDataCube/capabilities_cache_ttl"
+capabilities_cache_size_location = "EuroDataCube/capabilities_cache_size"
+tile_cache_enabled_location = "EuroDataCube/tile_cache_enabled"
+prefetch_enabled_location = "EuroDataCube/prefetch_enabled"
+
+# Capabilities cache - name of the folder inside QGIS settings folder, number of seconds for which cached
+# capabilities are used without revalidation, maximal number of cached service instances and number of seconds after
+# which an entry without metadata is considered abandoned (before that it may be written by another QGIS process)
+capabilities_cache_folder = 'EuroDataCube/cache'
+capabilities_cache_ttl = 24 * 60 * 60
+capabilities_cache_max_entries = 50
+capabilities_cache_orphan_age = 60 * 60
+
+# Folder inside QGIS settings folder where the dock widget form compiled from the .ui file is cached
+ui_cache_folder = 'EuroDataCube/ui'
+
+# Local tile cache - name of the folder inside QGIS settings folder, preferred localhost port of the caching proxy and
+# number of following ports which are tried if it is taken (layers of saved projects are switched to the actual port),
+# maximal size of cached images in bytes, number of seconds for which cached images are served without revalidation
+# and refresh interval of statistics in the panel in milliseconds
+tile_cache_folder = 'EuroDataCube/tiles'
+tile_proxy_port = 47815
+tile_proxy_port_attempts = 10
+tile_cache_max_size = 512 * 1024 * 1024
+tile_cache_ttl = 24 * 60 * 60
+tile_cache_stats_interval = 2000
+
+# Prefetching into the local tile cache - number of concurrent downloads, maximal download rate in bytes per second,
+# maximal number of queued images (the oldest are dropped first) and number of seconds without map requests of QGIS
+# after which prefetching continues. Prefetching observes requests passing through the local tile proxy, so it works only
+# while the tile cache is enabled.
+prefetch_workers = 2
+prefetch_max_bandwidth = 2 * 1024 * 1024
+prefetch_max_queue = 200
+prefetch_idle_delay = 0.5
+
+# Animation of a layer by QGIS temporal controller - number of frames following the shown one which are prefetched
+# into the local tile cache
+animation_frames_ahead = 4
+
+# HTTP session - number of retries of failed requests, exponential backoff factor in seconds, response statuses which
+# are retried, number of kept-alive connections per host and (connect, read) timeout in seconds
+http_retries = 3
+http_backoff_factor = 0.5
+http_retry_statuses = (500, 502, 503, 504)
+http_pool_size = 10
+http_timeout = (15, 120)
+
+# WMS error diagnostics - number of seconds for which the same error url is not requested again and the same message
+# is not shown again, timeout of requests for error details in seconds, maximal number of simultaneous requests for
+# error details and minimal number of seconds between two notifications
+wms_error_ttl = 60
+wms_error_timeout = 10
+wms_error_max_fetches = 2
+wms_error_notification_interval = 5
 
 service_types = ['WMS', 'WMTS']
 
+# Maximal number of layers which can be added at once from the layer selection dialog
+batch_max_layers = 50
+
 # Main request parameters
 parameters = {
     'title': '',
@@ -83,3 +141,53 @@ image_formats = [('image/png', 'PNG'),
                  ('image/tiff;depth=32f', '32-bit float TIFF')]
 
 max_cloud_cover_image_size = 1000000
+
+# Streamed download - size of written chunks in bytes and number of attempts to resume an interrupted transfer
+download_chunk_size = 1024 * 1024
+download_attempts = 3
+
+# Download queue - maximal number of simultaneously running download jobs, refresh interval of the download panel in
+# milliseconds and interval in seconds over which download speed is measured
+download_max_jobs = 2
+download_refresh_interval = 500
+download_speed_interval = 1.0
+
+# Time series export - maximal number of requested WFS pages and number of concurrently downloaded acquisitions
+wfs_max_pages = 50
+time_series_workers = 4
+
+# Calendar availability - size of grid cells in degrees for which WFS queries are cached, maximal number of cells
+# queried for one view, number of cached (collection, month, cell) entries and delay in milliseconds after the last
+# change of map extent or month before the calendar is refreshed
+availability_cell_size = 1.0
+availability_max_cells = 16
+availability_cache_size = 2000
+availability_delay = 700
+
+# Tiled WCS download - maximal tile width and height in pixels, number of concurrently downloaded tiles and GDAL
+# creation options of the output mosaic
+wcs_tile_size = 2048
+wcs_tile_workers = 4
+mosaic_creation_options = ('TILED=YES', 'COMPRESS=DEFLATE', 'BIGTIFF=IF_SAFER')
+
+# Command line batch download - number of concurrently downloaded files, default CRS of bounding boxes in job files
+# and minimal interval in seconds between two progress lines
+cli_workers = 4
+cli_default_crs = 'EPSG:4326'
+cli_progress_interval = 1.0
+
+# Network metrics - number of the latest requests kept in memory and refresh interval of the network panel in
+# milliseconds
+metrics_buffer_size = 5000
+metrics_refresh_interval = 2000
+
+# Capabilities loading - number of requests sent in parallel with background tasks, e.g. JSON capabilities
+capabilities_workers = 4
+
+# Capabilities preloading - number of instances whose capabilities are loaded at the same time after the list of
+# instances arrives and maximal number of preloaded instances
+preload_workers = 3
+preload_max_instances = 20
+
+# Collections, layers and CRS combo boxes - number of rows which are added to a list at once while it is scrolled
+item_model_batch_size = 200
@@ -5,10 +5,10 @@
 
 
 def classFactory(iface):
-    """Load EDC_OGC class from file EDC_OGC.
+    """Load EDC_OGC_Loader class from file EDC_OGC_loader. The plugin itself is loaded when it is opened.
 
     :param iface: A QGIS interface instance.
     :type iface: QgsInterface
     """
-    from .EDC_OGC import EDC_OGC
-    return EDC_OGC(iface)
+    from .EDC_OGC_loader import EDC_OGC_Loader
+    return EDC_OGC_Loader(iface)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains frame logic of a layer which is animated by QGIS temporal controller
+"""
+
+import bisect
+import datetime
+from collections import Counter
+
+
+def parse_day(date):
+    return datetime.datetime.strptime(date, '%Y-%m-%d').date()
+
+
+def get_frame_duration(dates):
+    """ Most common number of days between consecutive acquisitions, it is used as the step of the animation so that
+    most frames show a new acquisition
+
+    :param dates: Sorted dates in format YYYY-MM-DD
+    :type dates: list(str)
+    :rtype: int
+    """
+    days = [parse_day(date) for date in dates]
+    gaps = Counter((next_day - day).days for day, next_day in zip(days, days[1:]))
+    return max(gaps.most_common(1)[0][0], 1) if gaps else 1
+
+
+class AnimationLayer:
+    """ A single QGIS layer which shows one acquisition per frame of the temporal controller. Frames are changed
+    by replacing the time parameter of the layer source, the layer itself is never recreated.
+    """
+
+    def __init__(self, layer, dates):
+        """
+        :param layer: Layer created by the plugin
+        :type layer: QgsRasterLayer
+        :param dates: Sorted acquisition dates in format YYYY-MM-DD
+        :type dates: list(str)
+        """
+        self.layer = layer
+        self.dates = dates
+        self.current_date = None
+
+    def get_frame_date(self, last_day):
+        """ The latest acquisition date which isn't after the last day of a frame, frames before the first
+        acquisition show the first one
+
+        :param last_day: The last day of a frame in format YYYY-MM-DD
+        :type last_day: str
+        :rtype: str
+        """
+        index = bisect.bisect_right(self.dates, last_day)
+        return self.dates[max(index - 1, 0)]
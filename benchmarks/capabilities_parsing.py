@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of capabilities parsing on a synthetic WMS capabilities document
+
+Usage (from the plugin folder):
+    python benchmarks/capabilities_parsing.py --layers 10000
+
+It compares the streaming parser of Capabilities class with the previous approach which built the whole
+ElementTree and re-sorted layer lists after every appended layer, and with rehydrating capabilities from a cached
+binary snapshot. Reported are the best time of all repeats and the peak memory allocated by Python.
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from capabilities import Capabilities  # noqa: E402
+
+
+NAMESPACE = 'http://www.opengis.net/wms'
+
+
+def create_document(layers, sublayers, crs_count=50):
+    """ Creates a capabilities document with the given total number of layers split into collections
+    """
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<WMS_Capabilities xmlns="{}" version="1.3.0">'.format(NAMESPACE),
+             '<Service><Name>WMS</Name><Title>Synthetic service</Title></Service>',
+             '<Capability><Layer><Title>Root</Title>']
+    parts.extend('<CRS>EPSG:{}</CRS>'.format(32600 + index) for index in range(crs_count))
+    parts.append('<CRS>EPSG:3857</CRS><CRS>EPSG:4326</CRS>')
+
+    for collection in range(max(layers // sublayers, 1)):
+        parts.append('<Layer><Name>COLLECTION_{0}</Name><Title>Collection {0:05d}</Title>'
+                     '<Abstract>Synthetic collection {0}</Abstract>'
+                     '<Dimension name="dim_bands">B01,B02,B03,B04</Dimension>'.format(collection))
+        # Layers are added in reverse order so that sorting has some work to do
+        for layer in reversed(range(sublayers)):
+            parts.append('<Layer><Name>LAYER_{0}_{1}</Name><Title>Layer {1:05d}</Title>'
+                         '<Abstract>Synthetic layer {1} of collection {0}</Abstract>'
+                         '<Style><Name>default</Name></Style><Style><Name>SENSOR</Name></Style>'
+                         '</Layer>'.format(collection, layer))
+        parts.append('</Layer>')
+
+    parts.append('</Layer></Capability></WMS_Capabilities>')
+    return '\n'.join(parts).encode('utf-8')
+
+
+def load_xml_tree(capabilities, xml):
+    """ Previous parser which keeps the whole document tree and sorts after every appended layer
+    """
+    xml_root = ElementTree.fromstring(xml)
+    namespace = '{}}}'.format(xml_root.tag.split('}')[0]) if xml_root.tag.startswith('{') else ''
+
+    def map_layers(layer, layers_group):
+        layers_group.append(capabilities.create_layer(layer, namespace))
+        layers_group.sort(key=lambda l: l.name)
+
+    for layer in xml_root.findall('./{0}Capability/{0}Layer/{0}Layer'.format(namespace)):
+        layer_name = layer.find('{}Title'.format(namespace)).text
+        sub_layers = layer.findall('./{0}Layer'.format(namespace))
+        capabilities.collection_list[layer_name] = layer.find('{}Name'.format(namespace)).text
+        map_layers(layer, capabilities.collections)
+        sublayers = []
+        for sub_layer in sub_layers or [layer]:
+            map_layers(sub_layer, sublayers)
+        capabilities.layers[layer_name] = sublayers
+
+    capabilities.crs_list = [capabilities.CRS(crs.text, crs.text.replace(':', ': '))
+                             for crs in xml_root.findall('./{0}Capability/{0}Layer/{0}CRS'.format(namespace))]
+    return xml_root
+
+
+def measure(parse, xml, repeat):
+    """ Returns the best time in seconds and peak traced memory in bytes
+    """
+    best_time = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(Capabilities(), xml)
+        elapsed = time.perf_counter() - start
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+
+    tracemalloc.start()
+    result = parse(Capabilities(), xml)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best_time, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--layers', type=int, default=10000, help='Total number of layers in the document')
+    parser.add_argument('--sublayers', type=int, default=1000, help='Number of layers per collection')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed repeats')
+    args = parser.parse_args()
+
+    xml = create_document(args.layers, args.sublayers)
+    print('Document: {} layers, {:.1f} MB'.format(args.layers, len(xml) / 2 ** 20))
+
+    capabilities = Capabilities()
+    capabilities.load_xml(xml)
+    snapshot = capabilities.to_bytes()
+    print('Snapshot: {:.1f} MB'.format(len(snapshot) / 2 ** 20))
+
+    for name, parse, content in [('streaming', lambda capabilities, content: capabilities.load_xml(content), xml),
+                                 ('tree', load_xml_tree, xml),
+                                 ('snapshot', lambda _, content: Capabilities.from_bytes(content), snapshot)]:
+        best_time, peak = measure(parse, content, args.repeat)
+        print('{:>10}: {:8.1f} ms, peak memory {:6.1f} MB'.format(name, 1000 * best_time, peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
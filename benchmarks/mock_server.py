@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for EDC-OGC service which is used by benchmarks and for manual testing of the plugin
+
+Usage (from the plugin folder):
+    python benchmarks/mock_server.py --port 8080 --layers 5000 --latency 0.05 --bandwidth 2000000
+
+Then use http://127.0.0.1:8080 as the base url of the plugin. The server answers:
+    /instances.json                           list of instances
+    /<instance>?service=wms&request=GetCapabilities[&format=application/json]
+                                              WMS capabilities XML or JSON with the configured number of layers
+    /<instance>?service=WFS&request=GetFeature&feature_offset=...
+                                              pages of synthetic S2.TILE features
+    /<instance>?service=wcs&request=GetCoverage
+                                              synthetic image payload, its size is given by width and height
+                                              parameters or by the --wcs-size option
+Every response is delayed by the latency and streamed with the limited bandwidth.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qsl
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qsl
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from capabilities_parsing import create_document  # noqa: E402
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class MockConfig:
+    """ Sizes of generated documents and simulated network conditions
+    """
+
+    def __init__(self, instances=5, layers=1000, sublayers=100, features=250, wcs_size=1024 * 1024, latency=0.0,
+                 bandwidth=None):
+        """
+        :param instances: Number of listed instances
+        :type instances: int
+        :param layers: Total number of layers in WMS capabilities
+        :type layers: int
+        :param sublayers: Number of layers per collection
+        :type sublayers: int
+        :param features: Total number of WFS features of every GetFeature request
+        :type features: int
+        :param wcs_size: Size of WCS payload in bytes if a request doesn't specify width and height
+        :type wcs_size: int
+        :param latency: Number of seconds before a response starts
+        :type latency: float
+        :param bandwidth: Maximal number of bytes per second of a single response or None for unlimited
+        :type bandwidth: int or None
+        """
+        self.instances = instances
+        self.layers = layers
+        self.sublayers = sublayers
+        self.features = features
+        self.wcs_size = wcs_size
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+
+class MockHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parameters = {name.lower(): value for name, value in parse_qsl(url.query)}
+        service = parameters.get('service', '').lower()
+        self.server.count_request(service or url.path.rsplit('/', 1)[-1])
+
+        if url.path.endswith('/instances.json'):
+            return self.send_json(self.server.get_instances())
+        if service == 'wms' and parameters.get('request', '').lower() == 'getcapabilities':
+            if parameters.get('format') == 'application/json':
+                return self.send_json(self.server.get_capabilities_json())
+            return self.send_body(self.server.get_capabilities_xml(), 'text/xml')
+        if service == 'wfs':
+            return self.send_json(self.server.get_features(parameters))
+        if service == 'wcs':
+            return self.send_payload(parameters)
+        self.send_error(404)
+
+    def send_json(self, value):
+        self.send_body(json.dumps(value).encode('utf-8'), 'application/json')
+
+    def send_payload(self, parameters):
+        try:
+            size = int(parameters['width']) * int(parameters['height']) * 3
+        except (KeyError, ValueError):
+            size = self.server.config.wcs_size
+        self.send_body(b'\0' * size, parameters.get('format', 'image/png').split(';')[0])
+
+    def send_body(self, body, content_type):
+        config = self.server.config
+        if config.latency:
+            time.sleep(config.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        start_time = time.time()
+        for offset in range(0, len(body), CHUNK_SIZE):
+            self.wfile.write(body[offset:offset + CHUNK_SIZE])
+            if config.bandwidth:
+                delay = start_time + (offset + CHUNK_SIZE) / float(config.bandwidth) - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockServer(ThreadingMixIn, HTTPServer):
+    """ Mock EDC-OGC service which runs in a background thread
+    """
+
+    daemon_threads = True
+
+    def __init__(self, config=None, port=0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), MockHandler)
+        self.config = config or MockConfig()
+        self.request_counts = {}
+        self._documents = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count_request(self, name):
+        with self._lock:
+            self.request_counts[name] = self.request_counts.get(name, 0) + 1
+
+    def get_instances(self):
+        return [{'name': 'Instance {}'.format(index), 'id': '/instance-{}'.format(index)}
+                for index in range(self.config.instances)]
+
+    def get_capabilities_xml(self):
+        with self._lock:
+            if 'xml' not in self._documents:
+                self._documents['xml'] = create_document(self.config.layers, self.config.sublayers)
+            return self._documents['xml']
+
+    def get_capabilities_json(self):
+        sublayers = min(self.config.sublayers, self.config.layers)
+        return {'layers': [{'id': 'LAYER_{}_{}'.format(collection, layer), 'dataset': 'S2L1C'}
+                           for collection in range(max(self.config.layers // sublayers, 1))
+                           for layer in range(sublayers)]}
+
+    def get_features(self, parameters):
+        """ A page of S2.TILE features, acquisitions are spread over the requested time range with 5 days step
+        """
+        offset, page_size = int(parameters.get('feature_offset', 0)), int(parameters.get('maxfeatures', 100))
+        try:
+            start = datetime.datetime.strptime(parameters.get('time', '').split('/')[0], '%Y-%m-%d')
+        except ValueError:
+            start = datetime.datetime(2020, 1, 1)
+        features = [{
+            'type': 'Feature',
+            'properties': {
+                'id': 'TILE_{}'.format(index),
+                'date': (start + datetime.timedelta(days=5 * (index // 4))).strftime('%Y-%m-%d'),
+                'cloudCoverPercentage': (index * 37) % 100
+            },
+            'geometry': None
+        } for index in range(offset, min(offset + page_size, self.config.features))]
+        return {'type': 'FeatureCollection', 'features': features}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--instances', type=int, default=5)
+    parser.add_argument('--layers', type=int, default=1000, help='Total number of layers in capabilities')
+    parser.add_argument('--sublayers', type=int, default=100, help='Number of layers per collection')
+    parser.add_argument('--features', type=int, default=250, help='Number of WFS features per query')
+    parser.add_argument('--wcs-size', type=int, default=1024 * 1024, help='Size of WCS payload in bytes')
+    parser.add_argument('--latency', type=float, default=0.0, help='Delay of every response in seconds')
+    parser.add_argument('--bandwidth', type=int, help='Bytes per second of every response')
+    args = parser.parse_args()
+
+    config = MockConfig(args.instances, args.layers, args.sublayers, args.features, args.wcs_size, args.latency,
+                        args.bandwidth)
+    server = MockServer(config, args.port)
+    print('Serving mock EDC-OGC service at {}'.format(server.base_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the plugin against a local mock EDC-OGC service
+
+Usage (from the plugin folder):
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --baseline results.json --tolerance 0.2
+
+It measures capabilities parsing, url builders, WCS download throughput, WFS acquisition search, the time from
+an empty base url to listed layers (instances, WMS capabilities XML and JSON and their parsing, without GUI) and
+a batch of the command line downloader. Results are written as JSON together with the plugin version, so they can be
+compared with results of previous releases. Correctness is checked by tests in the tests folder, not here.
+With --baseline the exit code is 1 if any result is worse than the baseline by more than the tolerance.
+"""
+
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+
+from mock_server import MockConfig, MockServer  # noqa: E402
+
+# Modules of the plugin use relative imports, therefore the plugin folder is imported as a package
+PLUGIN_PACKAGE = importlib.import_module(os.path.basename(PLUGIN_DIR)).__name__
+capabilities = importlib.import_module(PLUGIN_PACKAGE + '.capabilities')
+cli = importlib.import_module(PLUGIN_PACKAGE + '.cli')
+core = importlib.import_module(PLUGIN_PACKAGE + '.core')
+download = importlib.import_module(PLUGIN_PACKAGE + '.download')
+network = importlib.import_module(PLUGIN_PACKAGE + '.network')
+request_spec = importlib.import_module(PLUGIN_PACKAGE + '.request_spec')
+wfs = importlib.import_module(PLUGIN_PACKAGE + '.wfs')
+
+
+def get_plugin_version():
+    with open(os.path.join(PLUGIN_DIR, 'metadata.txt')) as metadata_file:
+        for line in metadata_file:
+            if line.startswith('version'):
+                return line.split('=')[1].strip()
+    return '?'
+
+
+def best_time(function, repeat):
+    """ The best time of all repeats in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def result(value, unit, better='lower', **info):
+    return dict(info, value=round(value, 3), unit=unit, better=better)
+
+
+def bench_capabilities_parsing(server, args):
+    xml = server.get_capabilities_xml()
+
+    def parse():
+        capabilities.Capabilities(server.base_url).load_xml(xml)
+
+    return {'capabilities_load_xml': result(1000 * best_time(parse, args.repeat), 'ms', layers=args.layers,
+                                            document_bytes=len(xml))}
+
+
+def bench_url_builders(server, args):
+    spec = request_spec.RequestSpec(
+        service_url=server.base_url + '/instance-0', service_type='wms', collection='Collection 00000',
+        layer='LAYER_0_0', title='Layer 00000', layer_name='Layer 00000', style='default',
+        time='2020-01-01/2020-01-31/P1D', exact_date=False, priority='mostRecent', maxcc='100', crs='EPSG:3857',
+        dimensions=(('dim_bands', 'B04,B03,B02'),), image_format='image/tiff;depth=32f', resx='10', resy='10')
+    bbox = request_spec.format_bbox((14.45, 46.03, 14.55, 46.08), 'EPSG:4326')
+    builders = [
+        ('wms_uri', lambda: spec.get_wms_uri()),
+        ('wmts_uri', lambda: spec.get_wmts_uri('PopularWebMercator512', 'EPSG:3857')),
+        ('wcs_url', lambda: spec.get_wcs_url(bbox, 'EPSG:4326')),
+        ('wfs_url', lambda: spec.get_wfs_url('2020-01-01/2020-01-31', bbox, 'EPSG:4326')),
+        ('filename', lambda: spec.get_filename(bbox)),
+        ('layer_name', lambda: spec.get_layer_name())
+    ]
+    calls = args.calls
+
+    def call_all(builder):
+        for _ in range(calls):
+            builder()
+
+    return {'url_builder_{}'.format(name): result(1e6 * best_time(lambda: call_all(builder), args.repeat) / calls,
+                                                  'us/call')
+            for name, builder in builders}
+
+
+def bench_wcs_download(server, args):
+    session = network.HttpSession('edc_benchmark')
+    url = request_spec.RequestSpec(
+        service_url=server.base_url + '/instance-0', service_type='wms', collection='Collection', layer='LAYER_0_0',
+        title='', layer_name='', style='', time='2020-01-01/2020-01-01/P1D', exact_date=True, priority='mostRecent',
+        maxcc='100', crs='EPSG:4326', dimensions=(), image_format='image/tiff;depth=32f', resx='10', resy='10'
+    ).get_wcs_url('46.03,14.45,46.08,14.55')
+    folder = tempfile.mkdtemp(prefix='edc_benchmark_')
+    results = {}
+    try:
+        for workers in (1, args.workers):
+            def download_all():
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    for future in [executor.submit(download.download_file, session, url,
+                                                   os.path.join(folder, 'file_{}'.format(index)))
+                                   for index in range(args.files)]:
+                        future.result()
+
+            elapsed = best_time(download_all, args.repeat)
+            results['wcs_download_{}_workers'.format(workers)] = result(
+                args.files * args.wcs_size / elapsed / 2 ** 20, 'MB/s', better='higher', files=args.files,
+                file_bytes=args.wcs_size, workers=workers)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def bench_wfs_acquisitions(server, args):
+    session = network.HttpSession('edc_benchmark')
+    url = request_spec.get_wfs_url(server.base_url + '/instance-0', '2020-01-01/2020-12-31', '46.0,14.0,46.5,15.0',
+                                   'EPSG:4326')
+
+    def search():
+        wfs.get_acquisitions(wfs.iter_features(lambda page_url: session.get(page_url).json(), url))
+
+    return {'wfs_acquisitions': result(1000 * best_time(search, args.repeat), 'ms', features=args.features)}
+
+
+def bench_layers_listed(server, args):
+    """ Time from base url to listed layers of the first instance, it follows the requests of the plugin when its
+    dock is opened, without capabilities cache
+    """
+    def list_layers():
+        session = network.HttpSession('edc_benchmark')
+        instances = json.loads(session.get(server.base_url + '/instances.json').text)
+        service_url = server.base_url + instances[0]['id']
+        wms_capabilities = capabilities.Capabilities(service_url)
+        with ThreadPoolExecutor(max_workers=1) as executor:  # XML and JSON are requested in parallel like in plugin
+            json_future = executor.submit(session.get, core.get_capabilities_url(service_url, 'wms', get_json=True))
+            wms_capabilities.load_xml(session.get(core.get_capabilities_url(service_url, 'wms')).content)
+            wms_capabilities.load_json(json_future.result().json())
+        if not wms_capabilities.layers.get(wms_capabilities.collections[0].name):
+            raise AssertionError('No layers listed')
+
+    return {'layers_listed': result(1000 * best_time(list_layers, args.repeat), 'ms', layers=args.layers,
+                                    latency=args.latency)}
+
+
+def bench_cli_batch(server, args):
+    """ Downloads a job file with the command line downloader, jobs differ only in styles and dimensions
+    """
+    folder = tempfile.mkdtemp(prefix='edc_benchmark_')
+    job_filename = os.path.join(folder, 'jobs.json')
+    with open(job_filename, 'w') as job_file:
+        json.dump({
+            'service_url': server.base_url + '/instance-0',
+            'defaults': {'collection': 'Collection', 'layers': ['LAYER_0_0', 'LAYER_0_1'],
+                         'bbox': [14.45, 46.03, 14.55, 46.08], 'dates': ['2020-06-01', '2020-06-11']},
+            'jobs': [{}, {'style': 'INDEX'}, {'dimensions': {'dim_bands': 'B04,B08'}}]
+        }, job_file)
+    session = network.HttpSession('edc_benchmark')
+    try:
+        items, _ = cli.load_job_file(job_filename, os.path.join(folder, 'output'))
+        start = time.perf_counter()
+        cli.run_batch(session, items, workers=args.workers)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return {'cli_batch': result(len(items) * args.wcs_size / elapsed / 2 ** 20, 'MB/s', better='higher',
+                                files=len(items), workers=args.workers)}
+
+
+BENCHMARKS = [bench_capabilities_parsing, bench_url_builders, bench_wcs_download, bench_wfs_acquisitions,
+              bench_layers_listed, bench_cli_batch]
+
+
+def compare(results, baseline, tolerance):
+    """ Finds results which are worse than baseline results by more than tolerance
+
+    :return: List of (name, value, baseline value)
+    :rtype: list((str, float, float))
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous['value']:
+            continue
+        ratio = current['value'] / float(previous['value'])
+        if (ratio > 1 + tolerance) if current['better'] == 'lower' else (ratio < 1 - tolerance):
+            regressions.append((name, current['value'], previous['value']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--output', help='Write results as JSON into this file instead of stdout')
+    parser.add_argument('--baseline', help='JSON results of a previous run which are compared with this run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown against baseline')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed repeats, the best one is reported')
+    parser.add_argument('--layers', type=int, default=5000, help='Number of layers in capabilities')
+    parser.add_argument('--sublayers', type=int, default=100, help='Number of layers per collection')
+    parser.add_argument('--features', type=int, default=500, help='Number of WFS features per query')
+    parser.add_argument('--calls', type=int, default=10000, help='Number of calls of each url builder')
+    parser.add_argument('--files', type=int, default=8, help='Number of downloaded WCS files')
+    parser.add_argument('--wcs-size', type=int, default=4 * 2 ** 20, help='Size of a WCS file in bytes')
+    parser.add_argument('--workers', type=int, default=4, help='Number of concurrent downloads')
+    parser.add_argument('--latency', type=float, default=0.02, help='Latency of mock server in seconds')
+    parser.add_argument('--bandwidth', type=int, help='Bytes per second of every response of mock server')
+    args = parser.parse_args()
+
+    config = MockConfig(layers=args.layers, sublayers=args.sublayers, features=args.features, wcs_size=args.wcs_size,
+                        latency=args.latency, bandwidth=args.bandwidth)
+    server = MockServer(config).start()
+    results = {}
+    try:
+        for benchmark in BENCHMARKS:
+            results.update(benchmark(server, args))
+    finally:
+        server.stop()
+
+    report = {
+        'plugin_version': get_plugin_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'config': {name: value for name, value in vars(args).items() if name not in ('output', 'baseline')},
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file)['results'], args.tolerance)
+        for name, value, previous in regressions:
+            sys.stderr.write('Regression of {}: {} (baseline {})\n'.format(name, value, previous))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
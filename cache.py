@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains on-disk cache of EDC-OGC capabilities documents
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+from . import Settings
+
+
+class CapabilitiesCache:
+    """ Persistent cache of capabilities documents keyed by service url (base url and instance id) and service type.
+
+    Every entry is stored in its own folder which contains raw XML and JSON documents, a parsed snapshot of
+    Capabilities class and metadata used for revalidation (ETag, Last-Modified) and LRU eviction.
+    """
+
+    META_FILE = 'meta.json'
+    XML_FILE = 'capabilities.xml'
+    JSON_FILE = 'capabilities.json'
+    SNAPSHOT_FILE = 'snapshot.bin'
+
+    class Entry:
+        """ Stores info about a single cached capabilities document
+        """
+        def __init__(self, path, meta):
+            self.path = path
+            self.service_url = meta.get('service_url', '')
+            self.service = meta.get('service', '')
+            self.etag = meta.get('etag')
+            self.last_modified = meta.get('last_modified')
+            self.fetched = meta.get('fetched', 0)
+            self.accessed = meta.get('accessed', 0)
+
+        def is_fresh(self, ttl):
+            """ Checks if entry can be used without revalidating it with the service
+
+            :param ttl: Time to live in seconds
+            :type ttl: int
+            :rtype: bool
+            """
+            return 0 <= time.time() - self.fetched < ttl
+
+        def validators(self):
+            """ Headers for a conditional request which revalidates the entry
+
+            :return: dictionary of HTTP headers
+            :rtype: dict
+            """
+            headers = {}
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+            return headers
+
+        def read(self, filename, binary=False):
+            """ Reads one of the cached files
+
+            :return: File content or None if file doesn't exist
+            :rtype: bytes or str or None
+            """
+            try:
+                with open(os.path.join(self.path, filename), 'rb' if binary else 'r') as cache_file:
+                    return cache_file.read()
+            except (IOError, OSError):
+                return None
+
+        def xml(self):
+            return self.read(CapabilitiesCache.XML_FILE, binary=True)
+
+        def json(self):
+            return self.read(CapabilitiesCache.JSON_FILE)
+
+        def snapshot(self):
+            """
+            :return: Binary snapshot of Capabilities class or None if it is missing
+            :rtype: bytes or None
+            """
+            return self.read(CapabilitiesCache.SNAPSHOT_FILE, binary=True)
+
+        def meta(self):
+            return {
+                'service_url': self.service_url,
+                'service': self.service,
+                'etag': self.etag,
+                'last_modified': self.last_modified,
+                'fetched': self.fetched,
+                'accessed': self.accessed
+            }
+
+    def __init__(self, cache_dir, ttl=Settings.capabilities_cache_ttl,
+                 max_entries=Settings.capabilities_cache_max_entries):
+        """
+        :param cache_dir: Folder where cache entries are stored
+        :type cache_dir: str
+        :param ttl: Number of seconds for which a cached entry is used without revalidation
+        :type ttl: int
+        :param max_entries: Maximal number of cached entries, least recently used ones are evicted first
+        :type max_entries: int
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(service_url, service):
+        """ Cache key for service url (which contains base url and instance id) and service type
+        """
+        return hashlib.sha1('{}|{}'.format(service.lower(), service_url).encode('utf-8')).hexdigest()
+
+    def _entry_path(self, service_url, service):
+        return os.path.join(self.cache_dir, self.get_key(service_url, service))
+
+    def get(self, service_url, service='wms'):
+        """ Finds cached entry and marks it as recently used
+
+        :param service_url: EDC-OGC service url
+        :type service_url: str
+        :param service: Service (wms, wmts, ...)
+        :type service: str
+        :return: Cached entry or None
+        :rtype: CapabilitiesCache.Entry or None
+        """
+        with self._lock:
+            entry = self._read_entry(self._entry_path(service_url, service))
+            if entry is None or entry.service_url != service_url:
+                return None
+            entry.accessed = time.time()
+            self._write_meta(entry)
+            return entry
+
+    def put(self, service_url, service, xml, json_text, snapshot, etag=None, last_modified=None):
+        """ Stores raw capabilities documents together with their parsed snapshot
+
+        :param xml: Raw XML document
+        :type xml: bytes
+        :param json_text: Raw JSON document or None
+        :type json_text: str or None
+        :param snapshot: Binary snapshot of Capabilities class
+        :type snapshot: bytes
+        :param etag: ETag header of XML response
+        :type etag: str or None
+        :param last_modified: Last-Modified header of XML response
+        :type last_modified: str or None
+        :return: New entry
+        :rtype: CapabilitiesCache.Entry
+        """
+        path = self._entry_path(service_url, service)
+        now = time.time()
+        entry = self.Entry(path, {
+            'service_url': service_url,
+            'service': service,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched': now,
+            'accessed': now
+        })
+        with self._lock:
+            try:
+                if not os.path.exists(path):
+                    os.makedirs(path)
+                self._write_file(os.path.join(path, self.XML_FILE), xml, binary=True)
+                if json_text is not None:
+                    self._write_file(os.path.join(path, self.JSON_FILE), json_text)
+                elif os.path.exists(os.path.join(path, self.JSON_FILE)):
+                    os.remove(os.path.join(path, self.JSON_FILE))
+                self._write_file(os.path.join(path, self.SNAPSHOT_FILE), snapshot, binary=True)
+                self._write_meta(entry)
+            except (IOError, OSError):
+                return entry
+            self._evict()
+        return entry
+
+    def revalidated(self, entry, etag=None, last_modified=None):
+        """ Marks entry as fresh after service confirmed it didn't change (HTTP 304)
+        """
+        with self._lock:
+            entry.fetched = entry.accessed = time.time()
+            entry.etag = etag or entry.etag
+            entry.last_modified = last_modified or entry.last_modified
+            self._write_meta(entry)
+
+    def remove(self, service_url, service='wms'):
+        with self._lock:
+            shutil.rmtree(self._entry_path(service_url, service), ignore_errors=True)
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _evict(self):
+        """ Removes least recently used entries which exceed maximal number of entries. A folder without readable
+        metadata is removed only once it wasn't modified for a while, because another QGIS process may be writing it.
+        """
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        entries = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            entry = self._read_entry(path)
+            if entry is not None:
+                entries.append(entry)
+            elif self._is_abandoned(path):
+                shutil.rmtree(path, ignore_errors=True)
+        entries.sort(key=lambda cached: cached.accessed, reverse=True)
+        for entry in entries[self.max_entries:]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    @staticmethod
+    def _is_abandoned(path):
+        try:
+            modified = max([os.path.getmtime(path)] + [os.path.getmtime(os.path.join(path, name))
+                                                        for name in os.listdir(path)])
+        except OSError:
+            return False
+        return time.time() - modified > Settings.capabilities_cache_orphan_age
+
+    def _read_entry(self, path):
+        try:
+            with open(os.path.join(path, self.META_FILE), 'r') as meta_file:
+                return self.Entry(path, json.load(meta_file))
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_meta(self, entry):
+        try:
+            self._write_file(os.path.join(entry.path, self.META_FILE), json.dumps(entry.meta()))
+        except (IOError, OSError):
+            pass
+
+    @staticmethod
+    def _write_file(filename, content, binary=False):
+        """ Writes file into a temporary location first so that readers never see a partially written file
+        """
+        tmp_filename = '{}.tmp'.format(filename)
+        with open(tmp_filename, 'wb' if binary else 'w') as cache_file:
+            cache_file.write(content)
+        os.replace(tmp_filename, filename)
+
+
+class MemoryCapabilitiesCache:
+    """ Parsed WMS capabilities of service instances kept in memory, so switching to an instance which was already
+    loaded or preloaded doesn't need any request or parsing. Stale entries are still returned, callers refresh them.
+    The number of entries is limited, the least recently used entries are evicted first.
+    """
+
+    def __init__(self, ttl=Settings.capabilities_cache_ttl, max_entries=Settings.preload_max_instances):
+        """
+        :param ttl: Number of seconds after which an entry is stale
+        :type ttl: int
+        :param max_entries: Maximal number of kept capabilities
+        :type max_entries: int
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # service url -> (capabilities, time when they were stored), the oldest first
+        self._lock = threading.Lock()
+
+    def get(self, service_url):
+        """
+        :param service_url: EDC-OGC service url
+        :type service_url: str
+        :return: Capabilities and True if they are fresh or None if they are not cached
+        :rtype: (Capabilities, bool) or None
+        """
+        with self._lock:
+            entry = self._entries.get(service_url)
+            if entry is None:
+                return None
+            self._entries.move_to_end(service_url)
+        capabilities, stored = entry
+        return capabilities, 0 <= time.time() - stored < self.ttl
+
+    def put(self, service_url, capabilities):
+        with self._lock:
+            self._entries.pop(service_url, None)
+            self._entries[service_url] = capabilities, time.time()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, service_url):
+        with self._lock:
+            return service_url in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
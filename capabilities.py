@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains the model of EDC-OGC service capabilities and its parser
+"""
+
+import io
+import zlib
+import struct
+import marshal
+from xml.etree import ElementTree
+
+
+POP_WEB = 'EPSG:3857'
+WGS84 = 'EPSG:4326'
+
+# Snapshot header: magic bytes, snapshot format version and marshal format version
+SNAPSHOT_HEADER = struct.Struct('<4sBB')
+SNAPSHOT_VERSION = 1
+
+
+def pack_snapshot(magic, values):
+    """ Serializes values of built-in types into a compact binary snapshot
+
+    :param magic: 4 bytes which identify the type of snapshot
+    :type magic: bytes
+    :param values: Nested lists, dictionaries, strings and numbers
+    :rtype: bytes
+    """
+    return SNAPSHOT_HEADER.pack(magic, SNAPSHOT_VERSION, marshal.version) + zlib.compress(marshal.dumps(values), 1)
+
+
+def unpack_snapshot(magic, snapshot):
+    """ Restores values from a snapshot created by pack_snapshot
+
+    :raises: ValueError if snapshot is corrupted or was created with a different format
+    """
+    try:
+        header = SNAPSHOT_HEADER.unpack(snapshot[:SNAPSHOT_HEADER.size])
+        if header != (magic, SNAPSHOT_VERSION, marshal.version):
+            raise ValueError('Unsupported capabilities snapshot format')
+        return marshal.loads(zlib.decompress(snapshot[SNAPSHOT_HEADER.size:]))
+    except (struct.error, zlib.error, EOFError, TypeError) as exception:
+        raise ValueError('Corrupted capabilities snapshot: {}'.format(exception))
+
+
+class Capabilities:
+    """ Stores info about capabilities of EDC-OGC services. Besides lists used to fill combo boxes it keeps indexes
+    for lookups of layers by id.
+    """
+
+    __slots__ = ['base_url', 'wavelengths', 'dimensions', 'layers', 'collections', 'collection_list', 'crs_list',
+                 '_layers_by_id']
+
+    SNAPSHOT_MAGIC = b'EDCC'
+
+    class Layer:
+        """ Stores info about EDC-OGC WMS layer
+        """
+        __slots__ = ['id', 'name', 'styles', 'info', 'data_source']
+
+        def __init__(self, layer_id, name, styles=None, info='', data_source=None):
+            self.id = layer_id
+            self.name = name
+            self.styles = styles
+            self.info = info
+            self.data_source = data_source
+
+        def to_list(self):
+            """ Values in the order of constructor parameters
+            """
+            return [self.id, self.name, self.styles, self.info, self.data_source]
+
+    class CRS:
+        """ Stores info about available CRS at EDC-OGC Hub WMS
+        """
+        __slots__ = ['id', 'name']
+
+        def __init__(self, crs_id, name):
+            self.id = crs_id
+            self.name = name
+
+    def __init__(self, base_url=''):
+        self.base_url = base_url
+        self.wavelengths = {}
+        self.dimensions = {}
+        self.layers = {}
+        self.collections = []
+        self.collection_list = {}
+        self.crs_list = []
+        self._layers_by_id = {}
+
+    def build_index(self):
+        """ Rebuilds lookup indexes, it has to be called whenever collections or layers change
+        """
+        self._layers_by_id = {}
+        for layer in self.collections:
+            self._layers_by_id.setdefault(layer.id, []).append(layer)
+        for layers in self.layers.values():
+            for layer in layers:
+                self._layers_by_id.setdefault(layer.id, []).append(layer)
+
+    def get_layers_by_id(self, layer_id):
+        """ The same layer id can belong to both a collection and its only layer
+
+        :return: Collections and layers with the given id
+        :rtype: list(Capabilities.Layer)
+        """
+        return self._layers_by_id.get(layer_id, [])
+
+    def create_layer(self, layer, name_space):
+        """ Creates a Layer object from a WMS Layer element, children are visited only once
+        """
+        layer_id, name, info, style_list = None, None, '', []
+        for child in layer:
+            tag = child.tag[len(name_space):]
+            if tag == 'Name':
+                layer_id = child.text
+            elif tag == 'Title':
+                name = child.text
+            elif tag == 'Abstract':
+                info = child.text
+            elif tag == 'Style':
+                style_list.append(child.find('{}Name'.format(name_space)).text)
+
+        return self.Layer(layer_id, name, style_list, info)
+
+    def load_collection(self, layer, namespace):
+        """ Loads info about a collection from a second level WMS Layer element
+        """
+        collection = self.create_layer(layer, namespace)
+        sub_layers = []
+        dimensions, wavelengths = [], []
+        for child in layer:
+            tag = child.tag[len(namespace):]
+            if tag == 'Layer':
+                sub_layers.append(self.create_layer(child, namespace))
+            elif tag == 'Dimension' and child.text:
+                if child.get('name') == 'dim_bands':
+                    dimensions = child.text.split(',')
+                elif child.get('name') == 'dim_wavelengths':
+                    wavelengths = child.text.split(',')
+
+        self.wavelengths[collection.name] = wavelengths
+        self.dimensions[collection.name] = dimensions
+        self.collection_list[collection.name] = collection.id
+        self.collections.append(collection)
+        self.layers[collection.name] = sub_layers or [self.create_layer(layer, namespace)]
+
+    def load_xml(self, xml):
+        """ Loads info from getCapabilities.xml in a single streaming pass. Each collection element is released as
+        soon as it is loaded, therefore the whole document tree is never kept in memory. Collections and layers are
+        sorted by name only once at the end.
+
+        :param xml: Capabilities document or a file-like object with it
+        :type xml: bytes or file
+        :raises: ElementTree.ParseError
+        """
+        source = xml if hasattr(xml, 'read') else io.BytesIO(xml)
+
+        namespace = ''
+        depth = 0
+        in_capability = False
+        root_layer = None  # top Layer element of Capability, its children are collections and CRS
+        crs_ids = []
+        for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 1 and element.tag.startswith('{'):
+                    namespace = '{}}}'.format(element.tag.split('}')[0])
+                elif depth == 2:
+                    in_capability = element.tag == '{}Capability'.format(namespace)
+                elif depth == 3 and in_capability and element.tag == '{}Layer'.format(namespace):
+                    root_layer = element
+                continue
+
+            if depth == 4 and root_layer is not None:
+                if element.tag == '{}Layer'.format(namespace):
+                    self.load_collection(element, namespace)
+                    root_layer.remove(element)
+                elif element.tag == '{}CRS'.format(namespace):
+                    crs_ids.append(element.text)
+                    root_layer.remove(element)
+            elif depth == 3:
+                root_layer = None
+            elif depth == 2:
+                element.clear()
+            depth -= 1
+
+        self.collections.sort(key=lambda layer: layer.name)
+        for layers in self.layers.values():
+            layers.sort(key=lambda layer: layer.name)
+
+        self.crs_list = [self.CRS(crs_id, crs_id.replace(':', ': ')) for crs_id in crs_ids]
+        self._sort_crs_list()
+        self.build_index()
+
+    def load_json(self, json_dict):
+        """ Loads data sources of layers from getCapabilities.json
+        """
+        for json_layer in json_dict.get('layers', []):
+            if 'dataset' not in json_layer:
+                continue
+            for layer in self.get_layers_by_id(json_layer.get('id')):
+                layer.data_source = json_layer['dataset']
+
+    def _sort_crs_list(self):
+        """ Sorts list of CRS so that 3857 and 4326 are on the top
+        """
+        new_crs_list = []
+        for main_crs in [POP_WEB, WGS84]:
+            for index, crs in enumerate(self.crs_list):
+                if crs and crs.id == main_crs:
+                    new_crs_list.append(crs)
+                    self.crs_list[index] = None
+        for crs in self.crs_list:
+            if crs:
+                new_crs_list.append(crs)
+        self.crs_list = new_crs_list
+
+    def to_bytes(self):
+        """ Creates a compact binary snapshot of parsed capabilities which can be stored in cache. Each collection is
+        stored as a flat list of values, layers as lists in the order of Layer constructor parameters.
+
+        :rtype: bytes
+        """
+        collections = [collection.to_list() + [self.collection_list.get(collection.name),
+                                               self.dimensions.get(collection.name, []),
+                                               self.wavelengths.get(collection.name, []),
+                                               [layer.to_list() for layer in self.layers.get(collection.name, [])]]
+                       for collection in self.collections]
+        return pack_snapshot(self.SNAPSHOT_MAGIC, [self.base_url, [crs.id for crs in self.crs_list], collections])
+
+    @classmethod
+    def from_bytes(cls, snapshot):
+        """ Restores capabilities from a snapshot created by to_bytes method
+
+        :param snapshot: Binary snapshot
+        :type snapshot: bytes
+        :rtype: Capabilities
+        :raises: ValueError if snapshot is corrupted or was created with a different format
+        """
+        base_url, crs_ids, collections = unpack_snapshot(cls.SNAPSHOT_MAGIC, snapshot)
+
+        capabilities = cls(base_url)
+        layer_class = cls.Layer
+        for values in collections:
+            collection = layer_class(*values[:5])
+            capabilities.collections.append(collection)
+            capabilities.collection_list[collection.name] = values[5]
+            capabilities.dimensions[collection.name] = values[6]
+            capabilities.wavelengths[collection.name] = values[7]
+            capabilities.layers[collection.name] = [layer_class(*layer) for layer in values[8]]
+        capabilities.crs_list = [cls.CRS(crs_id, crs_id.replace(':', ': ')) for crs_id in crs_ids]
+        capabilities.build_index()
+        return capabilities
+
+
+class WmtsCapabilities:
+    """ Stores info about layers and tile matrix sets of EDC-OGC WMTS service
+    """
+
+    __slots__ = ['base_url', 'layers', 'tile_matrix_sets']
+
+    SNAPSHOT_MAGIC = b'EDCT'
+
+    def __init__(self, base_url=''):
+        self.base_url = base_url
+        self.layers = {}  # layer id -> list of ids of tile matrix sets linked to the layer
+        self.tile_matrix_sets = {}  # tile matrix set id -> CRS id
+
+    def load_xml(self, xml):
+        """ Loads info from WMTS getCapabilities.xml in a single streaming pass
+
+        :param xml: Capabilities document or a file-like object with it
+        :type xml: bytes or file
+        :raises: ElementTree.ParseError
+        """
+        source = xml if hasattr(xml, 'read') else io.BytesIO(xml)
+
+        depth = 0
+        in_contents = False
+        for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+            tag = element.tag.split('}')[-1]
+            if event == 'start':
+                depth += 1
+                if depth == 2:
+                    in_contents = tag == 'Contents'
+                continue
+
+            if depth == 3 and in_contents:
+                identifier = self._get_child_text(element, 'Identifier')
+                if tag == 'Layer' and identifier:
+                    self.layers[identifier] = [self._get_child_text(link, 'TileMatrixSet') for link in element
+                                               if link.tag.split('}')[-1] == 'TileMatrixSetLink']
+                elif tag == 'TileMatrixSet' and identifier:
+                    self.tile_matrix_sets[identifier] = self._get_crs_id(self._get_child_text(element, 'SupportedCRS'))
+                element.clear()
+            elif depth == 2:
+                element.clear()
+            depth -= 1
+
+    @staticmethod
+    def _get_child_text(element, tag):
+        for child in element:
+            if child.tag.split('}')[-1] == tag:
+                return child.text
+        return None
+
+    @staticmethod
+    def _get_crs_id(crs):
+        """ Transforms CRS identifiers such as urn:ogc:def:crs:EPSG::3857 into form EPSG:3857
+        """
+        if not crs:
+            return None
+        parts = crs.split(':')
+        if 'crs' in parts:
+            return '{}:{}'.format(parts[parts.index('crs') + 1], parts[-1])
+        return '{}:{}'.format(parts[0], parts[-1]) if len(parts) > 1 else crs
+
+    def get_tile_matrix_set(self, layer_id, preferred=None):
+        """ Chooses a tile matrix set for a layer. The preferred one is used if the layer supports it, otherwise
+        a set in Popular Web Mercator is preferred over other sets.
+
+        :param layer_id: WMTS layer identifier
+        :type layer_id: str
+        :param preferred: Identifier of the preferred tile matrix set
+        :type preferred: str or None
+        :return: Pair of tile matrix set identifier and its CRS or None if layer doesn't exist
+        :rtype: (str, str) or None
+        """
+        tile_matrix_sets = self.layers.get(layer_id)
+        if not tile_matrix_sets:
+            return None
+        if preferred in tile_matrix_sets:
+            return preferred, self.tile_matrix_sets.get(preferred, POP_WEB)
+        for tile_matrix_set in tile_matrix_sets:
+            if self.tile_matrix_sets.get(tile_matrix_set) == POP_WEB:
+                return tile_matrix_set, POP_WEB
+        return tile_matrix_sets[0], self.tile_matrix_sets.get(tile_matrix_sets[0], POP_WEB)
+
+    def to_bytes(self):
+        """ Creates a compact binary snapshot which can be stored in cache
+
+        :rtype: bytes
+        """
+        return pack_snapshot(self.SNAPSHOT_MAGIC, [self.base_url, self.layers, self.tile_matrix_sets])
+
+    @classmethod
+    def from_bytes(cls, snapshot):
+        """ Restores capabilities from a snapshot created by to_bytes method
+
+        :raises: ValueError if snapshot is corrupted or was created with a different format
+        """
+        base_url, layers, tile_matrix_sets = unpack_snapshot(cls.SNAPSHOT_MAGIC, snapshot)
+        capabilities = cls(base_url)
+        capabilities.layers = layers
+        capabilities.tile_matrix_sets = tile_matrix_sets
+        return capabilities
+
+
+# Capabilities models of services, they are used to parse and cache capabilities documents
+CAPABILITIES_CLASSES = {
+    'wms': Capabilities,
+    'wmts': WmtsCapabilities
+}
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+Command line tool which downloads images described in a job file with the same requests as the plugin, without QGIS
+
+Usage (from the plugin folder or with the plugin folder as a package):
+    python cli.py jobs.json --output downloads --workers 8 --report report.json
+
+Job file is a JSON object. Values in "defaults" apply to every job, every job is expanded into one download per
+combination of its bounding boxes, dates, layers and formats:
+
+    {
+        "service_url": "https://services.sentinel-hub.com/ogc/wms/<instance id>",
+        "defaults": {"collection": "sentinel-2-l1c", "format": "image/tiff;depth=32f", "resx": "10m", "resy": "10m"},
+        "jobs": [
+            {
+                "layers": ["TRUE_COLOR", "NDVI"],
+                "bboxes": [[14.45, 46.03, 14.55, 46.08]],
+                "crs": "EPSG:4326",
+                "dates": ["2020-06-01", "2020-06-11"],
+                "maxcc": 30
+            },
+            {"layer": "TRUE_COLOR", "bbox": [14.0, 46.0, 15.0, 46.5], "time": ["2020-06-01", "2020-06-30"],
+             "priority": "leastCC", "tiled": true}
+        ]
+    }
+
+Supported job keys are service_url, collection, layer(s), style, bbox(es), crs, date(s), time, format(s), resx, resy,
+maxcc, priority, dimensions (an object of dimension parameters, e.g. {"dim_bands": "B04,B08"}) and tiled (split large
+images into tiles which are downloaded in parallel and mosaicked into a GeoTIFF).
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+if __name__ == '__main__' and not __package__:
+    # Modules of the plugin use relative imports, therefore the plugin folder is imported as a package
+    _plugin_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(_plugin_dir))
+    __package__ = os.path.basename(_plugin_dir)
+    importlib.import_module(__package__)
+
+import requests
+
+from .network import HttpSession
+from .request_spec import RequestSpec, format_bbox
+from .core import get_bbox_size, get_image_size, get_time_parameter, format_size, format_duration
+from .download import download_file, download_mosaic, get_tiles
+from . import Settings
+
+
+class JobFileError(ValueError):
+    pass
+
+
+# A single download of a batch
+BatchItem = namedtuple('BatchItem', ['spec', 'bbox', 'crs', 'filename', 'tiled'])
+
+
+def _get_list(job, name, plural=None):
+    """ Values of a job key which may be given either in singular as a single value or in plural as a list
+    """
+    plural = plural or name + 's'
+    if plural in job:
+        values = job[plural]
+        return values if isinstance(values, list) else [values]
+    return [job[name]] if name in job else []
+
+
+def _get_time_parameters(job):
+    times = [get_time_parameter(date) for date in _get_list(job, 'date')]
+    if 'time' in job:
+        time_range = job['time'].split('/')[:2] if isinstance(job['time'], str) else job['time']
+        if len(time_range) != 2:
+            raise JobFileError('Time must be a pair of dates, got {}'.format(job['time']))
+        times.append(get_time_parameter(*time_range))
+    return times
+
+
+def expand_job(job, output_folder):
+    """ Expands a job into a download for every combination of its bounding boxes, times, layers and formats
+
+    :param job: Job with defaults already applied
+    :type job: dict
+    :param output_folder: Folder of downloaded files
+    :type output_folder: str
+    :rtype: list(BatchItem)
+    :raises: JobFileError
+    """
+    if not job.get('service_url'):
+        raise JobFileError('Job does not specify service_url')
+    bboxes, times = _get_list(job, 'bbox', 'bboxes'), _get_time_parameters(job)
+    layers, image_formats = _get_list(job, 'layer'), _get_list(job, 'format') or [Settings.parameters_wcs['format']]
+    for name, values in (('bbox', bboxes), ('date or time', times), ('layer', layers)):
+        if not values:
+            raise JobFileError('Job does not specify any {}: {}'.format(name, json.dumps(job)))
+    for bbox in bboxes:
+        if len(bbox) != 4:
+            raise JobFileError('Bounding box must be [xmin, ymin, xmax, ymax], got {}'.format(bbox))
+
+    crs = job.get('crs', Settings.cli_default_crs)
+    items = []
+    for bbox in bboxes:
+        bbox = tuple(float(coord) for coord in bbox)
+        for time_parameter in times:
+            for layer in layers:
+                for image_format in image_formats:
+                    spec = RequestSpec(
+                        service_url=job['service_url'],
+                        service_type='wms',
+                        collection=job.get('collection', ''),
+                        layer=layer,
+                        title=job.get('title', ''),
+                        layer_name=layer,
+                        style=job.get('style', ''),
+                        time=time_parameter,
+                        exact_date=time_parameter.split('/')[0] == time_parameter.split('/')[1],
+                        priority=job.get('priority', Settings.parameters['priority']),
+                        maxcc=str(job.get('maxcc', Settings.parameters['maxcc'])),
+                        crs=crs,
+                        dimensions=tuple(sorted(job.get('dimensions', {}).items())),
+                        image_format=image_format,
+                        resx=str(job.get('resx', Settings.parameters_wcs['resx'])),
+                        resy=str(job.get('resy', Settings.parameters_wcs['resy']))
+                    )
+                    filename = spec.get_filename(format_bbox(bbox, crs))
+                    name, extension = os.path.splitext(filename)
+                    filename = '{}_{}{}'.format(name, '_'.join(time_parameter.split('/')[:2]), extension)
+                    items.append(BatchItem(spec, bbox, crs, os.path.join(output_folder, filename),
+                                           bool(job.get('tiled', False))))
+    return items
+
+
+def load_job_file(filename, output_folder=None):
+    """ Reads a job file and expands its jobs into downloads
+
+    :param filename: Path of the job file
+    :type filename: str
+    :param output_folder: Folder of downloaded files which overrides the output of the job file
+    :type output_folder: str or None
+    :return: Downloads and options of the job file
+    :rtype: (list(BatchItem), dict)
+    :raises: JobFileError, IOError
+    """
+    with open(filename) as job_file:
+        try:
+            content = json.load(job_file)
+        except ValueError as exception:
+            raise JobFileError('Invalid JSON in {}: {}'.format(filename, exception))
+    if not isinstance(content, dict) or not isinstance(content.get('jobs'), list):
+        raise JobFileError('Job file must be an object with a list of jobs')
+
+    output_folder = output_folder or content.get('output', '.')
+    defaults = dict(content.get('defaults', {}))
+    if 'service_url' in content:
+        defaults['service_url'] = content['service_url']
+
+    items, specs = [], {}
+    for job in content['jobs']:
+        for item in expand_job(dict(defaults, **job), output_folder):
+            previous = specs.setdefault(item.filename, item)
+            if previous is item:
+                items.append(item)
+            elif previous != item:  # identical downloads are kept only once
+                raise JobFileError('Different downloads would be written into the same file {}'.format(item.filename))
+    return items, content
+
+
+class ProgressReporter:
+    """ Prints progress of a batch into a stream, at most once per interval unless a download finished
+    """
+
+    def __init__(self, total, stream=sys.stderr, interval=Settings.cli_progress_interval):
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.finished = 0
+        self.failed = 0
+        self.start_time = time.time()
+        self._item_bytes = {}
+        self._last_report_time = 0
+        self._lock = threading.Lock()
+
+    @property
+    def downloaded(self):
+        return sum(self._item_bytes.values())
+
+    def update(self, index, downloaded):
+        with self._lock:
+            self._item_bytes[index] = downloaded
+            if time.time() - self._last_report_time >= self.interval:
+                self._report()
+
+    def finish(self, index, result):
+        with self._lock:
+            self.finished += 1
+            if result['status'] == 'failed':
+                self.failed += 1
+            self._item_bytes[index] = result['bytes']
+            message = result['status'] if result['status'] != 'failed' else 'failed: {}'.format(result['error'])
+            self.stream.write('{} {}\n'.format(os.path.basename(result['file']), message))
+            self._report()
+
+    def _report(self):
+        self._last_report_time = time.time()
+        elapsed = max(self._last_report_time - self.start_time, 1e-6)
+        self.stream.write('[{}/{}] {} downloaded, {}/s, {} failed, {} elapsed\n'.format(
+            self.finished, self.total, format_size(self.downloaded), format_size(self.downloaded / elapsed),
+            self.failed, format_duration(elapsed)))
+        self.stream.flush()
+
+
+def download_item(session, item, progress=None, overwrite=False, tile_workers=Settings.wcs_tile_workers):
+    """ Downloads a single image of a batch, large images of tiled items are downloaded as a mosaic of tiles
+
+    :param session: HTTP session
+    :type session: HttpSession
+    :param item: Download
+    :type item: BatchItem
+    :param progress: Function called with the number of downloaded bytes
+    :type progress: function or None
+    :param overwrite: If False files which already exist are skipped
+    :type overwrite: bool
+    :param tile_workers: Number of concurrently downloaded tiles of a tiled download
+    :type tile_workers: int
+    :return: Result which is stored in the report
+    :rtype: dict
+    """
+    filename, url = item.filename, None
+    result = {'file': filename, 'layer': item.spec.layer, 'time': item.spec.time, 'format': item.spec.image_format,
+              'bbox': list(item.bbox), 'crs': item.crs, 'bytes': 0}
+    start_time = time.time()
+    try:
+        width, height = (0, 0)
+        if item.tiled:
+            width, height = get_image_size(get_bbox_size(item.bbox, item.crs), item.spec.resx, item.spec.resy)
+        if max(width, height) > Settings.wcs_tile_size:
+            filename = result['file'] = '{}.tif'.format(os.path.splitext(filename)[0])
+        if os.path.exists(filename) and not overwrite:
+            return dict(result, status='skipped', bytes=os.path.getsize(filename), seconds=0)
+        folder = os.path.dirname(filename)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        if max(width, height) > Settings.wcs_tile_size:
+            tiles = get_tiles(item.bbox, width, height)
+            urls = [item.spec.get_wcs_url(format_bbox(tile.bbox, item.crs), item.crs, size=(tile.width, tile.height))
+                    for tile in tiles]
+            result['tiles'] = len(tiles)
+            download_mosaic(lambda tile_url, tile_filename, tile_progress: download_file(
+                session, tile_url, tile_filename, progress=tile_progress), tiles, urls, filename, width, height,
+                item.bbox, item.crs, workers=tile_workers,
+                progress=lambda downloaded, _: progress(downloaded) if progress else None)
+        else:
+            url = item.spec.get_wcs_url(format_bbox(item.bbox, item.crs), item.crs)
+            download_file(session, url, filename,
+                          progress=lambda downloaded, _: progress(downloaded) if progress else None)
+        result.update(status='downloaded', bytes=os.path.getsize(filename))
+    except (requests.RequestException, IOError, OSError, RuntimeError) as exception:
+        result.update(status='failed', error=str(exception))
+    if url is not None:
+        result['url'] = url
+    result['seconds'] = round(time.time() - start_time, 3)
+    return result
+
+
+def run_batch(session, items, workers=Settings.cli_workers, overwrite=False, tile_workers=Settings.wcs_tile_workers,
+              reporter=None):
+    """ Downloads all items with a bounded pool of workers, a failed download doesn't stop the others
+
+    :param session: HTTP session
+    :type session: HttpSession
+    :param items: Downloads
+    :type items: list(BatchItem)
+    :param workers: Number of concurrent downloads
+    :type workers: int
+    :param overwrite: If False files which already exist are skipped
+    :type overwrite: bool
+    :param tile_workers: Number of concurrently downloaded tiles of each tiled download
+    :type tile_workers: int
+    :param reporter: Progress reporter
+    :type reporter: ProgressReporter or None
+    :return: Results in the order of items
+    :rtype: list(dict)
+    """
+    def download(index, item):
+        result = download_item(session, item, overwrite=overwrite, tile_workers=tile_workers,
+                               progress=lambda downloaded: reporter.update(index, downloaded) if reporter else None)
+        if reporter:
+            reporter.finish(index, result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [executor.submit(download, index, item) for index, item in enumerate(items)]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def get_summary(results, elapsed):
+    """ Summary report of a finished batch
+
+    :rtype: dict
+    """
+    counts = {status: sum(1 for result in results if result['status'] == status)
+              for status in ('downloaded', 'skipped', 'failed')}
+    downloaded_bytes = sum(result['bytes'] for result in results if result['status'] == 'downloaded')
+    return dict(counts, total=len(results), bytes=downloaded_bytes, seconds=round(elapsed, 3),
+                bytes_per_second=downloaded_bytes / elapsed if elapsed > 0 else 0, files=results)
+
+
+def format_summary(summary):
+    lines = ['{} files: {} downloaded, {} skipped, {} failed'.format(summary['total'], summary['downloaded'],
+                                                                     summary['skipped'], summary['failed']),
+             '{} in {} ({}/s)'.format(format_size(summary['bytes']), format_duration(summary['seconds']),
+                                      format_size(summary['bytes_per_second']))]
+    lines.extend('FAILED {}: {}'.format(result['file'], result['error'])
+                 for result in summary['files'] if result['status'] == 'failed')
+    return '\n'.join(lines)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Downloads Euro Data Cube images described in a job file')
+    parser.add_argument('job_file', help='JSON file with download jobs')
+    parser.add_argument('-o', '--output', help='Output folder, overrides output of the job file')
+    parser.add_argument('-w', '--workers', type=int, help='Number of concurrent downloads (default: workers of the '
+                                                          'job file or {})'.format(Settings.cli_workers))
+    parser.add_argument('--tile-workers', type=int, default=Settings.wcs_tile_workers,
+                        help='Number of concurrently downloaded tiles of each tiled download')
+    parser.add_argument('--overwrite', action='store_true', help='Download files which already exist again')
+    parser.add_argument('--report', help='Write a JSON report of all downloads into this file')
+    parser.add_argument('--dry-run', action='store_true', help='Only print urls which would be downloaded')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Do not print progress')
+    return parser
+
+
+def main(argv=None):
+    """ Runs the command line tool
+
+    :return: Exit code, 0 if all files were downloaded, 1 if any download failed and 2 for an invalid job file
+    :rtype: int
+    """
+    args = get_parser().parse_args(argv)
+    try:
+        items, content = load_job_file(args.job_file, args.output)
+    except (JobFileError, IOError) as exception:
+        sys.stderr.write('Invalid job file: {}\n'.format(exception))
+        return 2
+
+    if args.dry_run:
+        for item in items:
+            sys.stdout.write('{} {}\n'.format(item.filename, item.spec.get_wcs_url(format_bbox(item.bbox, item.crs),
+                                                                                   item.crs)))
+        return 0
+
+    session = HttpSession('sh_qgis_plugin_cli')
+    reporter = None if args.quiet else ProgressReporter(len(items))
+    start_time = time.time()
+    results = run_batch(session, items, workers=args.workers or content.get('workers', Settings.cli_workers),
+                        overwrite=args.overwrite, tile_workers=args.tile_workers, reporter=reporter)
+    summary = get_summary(results, time.time() - start_time)
+
+    sys.stdout.write(format_summary(summary) + '\n')
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump(summary, report_file, indent=2)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains GUI-free logic of EDC-OGC requests which is shared by the plugin and the command line tool
+"""
+
+import math
+
+from osgeo import osr
+
+from .capabilities import WGS84
+
+
+def get_capabilities_url(base_url, service, get_json=False):
+    """ Generates url for obtaining service capabilities
+    """
+    url = '{}?service={}&request=GetCapabilities&version={}'.format(base_url, service,
+                                                                    '1.0.0' if service == 'wmts' else '1.3.0')
+    if get_json:
+        return url + '&format=application/json'
+    return url
+
+
+def get_time_parameter(time0, time1=None):
+    """ Formats time parameter of requests
+
+    :param time0: Start date in format YYYY-MM-DD
+    :type time0: str
+    :param time1: End date in format YYYY-MM-DD, if not given only the start date is requested
+    :type time1: str or None
+    :rtype: str
+    """
+    return '{}/{}/P1D'.format(time0, time1 or time0)
+
+
+def lng_to_utm_zone(longitude, latitude):
+    """ Calculates UTM zone from latitude and longitude"""
+    zone = int(math.floor((longitude + 180) / 6) + 1)
+    hemisphere = 6 if latitude > 0 else 7
+    return 'EPSG:32{0}{1:02d}'.format(hemisphere, zone)
+
+
+def _get_spatial_reference(crs):
+    spatial_reference = osr.SpatialReference()
+    spatial_reference.SetFromUserInput(crs)
+    if hasattr(spatial_reference, 'SetAxisMappingStrategy'):  # GDAL 3 would otherwise use (lat, lng) for WGS84
+        spatial_reference.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return spatial_reference
+
+
+def get_bbox_size(bbox, crs):
+    """ Approximate width and height of bounding box in meters, it is measured in UTM zone of its center
+
+    :param bbox: Bounding box in form of (xmin, ymin, xmax, ymax)
+    :type bbox: tuple(float)
+    :param crs: CRS of bounding box
+    :type crs: str
+    :rtype: (float, float)
+    """
+    min_x, min_y, max_x, max_y = bbox
+    bbox_reference = _get_spatial_reference(crs)
+    center_x, center_y = (min_x + max_x) / 2.0, (min_y + max_y) / 2.0
+    if crs != WGS84:
+        to_wgs84 = osr.CoordinateTransformation(bbox_reference, _get_spatial_reference(WGS84))
+        center_x, center_y = to_wgs84.TransformPoint(center_x, center_y)[:2]
+
+    to_utm = osr.CoordinateTransformation(bbox_reference, _get_spatial_reference(lng_to_utm_zone(center_x, center_y)))
+    corners = [to_utm.TransformPoint(x, y)[:2] for x, y in ((min_x, min_y), (max_x, min_y), (min_x, max_y),
+                                                            (max_x, max_y))]
+    xs, ys = [corner[0] for corner in corners], [corner[1] for corner in corners]
+    return max(xs) - min(xs), max(ys) - min(ys)
+
+
+def get_image_size(bbox_size, resx, resy):
+    """ Calculates size of WCS image in pixels from size of bounding box and resolution
+
+    :param bbox_size: Width and height of bounding box in meters
+    :type bbox_size: (float, float)
+    :param resx: Horizontal resolution, e.g. '10m'
+    :type resx: str
+    :param resy: Vertical resolution, e.g. '10m'
+    :type resy: str
+    :return: width and height in pixels
+    :rtype: (int, int)
+    """
+    width, height = bbox_size
+    resx, resy = float(str(resx).strip('m')), float(str(resy).strip('m'))
+    return max(1, int(math.ceil(width / resx))), max(1, int(math.ceil(height / resy)))
+
+
+def format_size(size):
+    """ Formats number of bytes into a human readable string
+    """
+    for unit in ['B', 'kB', 'MB', 'GB']:
+        if abs(size) < 1024 or unit == 'GB':
+            return '{:.1f} {}'.format(size, unit) if unit != 'B' else '{} B'.format(int(size))
+        size /= 1024.0
+
+
+def format_duration(seconds):
+    """ Formats number of seconds into a human readable string
+    """
+    if seconds is None:
+        return ''
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return '{}h {:02d}m'.format(hours, minutes)
+    return '{}m {:02d}s'.format(minutes, seconds) if minutes else '{}s'.format(seconds)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains diagnostics of WMS errors which QGIS reports in its message log
+"""
+
+import re
+import ast
+import json
+import time
+import threading
+from collections import OrderedDict
+from sys import version_info
+
+if version_info[0] >= 3:
+    from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+else:
+    from PyQt4.QtCore import QObject, QTimer, pyqtSignal
+
+import requests
+
+from .tasks import run_task, cancel_task
+from . import Settings
+
+
+ERROR_URL_PATTERN = re.compile(r'BAD REQUEST url: (.*)]')
+ERROR_BODY_PATTERN = re.compile(r'({.+})')
+
+
+def get_error_url(message):
+    """ Finds url of a failed request in a message which QGIS WMS provider logged
+
+    :rtype: str or None
+    """
+    match = ERROR_URL_PATTERN.search(message)
+    return match.group(1) if match else None
+
+
+def parse_error_body(text):
+    """ Obtains error message from a response of EDC-OGC service
+
+    :param text: Response content which contains a JSON (or Python literal) object {"error": {"message": ...}}
+    :type text: str
+    :rtype: str or None
+    """
+    match = ERROR_BODY_PATTERN.search(text)
+    if match is None:
+        return None
+    try:
+        error = json.loads(match.group(1))
+    except ValueError:
+        try:
+            error = ast.literal_eval(match.group(1))
+        except (ValueError, SyntaxError):
+            return None
+    try:
+        return str(error['error']['message'])
+    except (KeyError, TypeError):
+        return None
+
+
+class WmsErrorDiagnostics(QObject):
+    """ A single handler of QGIS message log which explains failed WMS requests of all layers. Error details are
+    downloaded in background tasks, each error url is requested at most once per ttl and notifications are
+    rate-limited, therefore a broken layer can't flood the service or the message bar. A message which arrives too
+    soon after the previous one is deferred, only the latest deferred message is reported.
+    """
+
+    errorUrlFound = pyqtSignal(str)
+    errorReported = pyqtSignal(str)
+
+    def __init__(self, session, ttl=Settings.wms_error_ttl, timeout=Settings.wms_error_timeout,
+                 max_fetches=Settings.wms_error_max_fetches,
+                 notification_interval=Settings.wms_error_notification_interval, parent=None):
+        """
+        :param session: Session used for requests of error details
+        :type session: HttpSession
+        :param ttl: Number of seconds for which the same url is not requested and the same message is not reported
+                    again
+        :type ttl: float
+        :param timeout: Timeout of requests in seconds
+        :type timeout: float
+        :param max_fetches: Maximal number of simultaneous requests, errors found meanwhile are skipped until they are
+                            logged again
+        :type max_fetches: int
+        :param notification_interval: Minimal number of seconds between two reported messages
+        :type notification_interval: float
+        """
+        super(WmsErrorDiagnostics, self).__init__(parent)
+        self.session = session
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_fetches = max_fetches
+        self.notification_interval = notification_interval
+        self.message_log = None
+        self._recent_urls = OrderedDict()  # url -> time when it was found, the oldest first
+        self._recent_messages = {}  # message -> time when it was reported
+        self._last_report_time = 0
+        self._pending_message = None
+        self._pending_timer = QTimer(self)
+        self._pending_timer.setSingleShot(True)
+        self._pending_timer.timeout.connect(self._report_pending)
+        self._tasks = {}  # url -> running task
+        self._lock = threading.Lock()
+
+        # Messages are logged from rendering threads, requests are started in the thread of this object
+        self.errorUrlFound.connect(self._fetch_error)
+
+    def install(self, message_log):
+        """ Starts handling messages of QGIS message log, repeated calls have no effect
+
+        :param message_log: QgsApplication.messageLog() or QgsMessageLog.instance()
+        :type message_log: QgsMessageLog
+        """
+        if self.message_log is None:
+            self.message_log = message_log
+            self.message_log.messageReceived.connect(self.on_message_received)
+
+    def uninstall(self):
+        if self.message_log is not None:
+            self.message_log.messageReceived.disconnect(self.on_message_received)
+            self.message_log = None
+        for task in list(self._tasks.values()):
+            cancel_task(task)
+        self._tasks.clear()
+        self._pending_timer.stop()
+        self._pending_message = None
+
+    def on_message_received(self, message, tag, level):
+        """ Handler of QGIS message log, it can be called from any thread
+        """
+        if tag != 'WMS' or level == 0:
+            return
+        url = get_error_url(message)
+        if url is None:
+            return
+
+        now = time.time()
+        with self._lock:
+            while self._recent_urls and next(iter(self._recent_urls.values())) < now - self.ttl:
+                self._recent_urls.popitem(last=False)
+            if url in self._recent_urls:
+                return
+            self._recent_urls[url] = now
+        self.errorUrlFound.emit(url)
+
+    def _fetch_error(self, url):
+        if len(self._tasks) >= self.max_fetches:
+            with self._lock:  # the url is not remembered, so it is checked once it is logged again
+                self._recent_urls.pop(url, None)
+            return
+        finished = []
+
+        def task_finished():
+            finished.append(url)
+            self._tasks.pop(url, None)
+
+        def error_fetched(message, exception):
+            task_finished()
+            if exception is None and message:
+                self._report(message)
+
+        task = run_task('Checking WMS error', lambda _: self.get_error_message(url), error_fetched, task_finished)
+        if not finished:  # task is still running
+            self._tasks[url] = task
+
+    def get_error_message(self, url):
+        """ Downloads details of a failed request
+
+        :rtype: str or None
+        :raises: requests.RequestException
+        """
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.HTTPError as exception:
+            response = exception.response
+        return parse_error_body(response.text) if response is not None else None
+
+    def _report(self, message):
+        """ Reports the message unless it was reported recently. If another message was reported just now, it is
+        reported once the notification interval expires.
+        """
+        now = time.time()
+        self._recent_messages = {recent_message: report_time for recent_message, report_time
+                                 in self._recent_messages.items() if report_time >= now - self.ttl}
+        if message in self._recent_messages:
+            return
+        remaining_time = self._last_report_time + self.notification_interval - now
+        if remaining_time > 0:
+            self._pending_message = message
+            if not self._pending_timer.isActive():
+                self._pending_timer.start(int(remaining_time * 1000) + 1)
+            return
+        self._recent_messages[message] = now
+        self._last_report_time = now
+        self.errorReported.emit(message)
+
+    def _report_pending(self):
+        message, self._pending_message = self._pending_message, None
+        if message is not None:
+            self._report(message)
@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains streamed download of files, tiled download of WCS coverages and mosaicking of downloaded tiles
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from osgeo import gdal, osr
+
+from . import Settings
+
+
+class IncompleteDownload(IOError):
+    pass
+
+
+def download_file(session, url, filename, chunk_size=Settings.download_chunk_size,
+                  attempts=Settings.download_attempts, progress=None):
+    """ Streams response content into a temporary file which is renamed to filename only when the download is
+    complete, so a failed download never leaves a truncated file under the final name. If the transfer is
+    interrupted and the server supports range requests, the download is resumed from the last received byte.
+
+    :param session: HTTP session
+    :type session: HttpSession
+    :param url: download url
+    :type url: str
+    :param filename: path of the downloaded file
+    :type filename: str
+    :param chunk_size: Number of bytes written at once
+    :type chunk_size: int
+    :param attempts: Number of attempts to finish an interrupted download
+    :type attempts: int
+    :param progress: Function called with parameters (downloaded bytes, total bytes or None) after every chunk
+    :type progress: function or None
+    :return: Number of bytes of the downloaded file
+    :rtype: int
+    :raises: requests.RequestException, IOError
+    """
+    part_filename = '{}.part'.format(filename)
+
+    for attempt in range(1, attempts + 1):
+        offset, validator = _get_partial_download(part_filename, url)
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            headers['Range'] = 'bytes={}-'.format(offset)
+            headers['If-Range'] = validator
+
+        try:
+            response = session.get(url, stream=True, headers=headers)
+        except requests.HTTPError as exception:
+            if offset and exception.response is not None and exception.response.status_code == 416:
+                _remove_partial_download(part_filename)
+                continue
+            raise
+
+        try:
+            if not offset or response.status_code != 206 or _get_range_start(response) != offset:
+                offset = 0
+            total = response.headers.get('content-length')
+            total = int(total) + offset if total is not None else None
+            _save_partial_download_info(part_filename, url, response)
+
+            with open(part_filename, 'ab' if offset else 'wb') as part_file:
+                for data in response.iter_content(chunk_size=chunk_size):
+                    part_file.write(data)
+                    offset += len(data)
+                    if progress:
+                        progress(offset, total)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+            if attempt == attempts:
+                raise
+            continue
+        finally:
+            response.close()
+
+        if total is not None and offset < total:
+            if attempt == attempts:
+                raise IncompleteDownload('Received {} out of {} bytes from {}'.format(offset, total, url))
+            continue
+
+        os.replace(part_filename, filename)
+        _remove_partial_download(part_filename, keep_data=True)
+        return offset
+
+    raise IncompleteDownload('Failed to download {}'.format(url))
+
+
+def _get_range_start(response):
+    """ Parses first byte position from Content-Range header
+    """
+    match = re.match(r'bytes (\d+)-', response.headers.get('content-range', ''))
+    return int(match.group(1)) if match else None
+
+
+def _get_partial_download(part_filename, url):
+    """ Returns size and validator of a partially downloaded file which can be resumed, otherwise (0, None)
+    """
+    try:
+        with open('{}.json'.format(part_filename)) as info_file:
+            info = json.load(info_file)
+        if info['url'] == url and info['validator']:
+            return os.path.getsize(part_filename), info['validator']
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+    return 0, None
+
+
+def _save_partial_download_info(part_filename, url, response):
+    """ Stores info needed to resume download later. Download can be resumed only if server accepts range
+    requests and gives a validator which ensures resumed content belongs to the same file.
+    """
+    validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+    if response.headers.get('accept-ranges', 'none').lower() != 'bytes' or not validator:
+        _remove_partial_download(part_filename, keep_data=True)
+        return
+    with open('{}.json'.format(part_filename), 'w') as info_file:
+        json.dump({'url': url, 'validator': validator}, info_file)
+
+
+def remove_partial_download(filename):
+    """ Removes data of an unfinished download of filename, including tiles of an unfinished mosaic
+    """
+    _remove_partial_download('{}.part'.format(filename))
+    shutil.rmtree(_get_tile_folder(filename), ignore_errors=True)
+
+
+def _remove_partial_download(part_filename, keep_data=False):
+    filenames = ['{}.json'.format(part_filename)] + ([] if keep_data else [part_filename])
+    for filename in filenames:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+# Pixel window of a tile inside the mosaic and its bounding box (xmin, ymin, xmax, ymax)
+Tile = namedtuple('Tile', ['x_offset', 'y_offset', 'width', 'height', 'bbox'])
+
+
+def get_tiles(bbox, width, height, tile_size=Settings.wcs_tile_size):
+    """ Splits bounding box into a grid of tiles which are small enough to be served by a single WCS request
+
+    :param bbox: Bounding box in form of (xmin, ymin, xmax, ymax)
+    :type bbox: tuple(float)
+    :param width: Width of the whole image in pixels
+    :type width: int
+    :param height: Height of the whole image in pixels
+    :type height: int
+    :param tile_size: Maximal width and height of a tile in pixels
+    :type tile_size: int
+    :return: List of tiles ordered by rows from top to bottom
+    :rtype: list(Tile)
+    """
+    xmin, ymin, xmax, ymax = bbox
+    pixel_width = (xmax - xmin) / float(width)
+    pixel_height = (ymax - ymin) / float(height)
+
+    tiles = []
+    for y_offset in range(0, height, tile_size):
+        tile_height = min(tile_size, height - y_offset)
+        for x_offset in range(0, width, tile_size):
+            tile_width = min(tile_size, width - x_offset)
+            tiles.append(Tile(x_offset, y_offset, tile_width, tile_height,
+                              (xmin + x_offset * pixel_width,
+                               ymax - (y_offset + tile_height) * pixel_height,
+                               xmin + (x_offset + tile_width) * pixel_width,
+                               ymax - y_offset * pixel_height)))
+    return tiles
+
+
+class Mosaic:
+    """ Georeferenced GeoTIFF into which tiles are written window by window, so only one tile band is held in
+    memory at a time
+    """
+    def __init__(self, filename, width, height, bbox, crs):
+        """
+        :param filename: Output filename
+        :type filename: str
+        :param width: Width of the mosaic in pixels
+        :type width: int
+        :param height: Height of the mosaic in pixels
+        :type height: int
+        :param bbox: Bounding box in form of (xmin, ymin, xmax, ymax)
+        :type bbox: tuple(float)
+        :param crs: CRS of bounding box, e.g. 'EPSG:3857'
+        :type crs: str
+        """
+        self.filename = filename
+        self.width = width
+        self.height = height
+        self.bbox = bbox
+        self.crs = crs
+        self.dataset = None
+
+    def reopen(self):
+        """ Opens an existing output file into which more tiles are written
+
+        :return: True if the file was opened and False if it doesn't exist or can't be updated
+        :rtype: bool
+        """
+        if os.path.exists(self.filename):
+            self.dataset = gdal.Open(self.filename, gdal.GA_Update)
+        return self.dataset is not None
+
+    def add_tile(self, tile, tile_filename):
+        """ Copies a downloaded tile into its window of the mosaic
+
+        :param tile: Tile position in the mosaic
+        :type tile: Tile
+        :param tile_filename: Filename of downloaded tile
+        :type tile_filename: str
+        """
+        tile_dataset = gdal.Open(tile_filename)
+        if tile_dataset is None:
+            raise IOError('Unable to read downloaded tile {}'.format(tile_filename))
+        if self.dataset is None:
+            self._create(tile_dataset)
+
+        for band_index in range(1, min(tile_dataset.RasterCount, self.dataset.RasterCount) + 1):
+            band = tile_dataset.GetRasterBand(band_index)
+            # Tile is resampled in case the service returned an image of slightly different size
+            data = band.ReadRaster(0, 0, band.XSize, band.YSize, tile.width, tile.height)
+            self.dataset.GetRasterBand(band_index).WriteRaster(tile.x_offset, tile.y_offset, tile.width, tile.height,
+                                                               data)
+        tile_dataset = None
+
+    def _create(self, template):
+        """ Creates output file with the same bands and data type as the template tile
+        """
+        template_band = template.GetRasterBand(1)
+        driver = gdal.GetDriverByName('GTiff')
+        self.dataset = driver.Create(self.filename, self.width, self.height, template.RasterCount,
+                                     template_band.DataType, options=list(Settings.mosaic_creation_options))
+        if self.dataset is None:
+            raise IOError('Unable to create file {}'.format(self.filename))
+
+        xmin, ymin, xmax, ymax = self.bbox
+        self.dataset.SetGeoTransform((xmin, (xmax - xmin) / float(self.width), 0,
+                                      ymax, 0, -(ymax - ymin) / float(self.height)))
+        spatial_reference = osr.SpatialReference()
+        spatial_reference.SetFromUserInput(self.crs)
+        self.dataset.SetProjection(spatial_reference.ExportToWkt())
+
+        for band_index in range(1, template.RasterCount + 1):
+            template_band = template.GetRasterBand(band_index)
+            band = self.dataset.GetRasterBand(band_index)
+            band.SetColorInterpretation(template_band.GetColorInterpretation())
+            if template_band.GetNoDataValue() is not None:
+                band.SetNoDataValue(template_band.GetNoDataValue())
+
+    def flush(self):
+        if self.dataset is not None:
+            self.dataset.FlushCache()
+
+    def close(self):
+        if self.dataset is not None:
+            self.dataset.FlushCache()
+            self.dataset = None
+
+
+def download_tiles(tiles, urls, fetch, mosaic, tile_folder, workers=Settings.wcs_tile_workers, progress=None,
+                   finished_tiles=(), tile_added=None):
+    """ Downloads tiles concurrently with a bounded pool of workers and writes each tile into the mosaic as soon
+    as it arrives. At most twice as many tiles as workers are kept on disk at the same time. A tile file which
+    already exists in the tile folder is complete and it is not downloaded again.
+
+    :param tiles: Tiles of the mosaic
+    :type tiles: list(Tile)
+    :param urls: WCS request url for each tile
+    :type urls: list(str)
+    :param fetch: Function which downloads url into a file, it receives parameters (url, filename, progress) where
+                  progress is a function which accepts (downloaded bytes, total bytes or None)
+    :type fetch: function
+    :param mosaic: Mosaic into which tiles are written
+    :type mosaic: Mosaic
+    :param tile_folder: Folder for temporary tile files
+    :type tile_folder: str
+    :param workers: Number of concurrent downloads
+    :type workers: int
+    :param progress: Function called with parameters (downloaded bytes of all tiles, finished fraction of tiles)
+    :type progress: function or None
+    :param finished_tiles: Indexes of tiles which are already written into the mosaic
+    :type finished_tiles: set(int)
+    :param tile_added: Function called with index of a tile once it is written into the mosaic
+    :type tile_added: function or None
+    """
+    pending = iter((index, tile_url) for index, tile_url in enumerate(zip(tiles, urls))
+                   if index not in finished_tiles)
+    running = {}
+    tile_bytes = {}
+    lock = threading.Lock()
+    finished = [len(finished_tiles)]
+
+    def fetch_tile(url, tile_filename, tile_progress):
+        if not os.path.exists(tile_filename):
+            fetch(url, tile_filename, tile_progress)
+
+    def tile_progress(index):
+        def update(downloaded, _):
+            with lock:
+                tile_bytes[index] = downloaded
+                downloaded_bytes = sum(tile_bytes.values())
+            if progress:
+                progress(downloaded_bytes, finished[0] / float(len(tiles)))
+        return update
+
+    def submit(executor):
+        for index, (tile, url) in pending:
+            tile_filename = os.path.join(tile_folder, 'tile_{}'.format(index))
+            running[executor.submit(fetch_tile, url, tile_filename, tile_progress(index))] = \
+                (index, tile, tile_filename)
+            if len(running) >= 2 * workers:
+                return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        submit(executor)
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, tile, tile_filename = running.pop(future)
+                    future.result()
+                    mosaic.add_tile(tile, tile_filename)
+                    if tile_added:
+                        tile_added(index)
+                    os.remove(tile_filename)
+                    finished[0] += 1
+                    if progress:
+                        with lock:
+                            downloaded_bytes = sum(tile_bytes.values())
+                        progress(downloaded_bytes, finished[0] / float(len(tiles)))
+                submit(executor)
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+
+
+def download_mosaic(fetch, tiles, urls, filename, width, height, bbox, crs, workers=Settings.wcs_tile_workers,
+                    progress=None):
+    """ Downloads tiles into a folder next to filename and mosaics them into a single GeoTIFF. The mosaic is written
+    into a .part file which replaces filename only once it is complete.
+
+    If the download is interrupted or fails, the .part file, downloaded tiles and the list of tiles already written
+    into the mosaic are kept, so the next call with the same tiles and urls continues where it stopped. They are
+    removed with remove_partial_download.
+
+    :param fetch: Function which downloads url into a file, see download_tiles
+    :type fetch: function
+    :param tiles: Tiles of the mosaic
+    :type tiles: list(Tile)
+    :param urls: WCS request url for each tile
+    :type urls: list(str)
+    :param filename: Output filename
+    :type filename: str
+    :param width: Width of the mosaic in pixels
+    :type width: int
+    :param height: Height of the mosaic in pixels
+    :type height: int
+    :param bbox: Bounding box in form of (xmin, ymin, xmax, ymax)
+    :type bbox: tuple(float)
+    :param crs: CRS of bounding box
+    :type crs: str
+    :param workers: Number of concurrent downloads
+    :type workers: int
+    :param progress: Function called with parameters (downloaded bytes, finished fraction)
+    :type progress: function or None
+    """
+    part_filename = '{}.part'.format(filename)
+    state_filename = '{}.json'.format(part_filename)
+    tile_folder = _get_tile_folder(filename)
+    # Written tiles are valid only for the same tiles and urls, e.g. not after the image format changed
+    layout_hash = hashlib.sha1(json.dumps([list(tiles), list(urls)]).encode('utf-8')).hexdigest()
+
+    mosaic = Mosaic(part_filename, width, height, bbox, crs)
+    finished_tiles = _get_finished_tiles(state_filename, layout_hash)
+    if finished_tiles and not mosaic.reopen():
+        finished_tiles = set()
+    if not finished_tiles:
+        remove_partial_download(filename)
+    if not os.path.exists(tile_folder):
+        os.makedirs(tile_folder)
+
+    def tile_added(index):
+        # The mosaic is flushed first, so a recorded tile is always on disk
+        mosaic.flush()
+        finished_tiles.add(index)
+        _write_json(state_filename, {'layout': layout_hash, 'tiles': sorted(finished_tiles)})
+
+    try:
+        download_tiles(tiles, urls, fetch, mosaic, tile_folder, workers=workers, progress=progress,
+                       finished_tiles=set(finished_tiles), tile_added=tile_added)
+    finally:
+        mosaic.close()
+    os.replace(part_filename, filename)
+    remove_partial_download(filename)
+
+
+def _get_tile_folder(filename):
+    return '{}.part.tiles'.format(filename)
+
+
+def _get_finished_tiles(state_filename, layout_hash):
+    try:
+        with open(state_filename) as state_file:
+            state = json.load(state_file)
+    except (IOError, OSError, ValueError):
+        return set()
+    return set(state.get('tiles', [])) if state.get('layout') == layout_hash else set()
+
+
+def _write_json(filename, value):
+    tmp_filename = '{}.tmp'.format(filename)
+    with open(tmp_filename, 'w') as json_file:
+        json.dump(value, json_file)
+    os.replace(tmp_filename, filename)
+
+
+def download_series(fetch, items, manifest_filename, manifest=None, workers=Settings.time_series_workers,
+                    progress=None):
+    """ Downloads a set of files concurrently with a bounded pool of workers and writes a JSON manifest which
+    describes every downloaded file. Failure of one file doesn't stop the others. Files which already exist were
+    finished by a previous interrupted call and they are not downloaded again.
+
+    :param fetch: Function which downloads url into a file, it receives parameters (url, filename, progress)
+    :type fetch: function
+    :param items: Dictionaries which contain at least 'url' and 'file' (path of the downloaded file) and any
+                  other info which is stored in the manifest
+    :type items: list(dict)
+    :param manifest_filename: Path of the manifest file
+    :type manifest_filename: str
+    :param manifest: Additional info stored in the manifest
+    :type manifest: dict or None
+    :param workers: Number of concurrent downloads
+    :type workers: int
+    :param progress: Function called with parameters (downloaded bytes, finished fraction)
+    :type progress: function or None
+    :raises: IncompleteDownload if any of the files failed to download
+    """
+    item_bytes = {}
+    lock = threading.Lock()
+    finished = [0]
+
+    def report():
+        if progress:
+            with lock:
+                downloaded_bytes = sum(item_bytes.values())
+            progress(downloaded_bytes, finished[0] / float(max(len(items), 1)))
+
+    def download(index, item):
+        def item_progress(downloaded, _):
+            with lock:
+                item_bytes[index] = downloaded
+            report()
+
+        try:
+            if os.path.exists(item['file']):  # downloads are renamed to their final names only once complete
+                with lock:
+                    item_bytes[index] = os.path.getsize(item['file'])
+            else:
+                fetch(item['url'], item['file'], item_progress)
+            item['status'] = 'downloaded'
+            item.pop('error', None)
+        except (requests.RequestException, IOError, OSError) as exception:
+            item['status'] = 'failed'
+            item['error'] = str(exception)
+        with lock:
+            finished[0] += 1
+        report()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(download, index, item) for index, item in enumerate(items)]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            manifest = dict(manifest or {})
+            manifest['files'] = [dict(item, file=os.path.basename(item['file'])) for item in items]
+            with open(manifest_filename, 'w') as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+
+    failed = [item for item in items if item.get('status') != 'downloaded']
+    if failed:
+        raise IncompleteDownload('{} out of {} files failed to download, see {}'.format(
+            len(failed), len(items), manifest_filename))
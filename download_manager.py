@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains a queue of download jobs which are executed in background tasks
+"""
+
+import time
+import threading
+from sys import version_info
+
+if version_info[0] >= 3:
+    from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+else:
+    from PyQt4.QtCore import QObject, QTimer, pyqtSignal
+
+from .tasks import run_task
+from . import Settings
+
+
+class DownloadInterrupted(Exception):
+    """ Raised inside a running job when user paused or canceled it
+    """
+    pass
+
+
+class DownloadJob:
+    """ Stores state and progress of a single download job
+    """
+
+    QUEUED = 'Queued'
+    RUNNING = 'Running'
+    PAUSED = 'Paused'
+    FINISHED = 'Finished'
+    FAILED = 'Failed'
+    CANCELED = 'Canceled'
+
+    def __init__(self, name, function, cleanup=None):
+        """
+        :param name: Name of the job shown to user, usually name of the downloaded file
+        :type name: str
+        :param function: Function which executes the download in a background thread. It receives a progress
+                         function which must be called with parameters (downloaded bytes, finished fraction or None)
+        :type function: function
+        :param cleanup: Function which removes partially downloaded data of a canceled job
+        :type cleanup: function or None
+        """
+        self.name = name
+        self.function = function
+        self.cleanup = cleanup
+        self.state = self.QUEUED
+        self.error = None
+        self.task = None
+
+        self.downloaded = 0
+        self.fraction = None
+        self.speed = 0.0
+        self.started = None
+        self.start_fraction = 0.0  # fraction which was already finished when the job was started or resumed
+        self.finished = None
+        self.requested_state = None
+        self._last_sample = None
+        self._lock = threading.Lock()
+
+    @property
+    def eta(self):
+        """
+        :return: Estimated number of seconds until the job finishes or None if it is unknown
+        :rtype: float or None
+        """
+        if self.state != self.RUNNING or not self.fraction or not self.started:
+            return None
+        fraction_delta = self.fraction - self.start_fraction
+        if fraction_delta <= 0:
+            return None
+        elapsed = time.time() - self.started
+        return elapsed * (1 - self.fraction) / fraction_delta
+
+    def progress(self, downloaded, fraction=None):
+        """ Updates progress of the job. It is called from the background thread and raises DownloadInterrupted
+        if user paused or canceled the job.
+
+        :param downloaded: Number of downloaded bytes
+        :type downloaded: int
+        :param fraction: Finished fraction of the job between 0 and 1 or None if it is unknown
+        :type fraction: float or None
+        """
+        if self.requested_state is not None or (self.task is not None and self.task.isCanceled()):
+            raise DownloadInterrupted()
+
+        now = time.time()
+        with self._lock:
+            if self._last_sample is not None:
+                last_time, last_downloaded = self._last_sample
+                if now - last_time >= Settings.download_speed_interval:
+                    speed = (downloaded - last_downloaded) / (now - last_time)
+                    self.speed = speed if not self.speed else 0.7 * self.speed + 0.3 * speed
+                    self._last_sample = now, downloaded
+            else:
+                self._last_sample = now, downloaded
+            self.downloaded = downloaded
+            self.fraction = fraction
+
+        if fraction is not None and self.task is not None:
+            self.task.setProgress(100 * fraction)
+
+    def run(self, task):
+        """ Executes the job inside a background task
+        """
+        self.task = task
+        self.function(self.progress)
+
+    def start(self):
+        self.state = self.RUNNING
+        self.error = None
+        self.speed = 0.0
+        self.started = time.time()
+        self.start_fraction = self.fraction or 0.0
+        self.requested_state = None
+        self._last_sample = None
+
+    def request_state(self, state):
+        """ Asks a running job to stop and end in the given state
+        """
+        self.requested_state = state
+
+
+class DownloadManager(QObject):
+    """ Queue of download jobs. At most Settings.download_max_jobs jobs run at the same time, each in its own
+    background task.
+    """
+
+    jobsChanged = pyqtSignal()
+    jobFinished = pyqtSignal(object)
+
+    def __init__(self, max_jobs=Settings.download_max_jobs, parent=None):
+        super(DownloadManager, self).__init__(parent)
+        self.max_jobs = max_jobs
+        self.jobs = []
+
+        # Progress of running jobs is refreshed periodically
+        self.timer = QTimer(self)
+        self.timer.setInterval(Settings.download_refresh_interval)
+        self.timer.timeout.connect(self.jobsChanged.emit)
+
+    def add_job(self, job):
+        """ Adds job to the queue and starts it if there is a free slot
+        """
+        self.jobs.append(job)
+        self._start_next()
+        self.jobsChanged.emit()
+
+    def pause(self, job):
+        if job.state == DownloadJob.RUNNING:
+            job.request_state(DownloadJob.PAUSED)
+        elif job.state == DownloadJob.QUEUED:
+            job.state = DownloadJob.PAUSED
+        self.jobsChanged.emit()
+
+    def resume(self, job):
+        if job.state in (DownloadJob.PAUSED, DownloadJob.FAILED):
+            job.state = DownloadJob.QUEUED
+            self._start_next()
+        self.jobsChanged.emit()
+
+    def cancel(self, job):
+        if job.state == DownloadJob.RUNNING:
+            job.request_state(DownloadJob.CANCELED)
+        elif job.state in (DownloadJob.QUEUED, DownloadJob.PAUSED, DownloadJob.FAILED):
+            job.state = DownloadJob.CANCELED
+            if job.cleanup:
+                job.cleanup()
+        self.jobsChanged.emit()
+
+    def cancel_all(self):
+        for job in self.jobs:
+            self.cancel(job)
+
+    def clear_finished(self):
+        """ Removes finished, failed and canceled jobs from the list
+        """
+        self.jobs = [job for job in self.jobs if job.state in (DownloadJob.QUEUED, DownloadJob.RUNNING,
+                                                               DownloadJob.PAUSED)]
+        self.jobsChanged.emit()
+
+    def running_jobs(self):
+        return [job for job in self.jobs if job.state == DownloadJob.RUNNING]
+
+    def _start_next(self):
+        for job in self.jobs:
+            if len(self.running_jobs()) >= self.max_jobs:
+                break
+            if job.state == DownloadJob.QUEUED:
+                self._start(job)
+
+    def _start(self, job):
+        job.start()
+        self.timer.start()
+        job.task = run_task('Downloading {}'.format(job.name), job.run,
+                            callback=lambda result, exception: self._job_done(job, exception),
+                            canceled_callback=lambda: self._job_done(job, DownloadInterrupted()))
+
+    def _job_done(self, job, exception):
+        job.task = None
+        job.finished = time.time()
+        if exception is None:
+            job.state = DownloadJob.FINISHED
+            job.fraction = 1.0
+        elif isinstance(exception, DownloadInterrupted):
+            job.state = job.requested_state or DownloadJob.CANCELED
+            if job.state == DownloadJob.CANCELED and job.cleanup:
+                job.cleanup()
+        else:
+            job.state = DownloadJob.FAILED
+            job.error = exception
+
+        self._start_next()
+        if not self.running_jobs():
+            self.timer.stop()
+        self.jobFinished.emit(job)
+        self.jobsChanged.emit()
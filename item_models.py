@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains item models of collections, layers and CRS combo boxes. Models read names directly from lists of
+capabilities, rows are fetched lazily in batches and names can be filtered by typing into the combo box.
+"""
+
+from bisect import bisect_left
+from sys import version_info
+
+if version_info[0] >= 3:
+    from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+    from PyQt5.QtWidgets import QComboBox, QCompleter
+else:
+    from PyQt4.QtCore import Qt, QAbstractListModel, QModelIndex
+    from PyQt4.QtGui import QComboBox, QCompleter
+
+from . import Settings
+
+
+NGRAM_SIZE = 3
+
+
+class NameIndex:
+    """ Prefix and substring index of names of capabilities items (collections, layers, CRS), it is shared by all
+    models which show the items. Setting new items only swaps the list, names and the index are built on the first
+    search. While the searched text grows, only matches of the previous search are checked.
+    """
+
+    def __init__(self, items=None):
+        """
+        :param items: Items with attribute name, e.g. Capabilities.collections
+        :type items: list or None
+        """
+        self.items = items or []
+        self.listeners = []
+        self._reset_index()
+
+    def _reset_index(self):
+        self._names = None  # lowercase names in order of items
+        self._sorted_names = None  # sorted list of (lowercase name, position)
+        self._ngrams = None  # substring of length NGRAM_SIZE -> set of positions of names which contain it
+        self._last_search = None  # (text, positions) of the last search, it is narrowed while the text grows
+
+    def set_items(self, items):
+        """ Replaces items and resets all models which show them
+        """
+        self.items = items or []
+        self._reset_index()
+        for listener in self.listeners:
+            listener()
+
+    def __len__(self):
+        return len(self.items)
+
+    def get_name(self, position):
+        return self.items[position].name
+
+    def _build_index(self):
+        self._names = [item.name.lower() for item in self.items]
+        self._sorted_names = sorted((name, position) for position, name in enumerate(self._names))
+
+    def _get_ngrams(self):
+        if self._ngrams is None:
+            self._ngrams = {}
+            for position, name in enumerate(self._names):
+                for start in range(len(name) - NGRAM_SIZE + 1):
+                    self._ngrams.setdefault(name[start: start + NGRAM_SIZE], set()).add(position)
+        return self._ngrams
+
+    def search(self, text):
+        """ Finds items whose names contain the text, case is ignored
+
+        :param text: Searched text
+        :type text: str
+        :return: Positions of matching items, names which start with the text come first, otherwise the order of items
+                 is kept. None is returned for an empty text which matches everything.
+        :rtype: list(int) or None
+        """
+        text = text.strip().lower()
+        if not text:
+            return None
+        if self._names is None:
+            self._build_index()
+
+        if self._last_search is not None and text.startswith(self._last_search[0]):
+            candidates = [position for position in self._last_search[1] if text in self._names[position]]
+        elif len(text) >= NGRAM_SIZE:
+            ngrams = self._get_ngrams()
+            ngram_sets = sorted((ngrams.get(text[start: start + NGRAM_SIZE], set())
+                                 for start in range(len(text) - NGRAM_SIZE + 1)), key=len)
+            candidates = [position for position in ngram_sets[0].intersection(*ngram_sets[1:])
+                          if text in self._names[position]]
+        else:
+            candidates = [position for position, name in enumerate(self._names) if text in name]
+        self._last_search = text, candidates
+
+        prefix_positions = sorted(self._iter_prefix_positions(text))
+        prefix_set = set(prefix_positions)
+        return prefix_positions + sorted(position for position in candidates if position not in prefix_set)
+
+    def _iter_prefix_positions(self, text):
+        for index in range(bisect_left(self._sorted_names, (text,)), len(self._sorted_names)):
+            name, position = self._sorted_names[index]
+            if not name.startswith(text):
+                return
+            yield position
+
+
+class NameListModel(QAbstractListModel):
+    """ List model of items of a NameIndex. Rows are fetched in batches once a view scrolls to them, a filter shows
+    only items which match the searched text. The position of an item in the unfiltered list is stored in UserRole.
+    """
+
+    def __init__(self, name_index, parent=None, batch_size=Settings.item_model_batch_size):
+        super(NameListModel, self).__init__(parent)
+        self.name_index = name_index
+        self.batch_size = batch_size
+        self.filter_text = ''
+        self._positions = None  # positions of filtered items or None if there is no filter
+        self._fetched = min(batch_size, len(name_index))
+        name_index.listeners.append(self.reset)
+
+    def _size(self):
+        return len(self.name_index) if self._positions is None else len(self._positions)
+
+    def reset(self):
+        self.beginResetModel()
+        self._positions = self.name_index.search(self.filter_text)
+        self._fetched = min(self.batch_size, self._size())
+        self.endResetModel()
+
+    def set_filter(self, text):
+        self.filter_text = text
+        self.reset()
+
+    def get_position(self, row):
+        """ Position of the item of a row in the unfiltered list of items
+        """
+        return row if self._positions is None else self._positions[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._fetched
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._fetched < self._size()
+
+    def fetchMore(self, parent=QModelIndex(), row=None):
+        """ Fetches the next batch of rows or all rows up to the given row
+        """
+        if not self.canFetchMore(parent):
+            return
+        last_row = min(self._size(), max(self._fetched + self.batch_size, (row or 0) + 1)) - 1
+        self.beginInsertRows(QModelIndex(), self._fetched, last_row)
+        self._fetched = last_row + 1
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self._fetched:
+            return None
+        position = self.get_position(index.row())
+        if role in (Qt.DisplayRole, Qt.EditRole, Qt.ToolTipRole):
+            return self.name_index.get_name(position)
+        if role == Qt.UserRole:
+            return position
+        return None
+
+
+def set_filterable_model(combo, name_index):
+    """ Shows items of the index in the combo box. The combo box becomes editable, typed text filters its items in
+    a popup and choosing an item from the popup selects it in the combo box.
+
+    :param combo: A combo box of the dock widget
+    :type combo: QComboBox
+    :param name_index: Shared index of items
+    :type name_index: NameIndex
+    """
+    combo.setModel(NameListModel(name_index, combo))
+    combo.setEditable(True)
+    combo.setInsertPolicy(QComboBox.NoInsert)
+
+    filter_model = NameListModel(name_index, combo)
+    completer = QCompleter(filter_model, combo)
+    completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+    completer.setCaseSensitivity(Qt.CaseInsensitive)
+    # The completer is set on the line edit, because combo box would look up the chosen name only among fetched rows
+    combo.lineEdit().setCompleter(completer)
+    combo.lineEdit().textEdited.connect(filter_model.set_filter)
+
+    def item_chosen(index):
+        set_current_position(combo, completer.completionModel().data(index, Qt.UserRole))
+
+    def editing_finished():
+        if not completer.popup().isVisible():  # typed text which doesn't select any item is dropped
+            combo.lineEdit().setText(combo.itemText(combo.currentIndex()))
+
+    completer.activated[QModelIndex].connect(item_chosen)
+    combo.lineEdit().editingFinished.connect(editing_finished)
+
+
+def set_current_position(combo, position):
+    """ Selects an item by its position in the unfiltered list, rows are fetched up to it if needed
+    """
+    model = combo.model()
+    if position is None or not 0 <= position < len(model.name_index):
+        return
+    model.fetchMore(QModelIndex(), position)
+    combo.setCurrentIndex(position)
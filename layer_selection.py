@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains a dialog for selecting multiple collections, layers and styles from capabilities
+"""
+
+from sys import version_info
+
+if version_info[0] >= 3:
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtWidgets import QDialog, QDialogButtonBox, QTreeWidget, QTreeWidgetItem, QVBoxLayout
+else:
+    from PyQt4.QtCore import Qt
+    from PyQt4.QtGui import QDialog, QDialogButtonBox, QTreeWidget, QTreeWidgetItem, QVBoxLayout
+
+
+# Only collections propagate their check state, so that checking a layer never checks its styles
+COLLECTION_FLAGS = Qt.ItemIsUserCheckable | getattr(Qt, 'ItemIsAutoTristate', Qt.ItemIsTristate)
+
+
+def get_default_style(layer):
+    return layer.styles[0] if layer.styles else ''
+
+
+class LayerSelectionDialog(QDialog):
+    """ Tree of collections, their layers and styles of layers with more than one style. Layers of a collection are
+    added to the tree only when it is expanded, a checked collection which was never expanded stands for all its
+    layers with their default styles. In the same way a checked layer without any checked style stands for its default
+    style, so the selection doesn't depend on which items were expanded. Checking a style checks its layer.
+    """
+
+    def __init__(self, capabilities, parent=None):
+        """
+        :param capabilities: Capabilities of the selected instance
+        :type capabilities: Capabilities
+        """
+        super(LayerSelectionDialog, self).__init__(parent)
+        self.capabilities = capabilities
+        self.setWindowTitle('Select layers')
+        self.resize(450, 500)
+
+        self.tree = QTreeWidget(self)
+        self.tree.setHeaderHidden(True)
+        for collection in capabilities.collections:
+            item = QTreeWidgetItem(self.tree, [collection.name])
+            item.setFlags(item.flags() | COLLECTION_FLAGS)
+            item.setCheckState(0, Qt.Unchecked)
+            item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+        self.tree.itemExpanded.connect(self.populate_collection)
+        self.tree.itemChanged.connect(self.check_style_layer)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, parent=self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.tree)
+        layout.addWidget(buttons)
+
+    def populate_collection(self, item):
+        """ Adds layers of a collection when its item is expanded for the first time
+        """
+        if item.parent() is not None or item.childCount():
+            return
+        check_state = item.checkState(0)
+        for layer in self.capabilities.layers.get(item.text(0), []):
+            layer_item = QTreeWidgetItem(item, [layer.name])
+            layer_item.setFlags(layer_item.flags() | Qt.ItemIsUserCheckable)
+            layer_item.setData(0, Qt.UserRole, layer)
+            layer_item.setCheckState(0, check_state)
+            if layer.styles and len(layer.styles) > 1:
+                for style in layer.styles:
+                    style_item = QTreeWidgetItem(layer_item, [style])
+                    style_item.setFlags(style_item.flags() | Qt.ItemIsUserCheckable)
+                    style_item.setData(0, Qt.UserRole, style)
+                    style_item.setCheckState(0, Qt.Unchecked)
+
+    @staticmethod
+    def check_style_layer(item):
+        """ Checks the layer of a style item which was checked
+        """
+        layer_item = item.parent()
+        if layer_item is None or layer_item.parent() is None or item.checkState(0) != Qt.Checked:
+            return
+        layer_item.setCheckState(0, Qt.Checked)
+
+    def get_selection(self):
+        """ Checked layers and styles
+
+        :return: List of (collection name, layer, style)
+        :rtype: list((str, Capabilities.Layer, str))
+        """
+        selection = []
+        for index in range(self.tree.topLevelItemCount()):
+            item = self.tree.topLevelItem(index)
+            if item.checkState(0) == Qt.Unchecked:
+                continue
+            collection_name = item.text(0)
+            if not item.childCount():
+                selection.extend((collection_name, layer, get_default_style(layer))
+                                 for layer in self.capabilities.layers.get(collection_name, []))
+                continue
+
+            for layer_index in range(item.childCount()):
+                layer_item = item.child(layer_index)
+                if layer_item.checkState(0) == Qt.Unchecked:
+                    continue
+                layer = layer_item.data(0, Qt.UserRole)
+                styles = [layer_item.child(style_index).text(0) for style_index in range(layer_item.childCount())
+                          if layer_item.child(style_index).checkState(0) == Qt.Checked]
+                selection.extend((collection_name, layer, style) for style in styles or [get_default_style(layer)])
+        return selection
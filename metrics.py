@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains in-memory metrics of HTTP requests sent to Euro Data Cube services
+"""
+
+import csv
+import json
+import math
+import threading
+import time
+from collections import deque, namedtuple, OrderedDict
+
+try:
+    from urllib.parse import urlparse, parse_qsl
+except ImportError:
+    from urlparse import urlparse, parse_qsl
+
+from . import Settings
+
+
+URL_CLASSES = ['instances', 'capabilities', 'wms', 'wmts', 'wcs', 'wfs', 'other']
+PERCENTILES = (50, 95, 99)
+
+# Start time (seconds since epoch), url class, url, HTTP status (None if no response arrived), total time and time to
+# the first byte (response headers) in seconds, number of received bytes, number of retries and error or None
+RequestRecord = namedtuple('RequestRecord', ['start', 'url_class', 'url', 'status', 'latency', 'ttfb', 'bytes',
+                                             'retries', 'error'])
+
+
+def classify_url(url):
+    """ Type of request by its url
+
+    :rtype: str
+    """
+    parsed_url = urlparse(url)
+    if parsed_url.path.endswith('/instances.json'):
+        return 'instances'
+    parameters = {name.lower(): value.lower() for name, value in parse_qsl(parsed_url.query)}
+    if parameters.get('request') == 'getcapabilities':
+        return 'capabilities'
+    service = parameters.get('service')
+    return service if service in URL_CLASSES else 'other'
+
+
+def get_percentile(sorted_values, percentile):
+    """ Percentile of sorted values with nearest rank method
+
+    :rtype: float or None
+    """
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(percentile / 100.0 * len(sorted_values)))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class RequestMetrics:
+    """ Thread-safe ring buffer of the latest request records with summaries per url class
+    """
+
+    def __init__(self, size=Settings.metrics_buffer_size):
+        """
+        :param size: Maximal number of stored records, the oldest are dropped
+        :type size: int
+        """
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def records(self):
+        """
+        :return: Copy of stored records, the oldest first
+        :rtype: list(RequestRecord)
+        """
+        with self._lock:
+            return list(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def summary(self):
+        """ Summary of stored records for each url class which has any records
+
+        :return: Dictionary of url class and dictionary with number of requests, failures and retries, received bytes
+                 and latency and TTFB percentiles in seconds
+        :rtype: OrderedDict(str, dict)
+        """
+        groups = OrderedDict((url_class, []) for url_class in URL_CLASSES)
+        for record in self.records():
+            groups[record.url_class].append(record)
+
+        summary = OrderedDict()
+        for url_class, records in groups.items():
+            if not records:
+                continue
+            latencies = sorted(record.latency for record in records)
+            ttfbs = sorted(record.ttfb for record in records if record.ttfb is not None)
+            stats = {
+                'requests': len(records),
+                'failed': sum(1 for record in records if record.error is not None),
+                'retries': sum(record.retries for record in records),
+                'bytes': sum(record.bytes for record in records)
+            }
+            for percentile in PERCENTILES:
+                stats['latency_p{}'.format(percentile)] = get_percentile(latencies, percentile)
+                stats['ttfb_p{}'.format(percentile)] = get_percentile(ttfbs, percentile)
+            summary[url_class] = stats
+        return summary
+
+    def export_csv(self, filename):
+        with open(filename, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(RequestRecord._fields)
+            writer.writerows(self.records())
+
+    def export_json(self, filename):
+        with open(filename, 'w') as json_file:
+            json.dump({
+                'summary': self.summary(),
+                'requests': [record._asdict() for record in self.records()]
+            }, json_file, indent=2)
+
+
+class RequestTimer:
+    """ Measures a single request and adds its record to metrics once it is finished
+    """
+
+    def __init__(self, metrics, url):
+        self.metrics = metrics
+        self.url = url
+        self.start = time.time()
+
+    def finish(self, response=None, received_bytes=0, error=None):
+        """
+        :param response: Response or None if no response arrived
+        :type response: requests.Response or None
+        :param received_bytes: Number of received bytes of response content
+        :type received_bytes: int
+        :param error: Error of a failed request
+        :type error: Exception or None
+        """
+        retries = getattr(getattr(response, 'raw', None), 'retries', None)
+        self.metrics.add(RequestRecord(
+            start=self.start,
+            url_class=classify_url(self.url),
+            url=self.url,
+            status=response.status_code if response is not None else None,
+            latency=time.time() - self.start,
+            ttfb=response.elapsed.total_seconds() if response is not None else None,
+            bytes=received_bytes,
+            retries=len(retries.history) if retries is not None and retries.history else 0,
+            error=None if error is None else '{}: {}'.format(type(error).__name__, error)
+        ))
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains a shared HTTP session used for all requests to Euro Data Cube services
+"""
+
+import threading
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+try:
+    from urllib3.util.retry import Retry
+except ImportError:
+    from requests.packages.urllib3.util.retry import Retry
+
+from .metrics import RequestTimer
+from . import Settings
+
+
+class RequestCoalescer:
+    """ Runs identical calls which overlap in time only once, callers which arrive while the first call is still in
+    progress wait for it and share its result or exception
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, function):
+        """
+        :param key: Hashable identifier of the call
+        :param function: Function without parameters which is called by the first caller
+        :return: Result of the function
+        """
+        with self._lock:
+            future = self._futures.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._futures[key] = Future()
+        if not is_owner:
+            return future.result()
+
+        try:
+            result = function()
+        except BaseException as exception:
+            future.set_exception(exception)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._futures.pop(key, None)
+
+
+class HttpSession:
+    """ HTTP session with connection pooling, keep-alive and retries with exponential backoff.
+
+    Method get may be called from several threads. They share the urllib3 connection pool, which is thread-safe, and
+    headers of the underlying requests.Session, which are never changed after construction. requests itself doesn't
+    guarantee thread safety of a Session, so the session must not be reconfigured while requests are running, and
+    cookies set by responses are shared between threads without synchronization.
+
+    Proxy configuration is obtained from a provider function only once and then cached until it is invalidated.
+    Identical requests which are not streamed and run at the same time share a single response.
+    """
+
+    def __init__(self, user_agent, proxy_provider=None, retries=Settings.http_retries,
+                 backoff_factor=Settings.http_backoff_factor, pool_size=Settings.http_pool_size,
+                 timeout=Settings.http_timeout, metrics=None):
+        """
+        :param user_agent: User-Agent header sent with every request
+        :type user_agent: str
+        :param proxy_provider: Function which returns a pair of proxy dictionary and proxy authentication
+        :type proxy_provider: function or None
+        :param retries: Number of retries for connection errors and responses with status 5xx
+        :type retries: int
+        :param backoff_factor: Retries wait backoff_factor * 2 ** (retry number - 1) seconds
+        :type backoff_factor: float
+        :param pool_size: Maximal number of kept-alive connections per host
+        :type pool_size: int
+        :param timeout: Connect and read timeout in seconds
+        :type timeout: float or tuple(float, float)
+        :param metrics: Metrics into which every request is recorded
+        :type metrics: RequestMetrics or None
+        """
+        self.proxy_provider = proxy_provider
+        self.timeout = timeout
+        self.metrics = metrics
+        self._in_flight = RequestCoalescer()
+        self._proxy_config = None
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=self.get_retry(retries, backoff_factor))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @staticmethod
+    def get_retry(retries, backoff_factor):
+        """ Retry strategy for idempotent requests. After the last retry the response is returned so that
+        its status can be checked with raise_for_status.
+        """
+        parameters = {
+            'total': retries,
+            'connect': retries,
+            'read': retries,
+            'status': retries,
+            'backoff_factor': backoff_factor,
+            'status_forcelist': Settings.http_retry_statuses,
+            'raise_on_status': False
+        }
+        try:
+            return Retry(allowed_methods=frozenset(['GET', 'HEAD']), **parameters)
+        except TypeError:  # urllib3 < 1.26
+            return Retry(method_whitelist=frozenset(['GET', 'HEAD']), **parameters)
+
+    def get_proxy_config(self):
+        """
+        :return: Cached dictionary of proxies and proxy authentication
+        :rtype: (dict, requests.auth.HTTPProxyAuth) or (dict, None)
+        """
+        with self._lock:
+            if self._proxy_config is None:
+                self._proxy_config = self.proxy_provider() if self.proxy_provider else ({}, None)
+            return self._proxy_config
+
+    def invalidate_proxy_config(self):
+        """ Proxy configuration will be obtained again before the next request
+        """
+        with self._lock:
+            self._proxy_config = None
+
+    def get(self, url, stream=False, headers=None, timeout=None):
+        """ Sends GET request
+
+        :param url: Request url
+        :type url: str
+        :param stream: True if response content should be streamed and False otherwise
+        :type stream: bool
+        :param headers: Additional request headers
+        :type headers: dict or None
+        :param timeout: Timeout in seconds which overrides the timeout of the session
+        :type timeout: float or tuple(float, float) or None
+        :return: Successful response
+        :rtype: requests.Response
+        :raises: requests.RequestException
+        """
+        if stream:
+            return self._get(url, stream, headers, timeout)
+        key = url, tuple(sorted((headers or {}).items())), timeout
+        return self._in_flight.run(key, lambda: self._get(url, stream, headers, timeout))
+
+    def _get(self, url, stream, headers, timeout):
+        proxy_dict, auth = self.get_proxy_config()
+        timer = RequestTimer(self.metrics, url) if self.metrics is not None else None
+        try:
+            response = self.session.get(url, stream=stream, headers=headers, proxies=proxy_dict, auth=auth,
+                                        timeout=self.timeout if timeout is None else timeout)
+        except requests.RequestException as exception:
+            if isinstance(exception, requests.ConnectionError):
+                # Proxy settings might have changed outside of QGIS options
+                self.invalidate_proxy_config()
+            if timer:
+                timer.finish(error=exception)
+            raise
+
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as exception:
+            try:
+                received_bytes = len(response.content)  # error message of the service is kept for the user
+            except requests.RequestException:
+                received_bytes = 0
+            finally:
+                response.close()  # a streamed response would otherwise keep its pooled connection
+            if timer:
+                timer.finish(response, received_bytes, exception)
+            raise
+        if timer:
+            if stream:
+                self._measure_content(response, timer)
+            else:
+                timer.finish(response, len(response.content))
+        return response
+
+    @staticmethod
+    def _measure_content(response, timer):
+        """ Streamed response is recorded when its content is consumed
+        """
+        iter_content = response.iter_content
+
+        def measured_iter_content(*args, **kwargs):
+            received_bytes, error = 0, None
+            try:
+                for chunk in iter_content(*args, **kwargs):
+                    received_bytes += len(chunk)
+                    yield chunk
+            except Exception as exception:
+                error = exception
+                raise
+            finally:
+                timer.finish(response, received_bytes, error)
+
+        response.iter_content = measured_iter_content
+
+    def close(self):
+        self.session.close()
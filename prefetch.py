@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains a background prefetcher which warms the local tile cache with map images which are likely to be
+requested next - surrounding tiles, neighbouring zoom levels and previous and next available dates. It observes
+requests passing through the local tile proxy, therefore it does nothing unless the tile cache is enabled.
+"""
+
+import re
+import math
+import time
+import bisect
+import threading
+from collections import deque
+
+import requests
+
+from . import Settings
+
+
+TIME_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})/(\d{4}-\d{2}-\d{2})/P1D$')
+TILE_MATRIX_PATTERN = re.compile(r'^(.*?)(\d+)$')
+
+
+def format_number(value, decimals):
+    """ Formats a number like QGIS does in request urls, i.e. without trailing zeros
+    """
+    text = '{:.{}f}'.format(value, decimals)
+    return text.rstrip('0').rstrip('.') if '.' in text else text
+
+
+def is_tile_aligned(value, size, tolerance=1e-6):
+    """ Whether a coordinate lies on a grid of tiles of the given size
+    """
+    steps = value / size
+    return abs(steps - round(steps)) < tolerance
+
+
+def replace_parameters(parameters, values):
+    """ Copy of query parameters where values of the given (case insensitive) parameter names are replaced
+
+    :param parameters: Query parameters
+    :type parameters: list((str, str))
+    :param values: Dictionary of lowercase parameter names and new values
+    :type values: dict(str, str)
+    :rtype: list((str, str))
+    """
+    return [(name, values.get(name.lower(), value)) for name, value in parameters]
+
+
+class Prefetcher:
+    """ Observes map requests passing through TileProxy and downloads images of the views around them in worker
+    threads. Workers wait while QGIS is requesting images, the newest observed views are prefetched first and the
+    download rate is limited. While a layer is animated, the following frames of the animation are prefetched
+    instead of the adjacent dates.
+
+    Other extents are prefetched only for tiles of WMTS layers and for WMS requests whose extents form a fixed tile
+    grid. An untiled WMS layer requests the extent of the map canvas, which is almost never requested again, so only
+    its adjacent dates are prefetched. Without the tile proxy nothing is observed and nothing is prefetched.
+    """
+
+    def __init__(self, tile_proxy, workers=Settings.prefetch_workers, max_bandwidth=Settings.prefetch_max_bandwidth,
+                 max_queue=Settings.prefetch_max_queue, idle_delay=Settings.prefetch_idle_delay,
+                 frames_ahead=Settings.animation_frames_ahead):
+        """
+        :param tile_proxy: Proxy whose cache is filled
+        :type tile_proxy: TileProxy
+        :param workers: Number of concurrent downloads
+        :type workers: int
+        :param max_bandwidth: Maximal download rate in bytes per second
+        :type max_bandwidth: int
+        :param max_queue: Maximal number of queued requests, the oldest are dropped
+        :type max_queue: int
+        :param idle_delay: Number of seconds after the last map request of QGIS before prefetching continues
+        :type idle_delay: float
+        :param frames_ahead: Number of prefetched animation frames following the requested one
+        :type frames_ahead: int
+        """
+        self.tile_proxy = tile_proxy
+        self.workers = workers
+        self.max_bandwidth = max_bandwidth
+        self.max_queue = max_queue
+        self.idle_delay = idle_delay
+        self.frames_ahead = frames_ahead
+        self.dates = []
+        self.frames = []
+        self._queue = deque()  # (key, service url, parameters), the newest first
+        self._queued_keys = set()
+        self._condition = threading.Condition()
+        self._next_download_time = 0
+        self._running = False
+        # Workers exit once the generation changes, so workers of a stopped run never continue after a restart
+        self._generation = 0
+
+    def start(self):
+        """ Starts worker threads and begins observing requests of the proxy
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._generation += 1
+            generation = self._generation
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(generation,), name='EDC prefetch {}'.format(index))
+            thread.daemon = True
+            thread.start()
+        self.tile_proxy.on_request = self.observe
+
+    def stop(self):
+        """ Stops observing requests and drops queued requests. Downloads in progress are finished in the background.
+        """
+        self.tile_proxy.on_request = None
+        with self._condition:
+            self._running = False
+            self._queue.clear()
+            self._queued_keys.clear()
+            self._condition.notify_all()
+
+    def set_dates(self, dates):
+        """ Sets dates which are available for the active layer and view
+
+        :param dates: Dates in format YYYY-MM-DD
+        :type dates: list(str)
+        """
+        self.dates = sorted(set(dates))
+
+    def set_frames(self, dates):
+        """ Sets dates of frames of the animated layer
+
+        :param dates: Sorted dates in format YYYY-MM-DD or an empty list if no layer is animated
+        :type dates: list(str)
+        """
+        self.frames = list(dates)
+
+    def observe(self, service_url, parameters):
+        """ Queues requests of views around a map request of QGIS. It is called from threads of the proxy.
+
+        :param service_url: EDC-OGC service url
+        :type service_url: str
+        :param parameters: Query parameters of the request
+        :type parameters: list((str, str))
+        """
+        names = {name.lower(): value for name, value in parameters}
+        candidates = self.get_date_candidates(parameters, names)
+        if 'tilematrix' in names:
+            candidates.extend(self.get_tile_candidates(parameters, names))
+        elif 'bbox' in names:
+            candidates.extend(self.get_bbox_candidates(parameters, names))
+
+        with self._condition:
+            if not self._running:
+                return
+            # Candidates are added in reverse so that the most likely requests are taken first
+            for candidate in reversed(candidates):
+                key = self.tile_proxy.cache.get_key(service_url, candidate)
+                if key in self._queued_keys:
+                    continue
+                if len(self._queue) >= self.max_queue:
+                    self._queued_keys.discard(self._queue.pop()[0])
+                self._queue.appendleft((key, service_url, candidate))
+                self._queued_keys.add(key)
+            self._condition.notify_all()
+
+    def get_date_candidates(self, parameters, names):
+        """ Requests of the same view on the following animation frames or on the previous and the next available
+        date, only requests of a single date can be stepped
+        """
+        match = TIME_PATTERN.match(names.get('time', ''))
+        if match is None or match.group(1) != match.group(2):
+            return []
+        date = match.group(1)
+
+        frames = self.frames
+        index = bisect.bisect_left(frames, date)
+        if index < len(frames) and frames[index] == date:
+            return [replace_parameters(parameters, {'time': '{0}/{0}/P1D'.format(frame_date)})
+                    for frame_date in frames[index + 1:index + 1 + self.frames_ahead]]
+
+        dates = self.dates
+        index = bisect.bisect_left(dates, date)
+        adjacent_dates = []
+        if index < len(dates) and dates[index] == date:
+            adjacent_dates.extend(dates[index + 1:index + 2])
+        else:
+            adjacent_dates.extend(dates[index:index + 1])
+        adjacent_dates.extend(dates[max(index - 1, 0):index])
+        return [replace_parameters(parameters, {'time': '{0}/{0}/P1D'.format(adjacent_date)})
+                for adjacent_date in adjacent_dates]
+
+    @staticmethod
+    def get_bbox_candidates(parameters, names):
+        """ Requests of the same image size of the 8 neighbouring tiles, the parent tile one zoom level up and the 4
+        child tiles one zoom level down. Only an extent which is a tile of a fixed grid has candidates, an untiled
+        extent of the map canvas is hardly ever requested again.
+        """
+        try:
+            bbox = [float(value) for value in names['bbox'].split(',')]
+        except ValueError:
+            return []
+        if len(bbox) != 4:
+            return []
+        min_x, min_y, max_x, max_y = bbox
+        width, height = max_x - min_x, max_y - min_y
+        if width <= 0 or height <= 0 or not (is_tile_aligned(min_x, width) and is_tile_aligned(min_y, height)):
+            return []
+        # Coordinates of child tiles may need one more decimal than the observed request
+        decimals = max(len(value.partition('.')[2]) for value in names['bbox'].split(',')) + 1
+
+        extents = [(min_x + dx * width, min_y + dy * height, max_x + dx * width, max_y + dy * height)
+                   for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1))]
+        parent_x = math.floor(round(min_x / width) / 2.0) * 2 * width
+        parent_y = math.floor(round(min_y / height) / 2.0) * 2 * height
+        extents.append((parent_x, parent_y, parent_x + 2 * width, parent_y + 2 * height))
+        extents.extend((min_x + dx * width / 2, min_y + dy * height / 2,
+                        min_x + (dx + 1) * width / 2, min_y + (dy + 1) * height / 2) for dy in (0, 1) for dx in (0, 1))
+        return [replace_parameters(parameters, {'bbox': ','.join(format_number(value, decimals) for value in extent)})
+                for extent in extents]
+
+    @staticmethod
+    def get_tile_candidates(parameters, names):
+        """ Requests of the 4 neighbouring tiles, the parent tile one zoom level up and the 4 child tiles one zoom
+        level down
+        """
+        match = TILE_MATRIX_PATTERN.match(names['tilematrix'])
+        try:
+            row, col = int(names['tilerow']), int(names['tilecol'])
+        except (KeyError, ValueError):
+            return []
+        if match is None:
+            return []
+        prefix, level = match.group(1), int(match.group(2))
+
+        tiles = [(level, row + dy, col + dx) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))]
+        if level > 0:
+            tiles.append((level - 1, row // 2, col // 2))
+        tiles.extend((level + 1, 2 * row + dy, 2 * col + dx) for dy in (0, 1) for dx in (0, 1))
+        return [replace_parameters(parameters, {'tilematrix': '{}{}'.format(prefix, tile_level),
+                                                'tilerow': str(tile_row), 'tilecol': str(tile_col)})
+                for tile_level, tile_row, tile_col in tiles if tile_row >= 0 and tile_col >= 0]
+
+    def _is_active(self, generation):
+        """ Whether a worker of the given generation should keep running, it must be called with the condition held
+        """
+        return self._running and self._generation == generation
+
+    def _work(self, generation):
+        """ Worker thread loop
+
+        :param generation: Generation of the run which started the worker
+        :type generation: int
+        """
+        while True:
+            with self._condition:
+                while self._is_active(generation) and not self._queue:
+                    self._condition.wait()
+                if not self._is_active(generation):
+                    return
+                key, service_url, parameters = self._queue.popleft()
+                self._queued_keys.discard(key)
+
+            if not self._wait_for_idle(generation):
+                return
+            try:
+                size = self.tile_proxy.prefetch(service_url, parameters)
+            except requests.RequestException:
+                continue
+            self._throttle(size, generation)
+
+    def _wait_for_idle(self, generation):
+        """ Waits until QGIS hasn't requested any image for a while so that prefetching doesn't slow down the
+        requests of the current view
+
+        :return: False if prefetcher was stopped meanwhile
+        :rtype: bool
+        """
+        while True:
+            idle_time = time.time() - self.tile_proxy.last_request_time
+            if self.tile_proxy.foreground_requests == 0 and idle_time >= self.idle_delay:
+                return True
+            with self._condition:
+                if not self._is_active(generation):
+                    return False
+                self._condition.wait(max(self.idle_delay - idle_time, 0.05))
+
+    def _throttle(self, size, generation):
+        """ Delays the next download so that the average download rate of all workers stays under the limit
+        """
+        with self._condition:
+            start_time = max(time.time(), self._next_download_time)
+            self._next_download_time = start_time + size / float(self.max_bandwidth)
+            end_time = self._next_download_time
+            while self._is_active(generation) and time.time() < end_time:
+                self._condition.wait(end_time - time.time())
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains readers of plugin metadata and QGIS settings which are needed already before the plugin itself
+is loaded, e.g. by the local tile cache which is started at QGIS startup
+"""
+
+import os
+from sys import version_info
+
+if version_info[0] >= 3:
+    from PyQt5.QtCore import QSettings
+else:
+    from PyQt4.QtCore import QSettings
+
+import requests
+
+from .network import HttpSession
+
+
+PLUGIN_DIR = os.path.dirname(__file__)
+
+
+def get_plugin_version():
+    """
+    :return: Plugin version
+    :rtype: str
+    """
+    try:
+        with open(os.path.join(PLUGIN_DIR, 'metadata.txt')) as metadata_file:
+            for line in metadata_file:
+                if line.startswith('version'):
+                    return line.split("=")[1].strip()
+    except IOError:
+        return '?'
+
+
+def get_proxy_config():
+    """ Get proxy config from QSettings and builds proxy parameters. HttpSession caches the result until QGIS
+    options change.
+
+    :return: dictionary of transfer protocols mapped to addresses, also authentication if set in QSettings
+    :rtype: (dict, requests.auth.HTTPProxyAuth) or (dict, None)
+    """
+    enabled, host, port, user, password = get_proxy_from_qsettings()
+
+    proxy_dict = {}
+    if enabled and host:
+        port_str = ':{}'.format(port) if port else ''
+        for protocol in ['http', 'https', 'ftp']:
+            proxy_dict[protocol] = '{}://{}{}'.format(protocol, host, port_str)
+
+    auth = requests.auth.HTTPProxyAuth(user, password) if enabled and user and password else None
+
+    return proxy_dict, auth
+
+
+def get_proxy_from_qsettings():
+    """ Gets the proxy configuration from QSettings
+
+    :return: Proxy settings: flag specifying if proxy is enabled, host, port, user and password
+    :rtype: tuple(str)
+    """
+    settings = QSettings()
+    settings.beginGroup('proxy')
+    enabled = str(settings.value('proxyEnabled')).lower() == 'true'  # to be compatible with QGIS 2 and 3
+    # proxy_type = settings.value("proxyType")
+    host = settings.value('proxyHost')
+    port = settings.value('proxyPort')
+    user = settings.value('proxyUser')
+    password = settings.value('proxyPassword')
+    settings.endGroup()
+    return enabled, host, port, user, password
+
+
+def create_session(metrics=None):
+    """ HTTP session of the plugin which uses proxy configured in QGIS options
+
+    :param metrics: Metrics into which every request is recorded
+    :type metrics: RequestMetrics or None
+    :rtype: HttpSession
+    """
+    return HttpSession('sh_qgis_plugin_{}'.format(get_plugin_version()), proxy_provider=get_proxy_config,
+                       metrics=metrics)
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains an immutable specification of EDC-OGC requests from which urls and names are built
+"""
+
+import re
+from collections import namedtuple
+
+try:
+    from urllib.parse import quote_plus
+except ImportError:
+    from urllib import quote_plus
+
+from .capabilities import WGS84
+from . import Settings
+
+
+def _get_filename_part(value):
+    """ Replaces characters other than letters, digits, dots and dashes with dashes, e.g. in dimension values
+    """
+    return re.sub(r'[^\w.-]+', '-', str(value))
+
+
+def format_bbox(bbox, crs):
+    """ Transforms bounding box into a string used in requests, coordinates in WGS84 are in (lat, lng) order
+
+    :param bbox: Bounding box (xmin, ymin, xmax, ymax)
+    :type bbox: tuple(float)
+    :param crs: CRS of bounding box
+    :type crs: str
+    :rtype: str
+    """
+    min_x, min_y, max_x, max_y = bbox
+    if crs == WGS84:
+        precision = 6
+        bbox_list = [min_y, min_x, max_y, max_x]
+    else:
+        precision = 2
+        bbox_list = [min_x, min_y, max_x, max_y]
+
+    return ','.join(map(lambda coord: str(round(coord, precision)), bbox_list))
+
+
+def get_wfs_url(service_url, time_range, bbox, crs):
+    """ WFS GetFeature url of satellite tiles
+
+    :param service_url: EDC-OGC service url of the instance
+    :type service_url: str
+    :param time_range: Time range in form of "time0/time1"
+    :type time_range: str
+    :param bbox: Bounding box in form of "xmin,ymin,xmax,ymax"
+    :type bbox: str
+    :param crs: CRS of bounding box
+    :type crs: str
+    :rtype: str
+    """
+    url = '{}?'.format(service_url)
+    for parameter, value in Settings.parameters_wfs.items():
+        url += '{}={}&'.format(parameter, value)
+
+    return '{}bbox={}&time={}&srsname={}'.format(url, bbox, time_range, crs)
+
+
+_RequestSpec = namedtuple('_RequestSpec', ['service_url', 'service_type', 'collection', 'layer', 'title', 'layer_name',
+                                           'style', 'time', 'exact_date', 'priority', 'maxcc', 'crs', 'dimensions',
+                                           'image_format', 'resx', 'resy'])
+
+
+class RequestSpec(_RequestSpec):
+    """ Snapshot of all parameters of requests which were selected by user. It is immutable and hashable, therefore
+    urls can be built from it in any thread and it can be used as a cache key. A modified copy is created with
+    method _replace.
+
+    Fields:
+        service_url - EDC-OGC service url of the instance
+        service_type - 'wms' or 'wmts'
+        collection - Name of the collection
+        layer - Layer id
+        title - Layer title
+        layer_name - Name of the layer, bands or wavelengths shown in names of QGIS layers
+        style - Layer style
+        time - Time parameter, e.g. '2020-01-01/2020-02-01/P1D'
+        exact_date - True if time is a single date
+        priority - Mosaicking priority
+        maxcc - Maximal cloud coverage in percents
+        crs - CRS of requests, e.g. 'EPSG:3857'
+        dimensions - Tuple of (name, value) pairs of dimension parameters, e.g. (('dim_bands', 'B04,B03,B02'),)
+        image_format - Image format of downloads
+        resx, resy - Resolution of downloads in meters
+    """
+    __slots__ = ()
+
+    def get_dimension_parameters(self):
+        return ''.join('&{}={}'.format(name, value) for name, value in self.dimensions)
+
+    def get_dimension_values(self):
+        """ Values of dimension parameters in a form which can be part of a filename
+        """
+        return [_get_filename_part(value) for _, value in self.dimensions]
+
+    def get_wms_uri(self, layer_service_url=None):
+        """ URI of a QGIS WMS layer
+
+        :param layer_service_url: Url which is used instead of service url, e.g. url of local caching proxy
+        :type layer_service_url: str or None
+        :rtype: str
+        """
+        values = {
+            'styles': self.style,
+            'title': self.title,
+            'layers': self.layer,
+            'time': self.time,
+            'maxcc': self.maxcc,
+            'priority': self.priority,
+            'crs': self.crs
+        }
+        request_parameters = list(Settings.parameters_wms.items()) + list(Settings.parameters.items())
+        uri = ''.join('{}={}&'.format(parameter, values.get(parameter, value))
+                      for parameter, value in request_parameters)
+
+        # Every parameter that QGIS layer doesn't use by default must be in url
+        # And url has to be encoded
+        url = '{}?Time={}{}& &priority={}&maxcc={}'.format(layer_service_url or self.service_url, self.time,
+                                                           self.get_dimension_parameters(), self.priority, self.maxcc)
+        return '{}url={}'.format(uri, quote_plus(url))
+
+    def get_wmts_uri(self, tile_matrix_set, crs, layer_service_url=None):
+        """ URI of a QGIS WMTS layer
+
+        :param tile_matrix_set: Id of tile matrix set linked to the layer
+        :type tile_matrix_set: str
+        :param crs: CRS of the tile matrix set
+        :type crs: str
+        :param layer_service_url: Url which is used instead of service url, e.g. url of local caching proxy
+        :type layer_service_url: str or None
+        :rtype: str
+        """
+        request_parameters = dict(Settings.parameters_wmts)
+        request_parameters.update({
+            'layers': self.layer,
+            'styles': self.style or 'default',
+            'tileMatrixSet': tile_matrix_set,
+            'crs': crs
+        })
+        uri = ''.join('{}={}&'.format(parameter, value) for parameter, value in request_parameters.items())
+
+        # Parameters which QGIS doesn't know must be part of the url from which tiles are requested
+        url = '{}?TIME={}{}&priority={}&maxcc={}'.format(layer_service_url or self.service_url, self.time,
+                                                         self.get_dimension_parameters(), self.priority, self.maxcc)
+        return '{}url={}'.format(uri, quote_plus(url))
+
+    def get_wcs_url(self, bbox, crs=None, size=None, time=None):
+        """ WCS GetCoverage url
+
+        :param bbox: Bounding box in form of "xmin,ymin,xmax,ymax"
+        :type bbox: str
+        :param crs: CRS of bounding box, if not given CRS of the specification is used
+        :type crs: str or None
+        :param size: Width and height of image in pixels, if set they are used instead of resolution
+        :type size: (int, int) or None
+        :param time: Time parameter which overrides time of the specification
+        :type time: str or None
+        :rtype: str
+        """
+        values = {
+            'format': self.image_format,
+            'resx': self.resx,
+            'resy': self.resy,
+            'title': self.title,
+            'layers': self.layer,
+            'time': time or self.time,
+            'maxcc': self.maxcc,
+            'priority': self.priority,
+            'crs': crs or self.crs
+        }
+        request_parameters = list(Settings.parameters_wcs.items()) + [('coverage', self.layer)] + \
+            list(Settings.parameters.items())
+
+        url = '{}?'.format(self.service_url)
+        for parameter, value in request_parameters:
+            value = values.get(parameter, value)
+            if parameter in ('resx', 'resy'):
+                if size:
+                    continue
+                value = value.strip('m') + 'm'
+            url += '{}={}&'.format(parameter, value)
+        if size:
+            url += 'width={}&height={}&'.format(*size)
+        if self.style:
+            url += 'styles={}&'.format(self.style)
+        url += ''.join('{}={}&'.format(name, value) for name, value in self.dimensions)
+        return '{}bbox={}'.format(url, bbox)
+
+    def get_wfs_url(self, time_range, bbox, crs=None):
+        """ WFS GetFeature url of satellite tiles
+
+        :param time_range: Time range in form of "time0/time1"
+        :type time_range: str
+        :param bbox: Bounding box in form of "xmin,ymin,xmax,ymax"
+        :type bbox: str
+        :param crs: CRS of bounding box, if not given CRS of the specification is used
+        :type crs: str or None
+        :rtype: str
+        """
+        return get_wfs_url(self.service_url, time_range, bbox, crs or self.crs)
+
+    def get_filename(self, bbox):
+        """ Filename which contains some metadata, style and dimension values are included only if they are set
+        DataSource_LayerName[_style][_dimension values]_maxcc_priority_xmin_y_min_xmax_ymax.FORMAT
+
+        :param bbox: Bounding box in form of "xmin,ymin,xmax,ymax"
+        :type bbox: str
+        :rtype: str
+        """
+        info_list = [self.collection, self.layer] + ([_get_filename_part(self.style)] if self.style else []) + \
+            self.get_dimension_values() + [self.maxcc, self.priority]
+        info_list.extend(bbox.split(','))
+
+        name = '.'.join(map(str, ['_'.join(map(str, info_list)), self.image_format.split(';')[0].split('/')[1]]))
+        return name.replace(' ', '').replace(':', '_').replace('/', '_')
+
+    def get_time_name(self):
+        """ Time interval in a form that is displayed in QGIS layer name
+
+        :rtype: str
+        """
+        time_interval = self.time.split('/')[:2]
+        if self.exact_date:
+            time_interval = time_interval[:1]
+        if len(time_interval) == 1:
+            if not time_interval[0]:
+                time_interval[0] = '-/-'  # 'all times'
+        else:
+            if not time_interval[0]:
+                time_interval[0] = '-'  # 'start'
+            if not time_interval[1]:
+                time_interval[1] = '-'  # 'end'
+        return '/'.join(time_interval)
+
+    def get_layer_name(self):
+        """ Name of QGIS layer
+
+        :rtype: str
+        """
+        plugin_params = [self.get_time_name(), self.style, self.crs, self.priority, '{}%'.format(self.maxcc)]
+        if self.service_type == 'wmts':
+            plugin_params.append('WMTS')
+        return '{} - {} ({})'.format(self.collection, self.layer_name, ', '.join(plugin_params))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains helpers for running plugin work in background tasks
+"""
+
+from sys import version_info
+
+if version_info[0] >= 3:
+    from qgis.core import QgsApplication, QgsTask
+
+# References to tasks which are still running, otherwise Python would garbage collect them
+_active_tasks = set()
+
+
+class SynchronousTask:
+    """ Runs a function immediately in the main thread. It is used where QGIS task manager is not available (QGIS 2)
+    """
+    def __init__(self, description, function, callback, canceled_callback=None):
+        self.description = description
+        self.function = function
+        self.callback = callback
+        self.canceled_callback = canceled_callback
+        self.canceled = False
+
+    def isCanceled(self):
+        return self.canceled
+
+    def cancel(self):
+        self.canceled = True
+
+    def setProgress(self, progress):
+        pass
+
+    def start(self):
+        result, exception = None, None
+        try:
+            result = self.function(self)
+        except Exception as error:
+            exception = error
+        if not self.canceled and self.callback:
+            self.callback(result, exception)
+        elif self.canceled and self.canceled_callback:
+            self.canceled_callback()
+
+
+if version_info[0] >= 3:
+    class FunctionTask(QgsTask):
+        """ Runs a function in QGIS task manager and passes its result to a callback in the main thread
+        """
+        def __init__(self, description, function, callback, canceled_callback=None):
+            """
+            :param description: Description shown in QGIS task manager
+            :type description: str
+            :param function: Function which receives the task as the only parameter, it must not touch GUI
+            :type function: function
+            :param callback: Function called in the main thread with parameters (result, exception), it is not
+                             called if the task was canceled
+            :type callback: function or None
+            :param canceled_callback: Function called in the main thread without parameters if the task was canceled
+            :type canceled_callback: function or None
+            """
+            super(FunctionTask, self).__init__(description, QgsTask.CanCancel)
+            self.function = function
+            self.callback = callback
+            self.canceled_callback = canceled_callback
+            self.result = None
+            self.exception = None
+
+        def run(self):
+            try:
+                self.result = self.function(self)
+            except Exception as exception:
+                self.exception = exception
+            return not self.isCanceled()
+
+        def finished(self, result):
+            _active_tasks.discard(self)
+            if result and not self.isCanceled() and self.callback:
+                self.callback(self.result, self.exception)
+            elif self.isCanceled() and self.canceled_callback:
+                self.canceled_callback()
+
+        def start(self):
+            _active_tasks.add(self)
+            QgsApplication.taskManager().addTask(self)
+
+
+def run_task(description, function, callback=None, canceled_callback=None):
+    """ Runs function in a background task
+
+    :param description: Description of the task
+    :type description: str
+    :param function: Function which receives the task as the only parameter, it must not touch GUI
+    :type function: function
+    :param callback: Function called in the main thread with parameters (result, exception)
+    :type callback: function or None
+    :param canceled_callback: Function called in the main thread if the task was canceled
+    :type canceled_callback: function or None
+    :return: Started task which can be canceled
+    :rtype: FunctionTask or SynchronousTask
+    """
+    task_class = FunctionTask if version_info[0] >= 3 else SynchronousTask
+    task = task_class(description, function, callback, canceled_callback)
+    task.start()
+    return task
+
+
+def cancel_task(task):
+    """ Cancels task if it is still running. Callback of a canceled task is never called.
+    """
+    if task is not None and not task.isCanceled():
+        task.cancel()
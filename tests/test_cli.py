@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the command line batch downloader, downloads are made from a local mock EDC-OGC service
+
+Usage (from the plugin folder):
+    python -m unittest discover tests
+"""
+
+import importlib
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.join(PLUGIN_DIR, 'benchmarks'))
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+
+from mock_server import MockConfig, MockServer  # noqa: E402
+
+# Modules of the plugin use relative imports, therefore the plugin folder is imported as a package
+PLUGIN_PACKAGE = importlib.import_module(os.path.basename(PLUGIN_DIR)).__name__
+cli = importlib.import_module(PLUGIN_PACKAGE + '.cli')
+network = importlib.import_module(PLUGIN_PACKAGE + '.network')
+
+SERVICE_URL = 'https://services.example.com/ogc/instance-0'
+
+
+class LoadJobFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='edc_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def load(self, content):
+        filename = os.path.join(self.folder, 'jobs.json')
+        with open(filename, 'w') as job_file:
+            json.dump(content, job_file)
+        return cli.load_job_file(filename, self.folder)[0]
+
+    def test_jobs_are_expanded_into_downloads(self):
+        items = self.load({
+            'service_url': SERVICE_URL,
+            'defaults': {'collection': 'Collection', 'bbox': [14.45, 46.03, 14.55, 46.08]},
+            'jobs': [{'layers': ['LAYER_0', 'LAYER_1'], 'dates': ['2020-06-01', '2020-06-11']}]
+        })
+
+        self.assertEqual(len(items), 4)
+        self.assertEqual(len(set(item.filename for item in items)), 4)
+        self.assertTrue(all(item.spec.service_url == SERVICE_URL for item in items))
+        self.assertTrue(all(os.path.dirname(item.filename) == self.folder for item in items))
+
+    def test_styles_and_dimensions_get_own_files(self):
+        items = self.load({
+            'service_url': SERVICE_URL,
+            'defaults': {'collection': 'Collection', 'layer': 'LAYER_0', 'bbox': [14.45, 46.03, 14.55, 46.08],
+                         'date': '2020-06-01'},
+            'jobs': [{}, {'style': 'INDEX'}, {'dimensions': {'dim_bands': 'B04,B08'}}]
+        })
+
+        self.assertEqual(len(set(item.filename for item in items)), 3)
+
+    def test_identical_downloads_are_kept_once(self):
+        job = {'collection': 'Collection', 'layer': 'LAYER_0', 'bbox': [14.45, 46.03, 14.55, 46.08],
+               'date': '2020-06-01'}
+        items = self.load({'service_url': SERVICE_URL, 'jobs': [job, dict(job)]})
+
+        self.assertEqual(len(items), 1)
+
+    def test_different_downloads_into_same_file_are_rejected(self):
+        job = {'collection': 'Collection', 'layer': 'LAYER_0', 'bbox': [14.45, 46.03, 14.55, 46.08],
+               'date': '2020-06-01'}
+
+        with self.assertRaises(cli.JobFileError):
+            self.load({'service_url': SERVICE_URL, 'jobs': [job, dict(job, resx='20m')]})
+
+    def test_invalid_jobs_are_rejected(self):
+        for content in ({'jobs': {}},
+                        {'jobs': [{'layer': 'LAYER_0', 'bbox': [0, 0, 1, 1], 'date': '2020-06-01'}]},
+                        {'service_url': SERVICE_URL, 'jobs': [{'layer': 'LAYER_0', 'date': '2020-06-01'}]},
+                        {'service_url': SERVICE_URL, 'jobs': [{'layer': 'LAYER_0', 'bbox': [0, 0, 1],
+                                                               'date': '2020-06-01'}]}):
+            with self.assertRaises(cli.JobFileError):
+                self.load(content)
+
+
+class RunBatchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockServer(MockConfig(instances=1, layers=10, sublayers=5, wcs_size=64 * 1024)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='edc_test_')
+        self.session = network.HttpSession('edc_test')
+        filename = os.path.join(self.folder, 'jobs.json')
+        with open(filename, 'w') as job_file:
+            json.dump({
+                'service_url': self.server.base_url + '/instance-0',
+                'defaults': {'collection': 'Collection', 'layers': ['LAYER_0_0', 'LAYER_0_1'],
+                             'bbox': [14.45, 46.03, 14.55, 46.08], 'dates': ['2020-06-01', '2020-06-11']},
+                'jobs': [{}, {'style': 'INDEX'}, {'dimensions': {'dim_bands': 'B04,B08'}}]
+            }, job_file)
+        self.items = cli.load_job_file(filename, os.path.join(self.folder, 'output'))[0]
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_all_downloads_are_written(self):
+        results = cli.run_batch(self.session, self.items, workers=4)
+
+        self.assertEqual(len(results), 12)
+        self.assertEqual([result['status'] for result in results], ['downloaded'] * 12)
+        self.assertTrue(all(os.path.getsize(item.filename) > 0 for item in self.items))
+
+    def test_existing_files_are_skipped(self):
+        cli.run_batch(self.session, self.items, workers=4)
+        wcs_requests = self.server.request_counts.get('wcs', 0)
+
+        results = cli.run_batch(self.session, self.items, workers=4)
+
+        self.assertEqual([result['status'] for result in results], ['skipped'] * 12)
+        self.assertEqual(self.server.request_counts.get('wcs', 0), wcs_requests)
+
+    def test_failed_download_does_not_stop_others(self):
+        unused_socket = socket.socket()
+        unused_socket.bind(('127.0.0.1', 0))
+        unused_url = 'http://127.0.0.1:{}/instance-0'.format(unused_socket.getsockname()[1])
+        unused_socket.close()
+        items = list(self.items)
+        items[0] = items[0]._replace(spec=items[0].spec._replace(service_url=unused_url))
+
+        results = cli.run_batch(network.HttpSession('edc_test', retries=0), items, workers=4)
+
+        self.assertEqual(results[0]['status'], 'failed')
+        self.assertEqual([result['status'] for result in results[1:]], ['downloaded'] * 11)
+        self.assertFalse(os.path.exists(items[0].filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of urls and filenames built from request specifications
+
+Usage (from the plugin folder):
+    python -m unittest discover tests
+"""
+
+import importlib
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+
+# Modules of the plugin use relative imports, therefore the plugin folder is imported as a package
+PLUGIN_PACKAGE = importlib.import_module(os.path.basename(PLUGIN_DIR)).__name__
+request_spec = importlib.import_module(PLUGIN_PACKAGE + '.request_spec')
+
+BBOX = '46.03,14.45,46.08,14.55'
+CRS = 'EPSG:4326'
+
+
+def create_spec(**parameters):
+    return request_spec.RequestSpec(**dict({
+        'service_url': 'https://services.example.com/ogc/instance-0',
+        'service_type': 'wms',
+        'collection': 'Collection',
+        'layer': 'TRUE-COLOR',
+        'title': '',
+        'layer_name': 'TRUE-COLOR',
+        'style': '',
+        'time': '2020-06-01/2020-06-01/P1D',
+        'exact_date': True,
+        'priority': 'mostRecent',
+        'maxcc': '100',
+        'crs': CRS,
+        'dimensions': (),
+        'image_format': 'image/tiff;depth=32f',
+        'resx': '10m',
+        'resy': '10m'
+    }, **parameters))
+
+
+class RequestSpecTest(unittest.TestCase):
+
+    def test_wcs_url_without_style_and_dimensions(self):
+        url = create_spec().get_wcs_url(BBOX, CRS)
+
+        self.assertTrue(url.startswith('https://services.example.com/ogc/instance-0?service=wcs&request=GetCoverage&'))
+        self.assertNotIn('styles=', url)
+        self.assertTrue(url.endswith('bbox={}'.format(BBOX)))
+
+    def test_wcs_url_contains_style_and_dimensions(self):
+        url = create_spec(style='INDEX', dimensions=(('dim_bands', 'B04,B08'),)).get_wcs_url(BBOX, CRS)
+
+        self.assertIn('&styles=INDEX&', url)
+        self.assertIn('&dim_bands=B04,B08&', url)
+
+    def test_filename_without_style_and_dimensions(self):
+        self.assertEqual(create_spec().get_filename(BBOX),
+                         'Collection_TRUE-COLOR_100_mostRecent_46.03_14.45_46.08_14.55.tiff')
+
+    def test_filename_contains_style_and_dimensions(self):
+        filename = create_spec(style='INDEX', dimensions=(('dim_bands', 'B04,B08'),)).get_filename(BBOX)
+
+        self.assertEqual(filename, 'Collection_TRUE-COLOR_INDEX_B04-B08_100_mostRecent_46.03_14.45_46.08_14.55.tiff')
+
+    def test_dimension_values_are_valid_in_filenames(self):
+        spec = create_spec(dimensions=(('time_range', '2020-01-01/2020-02-01'), ('point', 'a:b\\c d')))
+
+        self.assertEqual(spec.get_dimension_values(), ['2020-01-01-2020-02-01', 'a-b-c-d'])
+        self.assertNotIn('/', spec.get_filename(BBOX))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains a local HTTP proxy which caches map images of EDC layers on disk
+"""
+
+import os
+import re
+import json
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+import requests
+
+from . import Settings
+
+
+# Requests whose responses are cached, other requests (e.g. GetCapabilities) are only passed to the service
+CACHED_REQUESTS = ('getmap', 'gettile')
+
+# Url of a tile proxy on any port followed by an encoded service url, e.g. in data sources of saved layers
+PROXY_URL_PATTERN = re.compile(r'http://127\.0\.0\.1:(\d+)/([A-Za-z0-9_-]+)')
+
+
+class TileCache:
+    """ Size-capped on-disk LRU cache of map images. Every entry consists of a file with response content and a file
+    with its metadata (content type and validators used for revalidation).
+    """
+
+    def __init__(self, cache_dir, max_size=Settings.tile_cache_max_size):
+        """
+        :param cache_dir: Folder where cached responses are stored
+        :type cache_dir: str
+        :param max_size: Maximal size of cached content in bytes, least recently used entries are evicted first
+        :type max_size: int
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()  # key -> content size, least recently used first
+        self._lock = threading.Lock()
+        self._load_entries()
+
+    @staticmethod
+    def get_key(url, parameters):
+        """ Cache key of a request which doesn't depend on order and case of parameter names
+
+        :param url: Service url without query
+        :type url: str
+        :param parameters: Query parameters
+        :type parameters: list((str, str))
+        :rtype: str
+        """
+        canonical = '&'.join('{}={}'.format(name, value) for name, value in
+                             sorted((name.lower(), value) for name, value in parameters))
+        return hashlib.sha1('{}?{}'.format(url, canonical).encode('utf-8')).hexdigest()
+
+    def _path(self, key, extension):
+        return os.path.join(self.cache_dir, '{}.{}'.format(key, extension))
+
+    def _load_entries(self):
+        """ Restores the LRU order of entries from modification times of content files
+        """
+        try:
+            filenames = [filename for filename in os.listdir(self.cache_dir) if filename.endswith('.bin')]
+        except OSError:
+            return
+        entries = []
+        for filename in filenames:
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, filename))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, filename[:-len('.bin')], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self.size += size
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """ Finds a cached response and marks it as recently used
+
+        :return: Pair of metadata and content or None if entry doesn't exist
+        :rtype: (dict, bytes) or None
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            try:
+                with open(self._path(key, 'json'), 'r') as meta_file:
+                    meta = json.load(meta_file)
+                with open(self._path(key, 'bin'), 'rb') as content_file:
+                    content = content_file.read()
+                os.utime(self._path(key, 'bin'), None)
+            except (IOError, OSError, ValueError):
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return meta, content
+
+    def put(self, key, content, meta):
+        """ Stores response content with its metadata and evicts least recently used entries which exceed the size
+        """
+        if len(content) > self.max_size:
+            return
+        with self._lock:
+            try:
+                if not os.path.exists(self.cache_dir):
+                    os.makedirs(self.cache_dir)
+                self._write_file(self._path(key, 'bin'), content, binary=True)
+                self._write_file(self._path(key, 'json'), json.dumps(meta))
+            except (IOError, OSError):
+                self._remove(key)
+                return
+            self.size += len(content) - self._entries.pop(key, 0)
+            self._entries[key] = len(content)
+            while self.size > self.max_size and self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def update_meta(self, key, meta):
+        """ Updates metadata of an entry after it was revalidated
+        """
+        with self._lock:
+            if key in self._entries:
+                try:
+                    self._write_file(self._path(key, 'json'), json.dumps(meta))
+                except (IOError, OSError):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        self.size -= self._entries.pop(key, 0)
+        for extension in ('bin', 'json'):
+            try:
+                os.remove(self._path(key, extension))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _write_file(filename, content, binary=False):
+        """ Writes file into a temporary location first so that readers never see a partially written file
+        """
+        tmp_filename = '{}.tmp'.format(filename)
+        with open(tmp_filename, 'wb' if binary else 'w') as cache_file:
+            cache_file.write(content)
+        os.replace(tmp_filename, filename)
+
+
+class TileProxyStats:
+    """ Thread-safe counters of requests handled by the proxy
+    """
+
+    FIELDS = ['hits', 'misses', 'revalidated', 'stale', 'passed', 'errors', 'prefetched']
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            for field in self.FIELDS:
+                setattr(self, field, 0)
+            self.bytes_from_cache = 0
+
+    def add(self, field, content_size=0):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+            if field in ('hits', 'revalidated', 'stale'):
+                self.bytes_from_cache += content_size
+
+    @property
+    def hit_ratio(self):
+        """ Fraction of cacheable requests which were served from the cache
+        """
+        served = self.hits + self.revalidated + self.stale
+        total = served + self.misses
+        return served / float(total) if total else 0.0
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # On Windows the address could be reused while another process (e.g. another QGIS instance) listens on the port
+    allow_reuse_address = os.name != 'nt'
+
+
+class _TileProxyHandler(BaseHTTPRequestHandler):
+    """ Passes every GET request to the TileProxy which owns the server
+    """
+    def do_GET(self):
+        self.server.tile_proxy.handle(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TileProxy:
+    """ Local HTTP proxy between QGIS layers and EDC-OGC service. Urls of the service are encoded into the path of
+    the proxy url, therefore the proxy keeps no state about layers and layers keep working after the proxy restarts
+    on the same port. Requests are forwarded only to service urls under allowed base urls and only if they are
+    addressed to the proxy host, so that other local processes or web pages can't use the proxy as an open relay.
+
+    If the port is taken, e.g. by the proxy of another QGIS instance, the following ports are tried. Layers whose
+    urls point to the proxy on another port are switched to the running proxy by adopt_layers.
+
+    Map images are served from TileCache. Entries older than ttl are revalidated with a conditional request and if
+    the service is unavailable a stale entry is served.
+    """
+
+    def __init__(self, session, cache_dir, port=Settings.tile_proxy_port, max_size=Settings.tile_cache_max_size,
+                 ttl=Settings.tile_cache_ttl, port_attempts=Settings.tile_proxy_port_attempts):
+        """
+        :param session: Session used for requests to the service
+        :type session: HttpSession
+        :param cache_dir: Folder where cached responses are stored
+        :type cache_dir: str
+        :param port: Preferred localhost port of the proxy
+        :type port: int
+        :param max_size: Maximal size of the cache in bytes
+        :type max_size: int
+        :param ttl: Number of seconds for which cached responses are served without revalidation
+        :type ttl: int
+        :param port_attempts: Number of consecutive ports which are tried if the preferred one is taken
+        :type port_attempts: int
+        """
+        self.session = session
+        self.cache = TileCache(cache_dir, max_size)
+        self.preferred_port = port
+        self.port = port  # port on which the proxy runs
+        self.port_attempts = max(port_attempts, 1)
+        self.ttl = ttl
+        self.stats = TileProxyStats()
+        # Function called with (service url, query parameters) after QGIS requested a map image
+        self.on_request = None
+        self.foreground_requests = 0
+        self.last_request_time = 0
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._allowed_base_urls = set()
+
+    @property
+    def is_running(self):
+        return self._server is not None
+
+    @property
+    def port_range(self):
+        """ Text of ports on which the proxy may run, used in messages
+        """
+        last_port = self.preferred_port + self.port_attempts - 1
+        return str(self.preferred_port) if last_port == self.preferred_port else \
+            '{}-{}'.format(self.preferred_port, last_port)
+
+    def start(self):
+        """ Starts serving requests in a background thread on the first available port
+
+        :raises: socket.error (OSError) if none of the ports is available
+        """
+        if self._server is not None:
+            return
+        error = None
+        for port in range(self.preferred_port, self.preferred_port + self.port_attempts):
+            try:
+                self._server = _ThreadingHTTPServer(('127.0.0.1', port), _TileProxyHandler)
+                self.port = port
+                break
+            except (IOError, OSError) as exception:
+                error = exception
+        else:
+            raise error
+        self._server.tile_proxy = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name='EDC tile proxy')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = self._thread = None
+
+    def allow_base_url(self, base_url):
+        """ Allows forwarding of requests to all service urls under the base url
+
+        :param base_url: EDC-OGC base url
+        :type base_url: str
+        """
+        with self._lock:
+            self._allowed_base_urls.add(base_url.rstrip('/'))
+
+    def is_allowed(self, service_url):
+        with self._lock:
+            return any(service_url == base_url or service_url.startswith(base_url + '/')
+                       for base_url in self._allowed_base_urls)
+
+    def get_url(self, service_url):
+        """ Proxy url which forwards requests to the service url, the service url is allowed by this call
+
+        :param service_url: EDC-OGC service url
+        :type service_url: str
+        :rtype: str
+        """
+        self.allow_base_url(service_url)
+        encoded_url = base64.urlsafe_b64encode(service_url.encode('utf-8')).decode('ascii').rstrip('=')
+        return 'http://127.0.0.1:{}/{}'.format(self.port, encoded_url)
+
+    def adopt_url(self, url):
+        """ If the url points to a tile proxy, its service url is allowed and the url is moved to the port of this
+        proxy. It is used for layers of saved projects, which were created while the proxy ran on another port or
+        under another base url.
+
+        :param url: Url or data source which may contain a proxy url
+        :type url: str
+        :return: Url pointing to this proxy or None if the url doesn't point to a tile proxy
+        :rtype: str or None
+        """
+        match = PROXY_URL_PATTERN.search(url)
+        if match is None:
+            return None
+        try:
+            service_url = self._decode_url(match.group(2))
+        except (ValueError, TypeError):
+            return None
+        self.allow_base_url(service_url)
+        return url.replace(match.group(0), self.get_url(service_url), 1)
+
+    def adopt_layers(self, layers):
+        """ Allows service urls of layers which load images through a tile proxy and switches layers which point to a
+        proxy on another port to this proxy. Layers keep their renderers. Data source can't be changed in QGIS 2,
+        there the layers keep the previous port.
+
+        :param layers: QGIS map layers, e.g. layers of a loaded project
+        :type layers: list(QgsMapLayer)
+        """
+        for layer in layers:
+            source = layer.source()
+            new_source = self.adopt_url(source)
+            if new_source is None or new_source == source or not hasattr(layer, 'setDataSource'):
+                continue
+            renderer = layer.renderer().clone() if layer.renderer() is not None else None
+            layer.setDataSource(new_source, layer.name(), layer.providerType(), False)
+            if renderer is not None:
+                layer.setRenderer(renderer)
+            layer.triggerRepaint()
+
+    @staticmethod
+    def _decode_url(path):
+        encoded_url = path.strip('/')
+        encoded_url += '=' * (-len(encoded_url) % 4)
+        url = base64.urlsafe_b64decode(encoded_url.encode('ascii')).decode('utf-8')
+        if not url.startswith(('http://', 'https://')):
+            raise ValueError('Invalid service url {}'.format(url))
+        return url
+
+    def handle(self, handler):
+        """ Handles a single GET request of the local server
+        """
+        if handler.headers.get('Host') != '127.0.0.1:{}'.format(self.port):  # protection against DNS rebinding
+            return self._respond(handler, 403, 'text/plain', b'Forbidden host')
+        url_parts = urlsplit(handler.path)
+        try:
+            service_url = self._decode_url(url_parts.path)
+        except (ValueError, TypeError):
+            return self._respond(handler, 400, 'text/plain', b'Unknown service url')
+        if not self.is_allowed(service_url):
+            return self._respond(handler, 403, 'text/plain', b'Service url is not allowed')
+
+        parameters = parse_qsl(url_parts.query, keep_blank_values=True)
+        url = '{}?{}'.format(service_url, url_parts.query) if url_parts.query else service_url
+        request = next((value for name, value in parameters if name.lower() == 'request'), '')
+
+        if request.lower() not in CACHED_REQUESTS:
+            self.stats.add('passed')
+            return self._forward(handler, url)
+
+        with self._lock:
+            self.foreground_requests += 1
+        try:
+            self._handle_map_request(handler, service_url, url, parameters)
+        finally:
+            with self._lock:
+                self.foreground_requests -= 1
+                self.last_request_time = time.time()
+        if self.on_request is not None:
+            self.on_request(service_url, parameters)
+
+    def _handle_map_request(self, handler, service_url, url, parameters):
+        """ Serves map image from the cache or from the service
+        """
+        key = self.cache.get_key(service_url, parameters)
+        cached = self.cache.get(key)
+        if cached is not None:
+            meta, content = cached
+            if time.time() - meta.get('fetched', 0) < self.ttl:
+                self.stats.add('hits', len(content))
+                return self._respond(handler, 200, meta.get('content_type'), content)
+
+        headers = {}
+        if cached is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = self.session.get(url, headers=headers)
+        except requests.HTTPError as exception:
+            return self._respond_error(handler, exception.response, cached)
+        except requests.RequestException:
+            return self._respond_error(handler, None, cached)
+
+        if response.status_code == 304 and cached is not None:
+            meta['fetched'] = time.time()
+            self.cache.update_meta(key, meta)
+            self.stats.add('revalidated', len(content))
+            return self._respond(handler, 200, meta.get('content_type'), content)
+
+        content_type = response.headers.get('Content-Type', '')
+        self.stats.add('misses')
+        if content_type.startswith('image/'):  # service reports some errors with status 200
+            self.cache.put(key, response.content, {
+                'content_type': content_type,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched': time.time()
+            })
+        self._respond(handler, response.status_code, content_type, response.content)
+
+    def prefetch(self, service_url, parameters):
+        """ Downloads a map image into the cache unless it is already cached. It is called from background threads.
+
+        :param service_url: EDC-OGC service url
+        :type service_url: str
+        :param parameters: Query parameters of the request
+        :type parameters: list((str, str))
+        :return: Number of downloaded bytes
+        :rtype: int
+        :raises: requests.RequestException
+        """
+        key = self.cache.get_key(service_url, parameters)
+        if self.cache.contains(key):
+            return 0
+        response = self.session.get('{}?{}'.format(service_url, urlencode(parameters)))
+        content_type = response.headers.get('Content-Type', '')
+        if content_type.startswith('image/'):
+            self.cache.put(key, response.content, {
+                'content_type': content_type,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched': time.time()
+            })
+            self.stats.add('prefetched')
+        return len(response.content)
+
+    def _forward(self, handler, url):
+        try:
+            response = self.session.get(url)
+        except requests.HTTPError as exception:
+            return self._respond_error(handler, exception.response, None)
+        except requests.RequestException:
+            return self._respond_error(handler, None, None)
+        self._respond(handler, response.status_code, response.headers.get('Content-Type'), response.content)
+
+    def _respond_error(self, handler, response, cached):
+        """ Serves a stale cached response if there is one, otherwise the error of the service is passed to QGIS
+        """
+        if cached is not None:
+            meta, content = cached
+            self.stats.add('stale', len(content))
+            return self._respond(handler, 200, meta.get('content_type'), content)
+
+        self.stats.add('errors')
+        if response is None:
+            return self._respond(handler, 502, 'text/plain', b'Service is not available')
+        self._respond(handler, response.status_code, response.headers.get('Content-Type'), response.content)
+
+    @staticmethod
+    def _respond(handler, status, content_type, content):
+        try:
+            handler.send_response(status)
+            handler.send_header('Content-Type', content_type or 'application/octet-stream')
+            handler.send_header('Content-Length', str(len(content)))
+            handler.end_headers()
+            handler.wfile.write(content)
+        except (IOError, OSError):  # QGIS canceled the request
+            pass
+
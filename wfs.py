@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+This script contains discovery of satellite acquisitions with WFS requests
+"""
+
+import math
+import threading
+from collections import namedtuple, OrderedDict
+
+from . import Settings
+
+
+# Acquisition date in form YYYY-MM-DD, mean cloud coverage of tiles intersecting bbox in percents (or None if it is
+# unknown), number of tiles and dictionary of tile id and its cloud coverage which is used to merge acquisitions
+Acquisition = namedtuple('Acquisition', ['date', 'cloud_cover', 'tiles', 'tile_covers'])
+
+
+def get_page_url(url, offset):
+    """ Adds paging offset to WFS GetFeature url, page size is given by maxfeatures parameter
+    """
+    return '{}&feature_offset={}'.format(url, offset)
+
+
+def iter_features(get_json, url, page_size=None, max_pages=Settings.wfs_max_pages, is_canceled=None,
+                  on_truncated=None):
+    """ Iterates over features of all pages of WFS GetFeature response, at most max_pages pages are requested
+
+    :param get_json: Function which downloads url and returns parsed JSON
+    :type get_json: function
+    :param url: WFS GetFeature url without paging offset
+    :type url: str
+    :param page_size: Number of features per page, it must match maxfeatures parameter of url
+    :type page_size: int or None
+    :param max_pages: Maximal number of requested pages
+    :type max_pages: int
+    :param is_canceled: Function which returns True if iteration should stop
+    :type is_canceled: function or None
+    :param on_truncated: Function called if the last allowed page was full, i.e. there may be more features
+    :type on_truncated: function or None
+    :return: Iterator of GeoJSON features
+    :rtype: iterator(dict)
+    """
+    page_size = int(page_size or Settings.parameters_wfs['maxfeatures'])
+    for page in range(max_pages):
+        if is_canceled and is_canceled():
+            return
+        features = get_json(get_page_url(url, page * page_size)).get('features', [])
+        for feature in features:
+            yield feature
+        if len(features) < page_size:
+            return
+    if on_truncated:
+        on_truncated()
+
+
+def get_acquisitions(features, maxcc=100):
+    """ Groups features by acquisition date
+
+    :param features: GeoJSON features of S2.TILE WFS layer
+    :type features: iterator(dict)
+    :param maxcc: Maximal cloud coverage in percents, acquisitions with higher cloud coverage are skipped
+    :type maxcc: float
+    :return: Acquisitions sorted by date
+    :rtype: list(Acquisition)
+    """
+    tile_covers = OrderedDict()
+    for index, feature in enumerate(features):
+        properties = feature.get('properties', {})
+        date = properties.get('date')
+        if not date:
+            continue
+        # Tiles without id are never merged with other tiles
+        tile_id = properties.get('id') or feature.get('id') or '#{}'.format(index)
+        tile_covers.setdefault(date, {})[tile_id] = properties.get('cloudCoverPercentage')
+
+    acquisitions = []
+    for date in sorted(tile_covers):
+        acquisition = _create_acquisition(date, tile_covers[date])
+        if acquisition.cloud_cover is None or acquisition.cloud_cover <= float(maxcc):
+            acquisitions.append(acquisition)
+    return acquisitions
+
+
+def _create_acquisition(date, tile_covers):
+    known_covers = [cover for cover in tile_covers.values() if cover is not None]
+    cloud_cover = sum(known_covers) / float(len(known_covers)) if known_covers else None
+    return Acquisition(date, cloud_cover, len(tile_covers), tile_covers)
+
+
+def merge_acquisitions(acquisition_lists):
+    """ Merges acquisitions found in different areas, cloud coverage of the same date is averaged over tiles. A tile
+    which intersects several areas is counted once.
+
+    :param acquisition_lists: Lists of acquisitions
+    :type acquisition_lists: list(list(Acquisition))
+    :return: Acquisitions sorted by date
+    :rtype: list(Acquisition)
+    """
+    merged = {}
+    for acquisitions in acquisition_lists:
+        for acquisition in acquisitions:
+            merged.setdefault(acquisition.date, {}).update(acquisition.tile_covers)
+
+    return [_create_acquisition(date, tile_covers) for date, tile_covers in sorted(merged.items())]
+
+
+def get_grid_cells(bbox, cell_size=Settings.availability_cell_size):
+    """ Finds cells of a regular WGS84 grid which intersect bounding box. Results of queries over grid cells can be
+    reused while user pans around.
+
+    :param bbox: Bounding box in WGS84 in form of (min longitude, min latitude, max longitude, max latitude)
+    :type bbox: tuple(float)
+    :param cell_size: Size of grid cells in degrees
+    :type cell_size: float
+    :return: List of pairs of cell index and its bounding box
+    :rtype: list(((int, int), tuple(float)))
+    """
+    lng_min, lat_min, lng_max, lat_max = bbox
+    cells = []
+    for row in range(int(math.floor(lat_min / cell_size)), int(math.floor(lat_max / cell_size)) + 1):
+        for column in range(int(math.floor(lng_min / cell_size)), int(math.floor(lng_max / cell_size)) + 1):
+            cells.append(((column, row), (max(column * cell_size, -180.0), max(row * cell_size, -90.0),
+                                          min((column + 1) * cell_size, 180.0), min((row + 1) * cell_size, 90.0))))
+    return cells
+
+
+class AvailabilityCache:
+    """ Thread-safe in-memory LRU cache of acquisitions found for a key, e.g. (service url, month, grid
+    cell)
+    """
+    def __init__(self, max_entries=Settings.availability_cache_size):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: Cached acquisitions or None if key is not cached
+        :rtype: list(Acquisition) or None
+        """
+        with self._lock:
+            acquisitions = self._entries.pop(key, None)
+            if acquisitions is not None:
+                self._entries[key] = acquisitions
+            return acquisitions
+
+    def put(self, key, acquisitions):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = acquisitions
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()